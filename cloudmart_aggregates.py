@@ -0,0 +1,137 @@
+"""Shared cost and count rollups for the CloudMart dashboard.
+
+Task Sets 2 and 4 group the same frame by Tagged, Department, Project,
+Environment and Service in several combinations. ``CostRollups`` scans the
+rows once, grouping by all of those dimensions together, and answers every
+narrower rollup by re-grouping that (small) base table instead of the rows.
+
+The same class, built over ``FILTER_DIMENSIONS``, is the pre-aggregated cube
+behind the Task 4.5 filters: ``where`` narrows the cube's cells, so a filter
+change never touches the raw rows.
+
+Rollups follow pandas' ``groupby`` defaults: keys are sorted and rows with a
+missing value in any of the requested keys are left out, while rows missing
+only *other* dimensions still count.
+
+When rows are appended to the data, ``extend`` folds just the new rows into
+the base table, so the rollups never rescan the rows they already cover.
+"""
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+# Dimensions kept in the base table; any rollup must be a subset of these.
+ROLLUP_DIMENSIONS = ["Department", "Project", "Environment", "Service", "Tagged"]
+
+# Dimensions of the Task 4.5 filter cube.
+FILTER_DIMENSIONS = ["Service", "Region", "Department", "Tagged"]
+
+COST = "MonthlyCostUSD"
+RESOURCES = "Resources"
+
+
+class CostRollups:
+    """Cost sums and resource counts over any subset of ROLLUP_DIMENSIONS."""
+
+    def __init__(self, df, dimensions=ROLLUP_DIMENSIONS):
+        self.dimensions = list(dimensions)
+        self.base = (
+            df.groupby(self.dimensions, observed=True, dropna=False, sort=False)
+            .agg(**{COST: (COST, "sum"), RESOURCES: (COST, "size")})
+            .reset_index()
+        )
+        self._rollups = {}
+
+    @classmethod
+    def from_base(cls, base, dimensions):
+        """Rollups over an already grouped ``base`` table (see ``__init__``)."""
+        rollups = cls.__new__(cls)
+        rollups.dimensions = list(dimensions)
+        rollups.base = base
+        rollups._rollups = {}
+        return rollups
+
+    def extend(self, df):
+        """Rollups over these rows followed by the rows of ``df``.
+
+        Only ``df`` is grouped; its cells are merged into the base table.
+        """
+        base = self.base.copy()
+        added = CostRollups(df, self.dimensions).base
+        for column in self.dimensions:
+            # Align the categories so concat keeps the categorical dtype
+            if isinstance(base[column].dtype, pd.CategoricalDtype) and isinstance(
+                added[column].dtype, pd.CategoricalDtype
+            ):
+                categories = union_categoricals(
+                    [base[column], added[column]], sort_categories=True
+                ).categories
+                base[column] = base[column].cat.set_categories(categories)
+                added[column] = added[column].cat.set_categories(categories)
+        base = (
+            pd.concat([base, added], ignore_index=True)
+            .groupby(self.dimensions, observed=True, dropna=False, sort=False)[
+                [COST, RESOURCES]
+            ]
+            .sum()
+            .reset_index()
+        )
+        return self.from_base(base, self.dimensions)
+
+    @property
+    def total_cost(self):
+        return self.base[COST].sum()
+
+    @property
+    def total_resources(self):
+        return int(self.base[RESOURCES].sum())
+
+    def where(self, selections):
+        """Rollups restricted to rows whose values are in ``selections``.
+
+        ``selections`` maps a dimension to the values to keep; a ``None``
+        entry means no filter on that dimension, like ``df[col].isin(values)``
+        applied for each given column.
+        """
+        base = self.base
+        for column, values in selections.items():
+            if values is None:
+                continue
+            self._check_dimensions([column])
+            base = base[base[column].isin(values)]
+        return self.from_base(base, self.dimensions)
+
+    def _check_dimensions(self, by):
+        unknown = set(by) - set(self.dimensions)
+        if unknown:
+            raise KeyError(f"Not a rollup dimension: {', '.join(sorted(unknown))}")
+
+    def rollup(self, by):
+        """Cost and resource count per combination of the ``by`` columns."""
+        by = [by] if isinstance(by, str) else list(by)
+        self._check_dimensions(by)
+
+        key = tuple(by)
+        if key not in self._rollups:
+            self._rollups[key] = (
+                self.base.groupby(by, observed=True)[[COST, RESOURCES]]
+                .sum()
+                .reset_index()
+            )
+        return self._rollups[key].copy()
+
+    def cost_by(self, by):
+        """Like ``df.groupby(by)[COST].sum().reset_index()``."""
+        by = [by] if isinstance(by, str) else list(by)
+        return self.rollup(by)[by + [COST]]
+
+    def value_counts(self, column):
+        """Like ``df[column].value_counts()``; ties list the larger key first."""
+        counts = self.rollup([column]).set_index(column)[RESOURCES].rename("count")
+        return counts.iloc[::-1].sort_values(ascending=False, kind="stable")
+
+    def tagged_totals(self, tagged):
+        """(resource count, cost) of rows whose Tagged flag equals ``tagged``."""
+        by_tagged = self.rollup(["Tagged"])
+        rows = by_tagged[by_tagged["Tagged"] == tagged]
+        return int(rows[RESOURCES].sum()), rows[COST].sum()
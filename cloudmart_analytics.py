@@ -0,0 +1,470 @@
+"""Headless analytics for the CloudMart dashboard (Task Sets 1-5).
+
+Everything here is plain pandas: no Streamlit import, no rendering. The
+dashboard calls these functions and only draws their results, and the
+``cloudmart_report`` CLI calls them to write batch reports.
+
+Each ``task_set_*`` function returns a dict keyed by the names the dashboard
+uses for its tables and metrics. Inputs are the typed frame from
+``cloudmart_data.load_dataset`` and, where cost/count rollups are needed, the
+matching ``CostRollups`` (built with ``CostRollups(df)`` if not given).
+
+Task Sets 1-4 and ``build_report`` also accept a query backend from
+``cloudmart_backend`` in place of the frame, so their row scans can run
+out of core.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cloudmart_aggregates import COST, RESOURCES, CostRollups
+from cloudmart_backend import as_backend
+from cloudmart_patches import KEY_COLUMNS, matching_rows, resource_keys, row_lookup
+from cloudmart_schema import (
+    TAG_FIELDS,
+    TAGGED_LABELS,
+    label_tagged,
+    untagged_mask,
+    with_tag_labels,
+)
+
+# Columns searched and orders offered by the Task 5.1 editor
+SEARCH_COLUMNS = ["ResourceID", "Service", "Department"]
+PAGE_SORTS = [None, "cost_desc", "cost_asc"]
+
+# Resources listed as least complete in Task 3.2
+LOWEST_COMPLETENESS_ROWS = 5
+
+# Columns shown for resources in the Task 3 tables
+LOWEST_COMPLETENESS_COLUMNS = [
+    "ResourceID",
+    "Service",
+    "Department",
+    "Project",
+    "Owner",
+    "Tag_Completeness_Score",
+    "Tag_Completeness_Percentage",
+    "MonthlyCostUSD",
+]
+UNTAGGED_COLUMNS = [
+    "ResourceID",
+    "Service",
+    "Region",
+    "Department",
+    "Project",
+    "Environment",
+    "MonthlyCostUSD",
+]
+
+
+def _percentage(part, whole):
+    return (part / whole * 100) if whole > 0 else 0
+
+
+def _tagged_cost(cost_by_tagged, label):
+    cost = cost_by_tagged[cost_by_tagged["Tagged"] == label][COST].values
+    return cost[0] if len(cost) > 0 else 0
+
+
+# ============================================================================
+# TASK SET 1 - DATA EXPLORATION
+# ============================================================================
+
+
+def task_set_1(df, rollups=None):
+    """Missing values and tagged/untagged counts."""
+    backend = as_backend(df)
+    rollups = rollups if rollups is not None else backend.rollups()
+
+    missing_values = backend.missing_counts()
+    missing_sorted = missing_values[missing_values > 0].sort_values(ascending=False)
+
+    tagged_counts = rollups.value_counts("Tagged").rename(index=TAGGED_LABELS)
+    total = backend.row_count()
+    untagged = tagged_counts.get("No", 0)
+    return {
+        "total_resources": total,
+        "total_columns": len(backend.columns),
+        "missing_values": missing_values,
+        "missing_sorted": missing_sorted,
+        "tagged_counts": tagged_counts,
+        "tagged": tagged_counts.get("Yes", 0),
+        "untagged": untagged,
+        "percentage_untagged": _percentage(untagged, total),
+    }
+
+
+# ============================================================================
+# TASK SET 2 - COST VISIBILITY
+# ============================================================================
+
+
+def task_set_2(df, rollups=None):
+    """Cost by tagging status, department, project and environment."""
+    rollups = rollups if rollups is not None else as_backend(df).rollups()
+
+    cost_by_tagged = rollups.cost_by("Tagged")
+    cost_by_tagged["Tagged"] = label_tagged(cost_by_tagged["Tagged"])
+    tagged_cost = _tagged_cost(cost_by_tagged, "Yes")
+    untagged_cost = _tagged_cost(cost_by_tagged, "No")
+    total_cost = rollups.total_cost
+
+    cost_by_dept_tagged = rollups.cost_by(["Department", "Tagged"])
+    cost_by_dept_tagged["Tagged"] = label_tagged(cost_by_dept_tagged["Tagged"])
+    untagged_by_dept = cost_by_dept_tagged[
+        cost_by_dept_tagged["Tagged"] == "No"
+    ].sort_values(COST, ascending=False)
+
+    cost_by_project = rollups.cost_by("Project").sort_values(COST, ascending=False)
+
+    cost_by_env_tagged = rollups.cost_by(["Environment", "Tagged"])
+    cost_by_env_tagged["Tagged"] = label_tagged(cost_by_env_tagged["Tagged"])
+    pivot_env = cost_by_env_tagged.pivot(
+        index="Environment", columns="Tagged", values=COST
+    ).fillna(0)
+
+    # Tagging percentage per environment
+    env_summary = rollups.rollup("Environment")[["Environment", RESOURCES, COST]]
+    env_summary.columns = ["Environment", "Total Resources", "Total Cost"]
+    env_tagged = rollups.rollup(["Environment", "Tagged"])
+    tagged_counts_env = env_tagged[env_tagged["Tagged"].fillna(False)][
+        ["Environment", RESOURCES]
+    ]
+    tagged_counts_env.columns = ["Environment", "Tagged Resources"]
+    env_summary = env_summary.merge(
+        tagged_counts_env, on="Environment", how="left"
+    ).fillna({"Tagged Resources": 0})
+    env_summary["Tagging %"] = (
+        env_summary["Tagged Resources"] / env_summary["Total Resources"] * 100
+    ).round(2)
+
+    return {
+        "cost_by_tagged": cost_by_tagged,
+        "tagged_cost": tagged_cost,
+        "untagged_cost": untagged_cost,
+        "total_cost": total_cost,
+        "percentage_untagged_cost": _percentage(untagged_cost, total_cost),
+        "cost_by_dept_tagged": cost_by_dept_tagged,
+        "untagged_by_dept": untagged_by_dept,
+        "cost_by_project": cost_by_project,
+        "cost_by_env_tagged": cost_by_env_tagged,
+        "pivot_env": pivot_env,
+        "env_summary": env_summary,
+    }
+
+
+# ============================================================================
+# TASK SET 3 - TAGGING COMPLIANCE
+# ============================================================================
+
+
+def task_set_3(df, tag_fields=TAG_FIELDS):
+    """Tag completeness scores, missing tag fields and untagged resources.
+
+    Scores are not added to every row; ``backend.scored()`` (see
+    ``cloudmart_backend``) returns rows with their scores when needed.
+    """
+    backend = as_backend(df)
+    # Count non-null values for each resource across tag fields
+    avg_completeness, lowest_completeness = backend.completeness(
+        tag_fields, LOWEST_COMPLETENESS_ROWS
+    )
+    missing_counts = backend.missing_counts(tag_fields).sort_values(ascending=False)
+
+    untagged_resources = backend.untagged()
+
+    return {
+        "avg_completeness": avg_completeness,
+        "lowest_completeness": lowest_completeness,
+        "missing_counts": missing_counts,
+        "missing_patterns": backend.missing_patterns(tag_fields),
+        "untagged_resources": untagged_resources,
+        "total_untagged_cost": untagged_resources[COST].sum(),
+    }
+
+
+# ============================================================================
+# TASK SET 4 - VISUALIZATION DASHBOARD
+# ============================================================================
+
+
+def task_set_4(df, rollups=None):
+    """Data behind the Task 4.1-4.4 charts."""
+    rollups = rollups if rollups is not None else as_backend(df).rollups()
+
+    tagged_counts_viz = (
+        rollups.value_counts("Tagged").rename(index=TAGGED_LABELS).reset_index()
+    )
+    tagged_counts_viz.columns = ["Tagged", "Count"]
+
+    # Same rollup as Task 2.3, read from the shared result
+    cost_dept_tagged_viz = rollups.cost_by(["Department", "Tagged"])
+    cost_dept_tagged_viz["Tagged"] = label_tagged(cost_dept_tagged_viz["Tagged"])
+
+    return {
+        "tagged_counts_viz": tagged_counts_viz,
+        "cost_dept_tagged_viz": cost_dept_tagged_viz,
+        "cost_by_service": rollups.cost_by("Service").sort_values(COST, ascending=True),
+        "cost_by_env": rollups.cost_by("Environment"),
+    }
+
+
+def filtered_view(filter_cube, selections):
+    """Task 4.5 metrics for one filter, answered from the filter cube.
+
+    ``filter_cube`` is a ``CostRollups`` over ``FILTER_DIMENSIONS`` and
+    ``selections`` maps dimensions to selected values (``None``: no filter).
+    """
+    filtered = filter_cube.where(selections)
+    tagged, _ = filtered.tagged_totals(True)
+    untagged, _ = filtered.tagged_totals(False)
+
+    tagged_counts = (
+        filtered.value_counts("Tagged").rename(index=TAGGED_LABELS).reset_index()
+    )
+    tagged_counts.columns = ["Tagged", "Count"]
+
+    return {
+        "total_resources": filtered.total_resources,
+        "total_cost": filtered.total_cost,
+        "tagged": tagged,
+        "untagged": untagged,
+        "tagged_counts": tagged_counts,
+        "top_services": filtered.cost_by("Service")
+        .sort_values(COST, ascending=False)
+        .head(10),
+    }
+
+
+# ============================================================================
+# TASK SET 5 - TAG REMEDIATION WORKFLOW
+# ============================================================================
+
+
+def _editable(rows):
+    # Plain-text tag columns, so new values need not be existing categories
+    return (
+        with_tag_labels(rows)
+        .astype({field: object for field in TAG_FIELDS})
+        .reset_index(drop=True)
+    )
+
+
+def untagged_for_edit(df):
+    """Untagged resources with plain-text tag columns, ready for editing."""
+    return _editable(df[untagged_mask(df)])
+
+
+class UntaggedPages:
+    """Server-side search, sort and paging over the untagged resources.
+
+    ``select`` returns row positions into ``df``; ``page`` turns one page of
+    them into an editable frame, so an editor only ever receives
+    ``page_size`` rows.
+    """
+
+    def __init__(self, df):
+        self.df = df
+        self.rows = np.flatnonzero(untagged_mask(df).to_numpy())
+        self._last = None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _matches(self, column, search):
+        values = self.df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            # Search the distinct values, then pick rows by code
+            hits = values.cat.categories.astype(str).str.contains(
+                search, case=False, regex=False
+            )
+            codes = values.cat.codes.to_numpy()[self.rows]
+            return np.isin(codes, np.flatnonzero(hits))
+        return (
+            values.iloc[self.rows]
+            .astype(str)
+            .str.contains(search, case=False, regex=False)
+            .to_numpy()
+        )
+
+    def select(self, search="", sort=None):
+        """Positions of untagged rows matching ``search``, in ``sort`` order.
+
+        ``search`` is a case-insensitive substring of any SEARCH_COLUMNS
+        value. ``sort`` is one of PAGE_SORTS; missing costs sort last.
+        """
+        search = search.strip()
+        # Shared across sessions: read the memo once
+        last = self._last
+        if last is not None and last[:2] == (search, sort):
+            return last[2]
+
+        rows = self.rows
+        if search:
+            matched = np.zeros(len(rows), dtype=bool)
+            for column in SEARCH_COLUMNS:
+                matched |= self._matches(column, search)
+            rows = rows[matched]
+        if sort is not None:
+            costs = self.df[COST].to_numpy()[rows]
+            order = np.argsort(costs if sort == "cost_asc" else -costs, kind="stable")
+            rows = rows[order]
+
+        self._last = (search, sort, rows)
+        return rows
+
+    def page(self, rows, page, page_size):
+        """Editable frame of page ``page`` (from 0) of the positions ``rows``."""
+        start = page * page_size
+        return _editable(self.df.iloc[rows[start : start + page_size]])
+
+
+def _tagging_totals(tagged, untagged, untagged_cost, total_resources, total_cost):
+    return {
+        "tagged": tagged,
+        "untagged": untagged,
+        "untagged_cost": untagged_cost,
+        "total_resources": total_resources,
+        "total_cost": total_cost,
+    }
+
+
+def _before_tagging_totals(rollups):
+    untagged, untagged_cost = rollups.tagged_totals(False)
+    tagged, _ = rollups.tagged_totals(True)
+    return _tagging_totals(
+        tagged, untagged, untagged_cost, rollups.total_resources, rollups.total_cost
+    )
+
+
+def _compare_remediation(before, after):
+    before_untagged_pct = before["untagged"] / before["total_resources"] * 100
+    after_untagged_pct = _percentage(after["untagged"], after["total_resources"])
+    return {
+        "before_untagged": before["untagged"],
+        "before_tagged": before["tagged"],
+        "before_untagged_pct": before_untagged_pct,
+        "before_untagged_cost": before["untagged_cost"],
+        "before_untagged_cost_pct": before["untagged_cost"]
+        / before["total_cost"]
+        * 100,
+        "after_untagged": after["untagged"],
+        "after_tagged": after["tagged"],
+        "after_untagged_pct": after_untagged_pct,
+        "after_untagged_cost": after["untagged_cost"],
+        "after_untagged_cost_pct": _percentage(
+            after["untagged_cost"], after["total_cost"]
+        ),
+        "improvement": before_untagged_pct - after_untagged_pct,
+    }
+
+
+def task_set_5(df, remediated, rollups=None):
+    """Before/after tagging and cost-visibility metrics for a remediation."""
+    rollups = rollups if rollups is not None else CostRollups(df)
+
+    after_untagged_rows = remediated["Tagged"] == "No"
+    after = _tagging_totals(
+        int((remediated["Tagged"] == "Yes").sum()),
+        int(after_untagged_rows.sum()),
+        remediated.loc[after_untagged_rows, COST].sum(),
+        len(remediated),
+        remediated[COST].sum(),
+    )
+    return _compare_remediation(_before_tagging_totals(rollups), after)
+
+
+class RemediationMetrics:
+    """Task 5.4 metrics kept up to date from the patched rows alone.
+
+    The "before" side and the state of the unedited untagged rows are
+    computed once. ``compare`` then only looks at the resources in the
+    given ``TagPatches``. The result matches
+    ``task_set_5(df, RemediationOverlay(df).frame(patches))``.
+    """
+
+    def __init__(self, df, rollups=None):
+        rollups = rollups if rollups is not None else CostRollups(df)
+        self.before = _before_tagging_totals(rollups)
+        _, self.tagged_cost = rollups.tagged_totals(True)
+
+        untagged = df.loc[untagged_mask(df), KEY_COLUMNS + TAG_FIELDS + [COST]]
+        self.rows_by_key = row_lookup(resource_keys(untagged))
+        # Which tags each untagged row has, per field
+        self.present = {
+            field: untagged[field].notna().to_numpy() for field in TAG_FIELDS
+        }
+        self.costs = untagged[COST].fillna(0).to_numpy()
+        # Untagged rows that already have every tag count as remediated
+        self.filled = np.logical_and.reduce(list(self.present.values()))
+        self.filled_count = int(self.filled.sum())
+        self.filled_cost = untagged[COST][self.filled].sum()
+
+    def remediated_totals(self, patches):
+        """(resource count, cost) of untagged rows that now have every tag."""
+        count, cost = self.filled_count, self.filled_cost
+        # Patches to originally tagged rows never change their status
+        matches = matching_rows(self.rows_by_key, patches.keys())
+        if not matches:
+            return count, cost
+        positions = np.array([position for position, _ in matches], dtype=np.intp)
+        edits = [patches.cells[key] for _, key in matches]
+        filled = np.ones(len(matches), dtype=bool)
+        for field in TAG_FIELDS:
+            # 1 if a patch fills the field, 0 if it clears it, -1 if unpatched
+            patched = np.array(
+                [
+                    -1 if field not in cells else int(pd.notna(cells[field]))
+                    for cells in edits
+                ],
+                dtype=np.int8,
+            )
+            filled &= np.where(
+                patched < 0, self.present[field][positions], patched == 1
+            )
+        was_filled = self.filled[positions]
+        gained = filled & ~was_filled
+        lost = was_filled & ~filled
+        count += int(gained.sum()) - int(lost.sum())
+        cost += self.costs[positions][gained].sum() - self.costs[positions][lost].sum()
+        return count, cost
+
+    def compare(self, patches):
+        """Before/after metrics, as returned by ``task_set_5``."""
+        before = self.before
+        remediated, remediated_cost = self.remediated_totals(patches)
+        # Rows with no Tagged flag are left out of the remediated dataset
+        after = _tagging_totals(
+            before["tagged"] + remediated,
+            before["untagged"] - remediated,
+            before["untagged_cost"] - remediated_cost,
+            before["tagged"] + before["untagged"],
+            self.tagged_cost + before["untagged_cost"],
+        )
+        return _compare_remediation(before, after)
+
+
+# ============================================================================
+# BATCH REPORT
+# ============================================================================
+
+
+def build_report(df):
+    """Task Set 1-4 results for ``df``.
+
+    ``df`` may also be a query backend. Task Set 5 needs user edits, so a
+    batch report has no remediation section.
+    """
+    backend = as_backend(df)
+    rollups = backend.rollups()
+    task_3 = task_set_3(backend)
+    task_3["lowest_completeness"] = task_3["lowest_completeness"][
+        LOWEST_COMPLETENESS_COLUMNS
+    ]
+    task_3["untagged_resources"] = task_3["untagged_resources"][UNTAGGED_COLUMNS]
+    return {
+        "data_exploration": task_set_1(backend, rollups),
+        "cost_visibility": task_set_2(backend, rollups),
+        "tagging_compliance": task_3,
+        "visualization": task_set_4(backend, rollups),
+    }
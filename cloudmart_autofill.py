@@ -0,0 +1,209 @@
+"""Rule-based bulk fills for missing tags (Task 5.2).
+
+Filling tags one cell at a time does not scale to hundreds of thousands of
+untagged resources. ``TagInference`` learns one lookup table per rule, such
+as ``AccountID + Project -> Owner``, from the tagged rows: for every
+combination of key values, the target value seen most often with it.
+``proposals`` then fills every untagged row at once:
+
+* the key columns of a rule are combined into one integer per row from
+  their category codes and looked up in the rule's table with a hash join
+  (``Index.get_indexer``), never row by row;
+* rules run in order and only fill cells that are still missing, so a value
+  filled by one rule can be a key of a later one (``Project`` then
+  ``Project -> Department``);
+* every fill has a confidence: the share of the key's tagged rows that have
+  the chosen value, shrunk for rarely seen keys (``top / (rows + 1)``, so
+  one matching row gives 0.5 and 9 out of 9 give 0.9), times the
+  confidences of any inferred keys.
+
+Accepted fills become ordinary ``TagPatches``.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cloudmart_patches import KEY_COLUMNS, TagPatches
+from cloudmart_schema import TAG_FIELDS, tagged_mask, untagged_mask
+
+# (key columns, target tag field), applied in this order
+DEFAULT_RULES = [
+    (["AccountID", "Owner"], "Project"),
+    (["Project"], "Department"),
+    (["AccountID", "Project"], "Owner"),
+    (["Project"], "Owner"),
+    (["Department"], "CostCenter"),
+]
+
+DEFAULT_MIN_CONFIDENCE = 0.8
+
+PROPOSAL_COLUMNS = KEY_COLUMNS + ["Field", "Value", "Confidence", "Rule"]
+
+
+def rule_label(keys, target):
+    return f"{' + '.join(keys)} → {target}"
+
+
+def _factorize(column):
+    # Category codes (-1 when missing) and the values they stand for
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy().astype(np.int64), column.cat.categories
+    codes, values = pd.factorize(column)
+    return codes.astype(np.int64), values
+
+
+class _LookupTable:
+    """Most common target code per combined key, with its confidence."""
+
+    def __init__(self, keys, targets):
+        counts = (
+            pd.DataFrame({"key": keys, "target": targets})
+            .groupby(["key", "target"], sort=False)
+            .size()
+            .rename("rows")
+            .reset_index()
+        )
+        totals = counts.groupby("key", sort=False)["rows"].transform("sum")
+        counts["confidence"] = counts["rows"] / (totals + 1)
+        # Most rows first; ties go to the first value in category order
+        best = counts.sort_values(
+            ["key", "rows", "target"], ascending=[True, False, True]
+        ).drop_duplicates("key")
+        self.keys = pd.Index(best["key"].to_numpy())
+        self.targets = best["target"].to_numpy()
+        self.confidence = best["confidence"].to_numpy()
+
+    def __len__(self):
+        return len(self.keys)
+
+
+class TagInference:
+    """Lookup tables of ``rules`` learned from the tagged rows of ``df``."""
+
+    def __init__(self, df, rules=DEFAULT_RULES):
+        self.df = df
+        self.rules = [(list(keys), target) for keys, target in rules]
+        for _, target in self.rules:
+            if target not in TAG_FIELDS:
+                raise KeyError(f"Not a tag field: {target}")
+
+        columns = {column for keys, target in self.rules for column in keys + [target]}
+        self._codes = {}
+        self._values = {}
+        for column in columns:
+            self._codes[column], self._values[column] = _factorize(df[column])
+
+        tagged = tagged_mask(df).to_numpy()
+        self.tables = []
+        for keys, target in self.rules:
+            rows = tagged & (self._codes[target] >= 0)
+            for column in keys:
+                rows &= self._codes[column] >= 0
+            positions = np.flatnonzero(rows)
+            self.tables.append(
+                _LookupTable(
+                    self._combined(keys, self._codes, positions),
+                    self._codes[target][positions],
+                )
+            )
+
+    def _combined(self, keys, codes, positions):
+        # One integer per row for the key columns' codes (all present)
+        key = np.zeros(len(positions), dtype=np.int64)
+        size = 1
+        for column in keys:
+            cardinality = max(len(self._values[column]), 1)
+            size *= cardinality
+            if size >= 2**62:
+                raise ValueError(f"Too many key combinations: {' + '.join(keys)}")
+            key = key * cardinality + codes[column][positions]
+        return key
+
+    def rule_sizes(self):
+        """Learned key combinations per rule."""
+        return pd.Series(
+            [len(table) for table in self.tables],
+            index=[rule_label(keys, target) for keys, target in self.rules],
+            name="Keys",
+        )
+
+    def proposals(self):
+        """Suggested fills of the untagged rows' missing tags.
+
+        One row per filled cell (``PROPOSAL_COLUMNS``), indexed like ``df``,
+        in row order.
+        """
+        candidates = untagged_mask(self.df).to_numpy()
+        codes = {column: values.copy() for column, values in self._codes.items()}
+        confidence = {column: np.ones(len(self.df)) for column in codes}
+        fills = []
+        for (keys, target), table in zip(self.rules, self.tables):
+            rows = candidates & (codes[target] < 0)
+            for column in keys:
+                rows &= codes[column] >= 0
+            positions = np.flatnonzero(rows)
+            if len(positions) == 0 or len(table) == 0:
+                continue
+            match = table.keys.get_indexer(self._combined(keys, codes, positions))
+            found = match >= 0
+            positions, match = positions[found], match[found]
+
+            score = table.confidence[match]
+            for column in keys:
+                score = score * confidence[column][positions]
+            codes[target][positions] = table.targets[match]
+            confidence[target][positions] = score
+            fills.append(
+                (
+                    positions,
+                    target,
+                    self._values[target].take(table.targets[match]),
+                    score,
+                    rule_label(keys, target),
+                )
+            )
+        return self._frame(fills)
+
+    def _frame(self, fills):
+        if not fills:
+            return pd.DataFrame(columns=PROPOSAL_COLUMNS)
+        positions = np.concatenate([fill[0] for fill in fills])
+        order = np.argsort(positions, kind="stable")
+        positions = positions[order]
+        proposals = {
+            column: self.df[column].iloc[positions].to_numpy() for column in KEY_COLUMNS
+        }
+        proposals["Field"] = np.concatenate(
+            [np.full(len(fill[0]), fill[1], dtype=object) for fill in fills]
+        )[order]
+        proposals["Value"] = np.concatenate(
+            [np.asarray(fill[2], dtype=object) for fill in fills]
+        )[order]
+        proposals["Confidence"] = np.concatenate([fill[3] for fill in fills])[order]
+        proposals["Rule"] = np.concatenate(
+            [np.full(len(fill[0]), fill[4], dtype=object) for fill in fills]
+        )[order]
+        return pd.DataFrame(proposals, index=self.df.index[positions])
+
+
+def summarize(proposals):
+    """Suggested fills and their mean confidence per rule."""
+    return (
+        proposals.groupby(["Field", "Rule"], sort=False)["Confidence"]
+        .agg(Fills="size", Mean_Confidence="mean")
+        .rename(columns={"Mean_Confidence": "Mean Confidence"})
+        .reset_index()
+    )
+
+
+def to_patches(proposals):
+    """``TagPatches`` setting every proposed value."""
+    cells = {}
+    for account, resource, field, value in zip(
+        proposals["AccountID"].astype(str),
+        proposals["ResourceID"].astype(str),
+        proposals["Field"],
+        proposals["Value"],
+    ):
+        cells.setdefault((account, resource), {})[field] = value
+    return TagPatches(cells)
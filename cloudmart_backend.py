@@ -0,0 +1,417 @@
+"""Query backends behind the dashboard's aggregations.
+
+The row-scanning queries of the analytics (the rollup base tables, missing
+value counts, completeness scoring and the untagged resource list) go
+through a backend, chosen with the ``CLOUDMART_BACKEND`` setting:
+
+* ``pandas`` (default) runs them over the loaded in-memory frame;
+* ``duckdb`` scans the Parquet sidecar caches of the source files lazily
+  with an embedded DuckDB database, which spills to disk once it reaches
+  ``CLOUDMART_DUCKDB_MEMORY``, so the dataset never has to fit in RAM.
+
+Both return the same pandas results: the same rows in the same order, with
+the same index (the row's position in the loaded dataset). Ties are broken
+by that position. Cost sums can differ in the last floating-point digit,
+because the engines add values in a different order.
+
+DuckDB is optional (``pip install duckdb``); the ``pandas`` backend needs
+nothing beyond the dashboard's own dependencies.
+"""
+
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from cloudmart_aggregates import COST, RESOURCES, ROLLUP_DIMENSIONS, CostRollups
+from cloudmart_data import (
+    DATA_SOURCE,
+    SOURCE_COLUMN,
+    account_id_from_name,
+    appended_positions,
+    cache_is_fresh,
+    cache_path,
+    dataset_version,
+    expand_sources,
+    load_sources,
+    refresh_cache,
+    refresh_caches,
+)
+from cloudmart_normalize import canonical_values, normalize_tags
+from cloudmart_presence import TagPresence, missing_patterns
+from cloudmart_schema import TAG_FIELDS, apply_schema, untagged_mask
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None
+
+QUERY_BACKEND = os.environ.get("CLOUDMART_BACKEND", "pandas")
+# DuckDB memory cap before spilling to CLOUDMART_DUCKDB_TEMP
+DUCKDB_MEMORY = os.environ.get("CLOUDMART_DUCKDB_MEMORY", "2GB")
+DUCKDB_TEMP = os.environ.get(
+    "CLOUDMART_DUCKDB_TEMP", os.path.join(tempfile.gettempdir(), "cloudmart_duckdb")
+)
+
+SCORE = "Tag_Completeness_Score"
+PERCENTAGE = "Tag_Completeness_Percentage"
+
+
+def with_completeness(frame, tag_fields=TAG_FIELDS):
+    """Copy of ``frame`` with its tag completeness score and percentage."""
+    frame = frame.copy()
+    frame[SCORE] = frame[tag_fields].notna().sum(axis=1)
+    frame[PERCENTAGE] = (frame[SCORE] / len(tag_fields) * 100).round(2)
+    return frame
+
+
+def _same_values(before, after):
+    # Appending only adds values: a category of ``before`` missing from
+    # ``after`` means the earlier rows now read differently, so aggregates
+    # over them cannot be kept
+    for column in before.columns:
+        dtype = before[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype) and column in after.columns:
+            categories = after[column].dtype
+            if not isinstance(categories, pd.CategoricalDtype) or not (
+                dtype.categories.isin(categories.categories).all()
+            ):
+                return False
+    return True
+
+
+class PandasBackend:
+    """Queries over a loaded frame.
+
+    Completeness queries are answered from a ``TagPresence`` mask, built on
+    first use and kept with the backend, like the rollups. ``version`` is the
+    ``dataset_version`` of the rows in ``df``; with it, ``extend_from`` can
+    carry both over from the backend of an earlier version.
+    """
+
+    name = "pandas"
+
+    def __init__(self, df, version=None):
+        self.df = df
+        # Only trust a version that describes exactly these rows
+        if version is not None and sum(v[2] or 0 for v in version) != len(df):
+            version = None
+        self.version = version
+        self._presence = {}
+        self._rollups = {}
+
+    def extend_from(self, previous):
+        """Reuse the rollups and presence masks of ``previous`` if rows were
+        only appended since, grouping and scanning just the new rows.
+
+        Nothing is reused when the earlier rows' values changed as well.
+        """
+        if not isinstance(previous, PandasBackend) or None in (
+            previous.version,
+            self.version,
+        ):
+            return
+        positions = appended_positions(previous.version, self.version)
+        if positions is None or len(previous.df) + len(positions) != len(self.df):
+            return
+        if not _same_values(previous.df, self.df):
+            return
+        added = self.df.iloc[positions]
+        for key, rollups in previous._rollups.items():
+            self._rollups.setdefault(key, rollups.extend(added))
+        # Masks are positional, so they only extend when rows were added last
+        if np.array_equal(positions, np.arange(len(previous.df), len(self.df))):
+            for key, presence in previous._presence.items():
+                self._presence.setdefault(key, presence.extend(added))
+
+    def presence(self, tag_fields=TAG_FIELDS):
+        key = tuple(tag_fields)
+        if key not in self._presence:
+            self._presence[key] = TagPresence(self.df, tag_fields)
+        return self._presence[key]
+
+    @property
+    def columns(self):
+        return list(self.df.columns)
+
+    def row_count(self):
+        return len(self.df)
+
+    def rollups(self, dimensions=ROLLUP_DIMENSIONS):
+        key = tuple(dimensions)
+        if key not in self._rollups:
+            self._rollups[key] = CostRollups(self.df, dimensions)
+        return self._rollups[key]
+
+    def missing_counts(self, columns=None):
+        """Missing values per column, like ``df[columns].isnull().sum()``."""
+        if columns is not None and set(columns) <= set(TAG_FIELDS):
+            return self.presence(columns).missing_counts()
+        frame = self.df if columns is None else self.df[list(columns)]
+        return frame.isnull().sum()
+
+    def scored(self, tag_fields=TAG_FIELDS, n=None):
+        """The first ``n`` rows (all if ``None``) with completeness scores."""
+        return with_completeness(self.df if n is None else self.df.head(n), tag_fields)
+
+    def completeness(self, tag_fields=TAG_FIELDS, n=5):
+        """(average completeness percentage, the ``n`` least complete rows)."""
+        presence = self.presence(tag_fields)
+        lowest = presence.lowest(n)
+        scores = presence.scores[lowest].astype("int64")
+        rows = self.df.iloc[lowest].copy()
+        rows[SCORE] = scores
+        rows[PERCENTAGE] = presence.percentages(scores)
+        return presence.average_percentage(), rows
+
+    def missing_patterns(self, tag_fields=TAG_FIELDS):
+        """Resources per combination of missing tag fields, most common first."""
+        return self.presence(tag_fields).missing_patterns()
+
+    def untagged(self):
+        """Untagged rows, most expensive first (missing costs last)."""
+        untagged = self.df[untagged_mask(self.df)]
+        return untagged.sort_values(COST, ascending=False, kind="stable")
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def _literal(text):
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+class DuckDBBackend:
+    """Queries over the Parquet caches of ``source``, scanned by DuckDB.
+
+    Rows get the columns ``load_sources`` would give them (an ``AccountID``
+    from the file name where missing, ``SourceFile`` for several files)
+    and a hidden ``_row`` position, used as the index of returned rows.
+    With ``aliases``, tag values read as ``normalize_tags`` would make them.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, source=DATA_SOURCE, memory_limit=DUCKDB_MEMORY, aliases=None):
+        if duckdb is None:
+            raise ImportError(
+                "The duckdb backend needs the duckdb package (pip install duckdb)"
+            )
+        paths = expand_sources(source)
+        refresh_caches(paths)
+        for path in paths:
+            if not cache_is_fresh(path):
+                refresh_cache(path)
+                if not cache_is_fresh(path):
+                    raise OSError(f"Cannot write the Parquet cache of {path}")
+
+        os.makedirs(DUCKDB_TEMP, exist_ok=True)
+        self.connection = duckdb.connect(
+            config={
+                "memory_limit": memory_limit,
+                "temp_directory": DUCKDB_TEMP,
+                "preserve_insertion_order": False,
+            }
+        )
+        self._columns, selects = self._file_selects(paths)
+        self.connection.execute(
+            "CREATE VIEW raw_rows AS " + " UNION ALL BY NAME ".join(selects)
+        )
+        self.connection.execute("CREATE VIEW rows AS " + self._normalized(aliases))
+
+    def extend_from(self, previous):
+        # Every query scans the current caches; nothing to carry over
+        pass
+
+    def _file_selects(self, paths):
+        selects = []
+        columns = None
+        offset = 0
+        for path in paths:
+            cache = cache_path(path)
+            names = pq.read_schema(cache).names
+            file_columns = names if "AccountID" in names else ["AccountID"] + names
+            if len(paths) > 1:
+                file_columns = file_columns + [SOURCE_COLUMN]
+            if columns is None:
+                columns = file_columns
+            elif set(file_columns) != set(columns):
+                raise ValueError(f"{path} does not match the schema of {paths[0]}")
+
+            extra = []
+            if "AccountID" not in names:
+                extra.append(f"{account_id_from_name(path)} AS AccountID")
+            if len(paths) > 1:
+                extra.append(f"{_literal(path)} AS {SOURCE_COLUMN}")
+            extra.append(f"file_row_number + {offset} AS _row")
+            selects.append(
+                f"SELECT *, {', '.join(extra)} "
+                f"FROM read_parquet({_literal(cache)}, file_row_number = true)"
+            )
+            offset += pq.ParquetFile(cache).metadata.num_rows
+        return columns, selects
+
+    def _normalized(self, aliases):
+        # Like normalize_tags: each distinct value of a listed text column is
+        # mapped once, into a lookup table the rows are joined with
+        types = dict(
+            self.connection.execute(
+                "SELECT column_name, column_type FROM (DESCRIBE raw_rows)"
+            ).fetchall()
+        )
+        replaced = []
+        joins = []
+        for column, settings in (aliases or {}).items():
+            if types.get(column) != "VARCHAR":
+                continue
+            values = [
+                value
+                for (value,) in self.connection.execute(
+                    f"SELECT DISTINCT {_quote(column)} FROM raw_rows "
+                    f"WHERE {_quote(column)} IS NOT NULL"
+                ).fetchall()
+            ]
+            canonical = canonical_values(values, settings)
+            if canonical == values:
+                continue
+            table = f"aliases_{len(joins)}"
+            self.connection.register(
+                "mapping",
+                pd.DataFrame({"value": values, "canonical": canonical}, dtype=object),
+            )
+            self.connection.execute(
+                f"CREATE TABLE {table} AS SELECT CAST(value AS VARCHAR) AS value, "
+                "CAST(canonical AS VARCHAR) AS canonical FROM mapping"
+            )
+            self.connection.unregister("mapping")
+            replaced.append(f"{table}.canonical AS {_quote(column)}")
+            joins.append(
+                f" LEFT JOIN {table} ON raw_rows.{_quote(column)} = {table}.value"
+            )
+        if not replaced:
+            return "SELECT * FROM raw_rows"
+        return (
+            f"SELECT raw_rows.* REPLACE ({', '.join(replaced)}) FROM raw_rows"
+            + "".join(joins)
+        )
+
+    def _query(self, sql):
+        # One cursor per query, so cached backends can serve several sessions
+        return self.connection.cursor().execute(sql).df()
+
+    def _rows(self, sql):
+        frame = self._query(sql).set_index("_row").rename_axis(None)
+        return self._typed(frame[[c for c in self._columns if c in frame.columns]])
+
+    @staticmethod
+    def _typed(frame):
+        if "Tagged" in frame.columns:
+            frame = frame.astype({"Tagged": "boolean"})
+        if SOURCE_COLUMN in frame.columns:
+            frame = frame.astype({SOURCE_COLUMN: "category"})
+        return apply_schema(frame)
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def row_count(self):
+        return int(self._query("SELECT COUNT(*) AS n FROM rows")["n"].iloc[0])
+
+    def rollups(self, dimensions=ROLLUP_DIMENSIONS):
+        keys = ", ".join(_quote(column) for column in dimensions)
+        base = self._query(
+            f"SELECT {keys}, COALESCE(SUM({_quote(COST)}), 0) AS {_quote(COST)}, "
+            f"COUNT(*) AS {_quote(RESOURCES)} FROM rows GROUP BY {keys}"
+        )
+        return CostRollups.from_base(self._typed(base), dimensions)
+
+    def missing_counts(self, columns=None):
+        columns = self._columns if columns is None else list(columns)
+        counts = self._query(
+            "SELECT "
+            + ", ".join(
+                f"COUNT(*) - COUNT({_quote(c)}) AS {_quote(c)}" for c in columns
+            )
+            + " FROM rows"
+        )
+        return counts.iloc[0].astype("int64").rename(None)
+
+    def _score_sql(self, tag_fields):
+        score = " + ".join(
+            f"CAST({_quote(field)} IS NOT NULL AS INTEGER)" for field in tag_fields
+        )
+        return (
+            f"SELECT *, {score} AS {SCORE}, "
+            f"ROUND(CAST({score} AS DOUBLE) / {len(tag_fields)} * 100, 2) "
+            f"AS {PERCENTAGE} "
+            "FROM rows"
+        )
+
+    def scored(self, tag_fields=TAG_FIELDS, n=None):
+        limit = "" if n is None else f" LIMIT {int(n)}"
+        frame = self._query(
+            f"SELECT * FROM ({self._score_sql(tag_fields)}) ORDER BY _row{limit}"
+        )
+        return self._scored_rows(frame)
+
+    def _scored_rows(self, frame):
+        frame = frame.set_index("_row").rename_axis(None)
+        scores = frame[[SCORE, PERCENTAGE]]
+        rows = self._typed(frame[self._columns])
+        rows[SCORE] = scores[SCORE].astype("int64")
+        rows[PERCENTAGE] = scores[PERCENTAGE].astype("float64")
+        return rows
+
+    def completeness(self, tag_fields=TAG_FIELDS, n=5):
+        scored = self._score_sql(tag_fields)
+        average = self._query(f"SELECT AVG({PERCENTAGE}) AS a FROM ({scored})")
+        lowest = self._query(
+            f"SELECT * FROM ({scored}) ORDER BY {SCORE}, _row LIMIT {int(n)}"
+        )
+        return float(average["a"].iloc[0]), self._scored_rows(lowest)
+
+    def missing_patterns(self, tag_fields=TAG_FIELDS):
+        mask = " + ".join(
+            f"CAST({_quote(field)} IS NOT NULL AS INTEGER) * {1 << bit}"
+            for bit, field in enumerate(tag_fields)
+        )
+        counts = self._query(
+            f"SELECT {mask} AS mask, COUNT(*) AS n FROM rows GROUP BY mask "
+            "ORDER BY mask"
+        )
+        return missing_patterns(tag_fields, counts["mask"], counts["n"])
+
+    def untagged(self):
+        return self._rows(
+            f"SELECT * FROM rows WHERE NOT Tagged "
+            f"ORDER BY {_quote(COST)} DESC NULLS LAST, _row"
+        )
+
+
+BACKENDS = {"pandas": PandasBackend, "duckdb": DuckDBBackend}
+
+
+def open_backend(name=QUERY_BACKEND, source=DATA_SOURCE, df=None, aliases=None):
+    """Backend ``name`` over ``source``, with tag values normalized by
+    ``aliases``; the pandas one uses ``df`` if given (the rows of ``source``
+    as currently cached, already normalized)."""
+    if name not in BACKENDS:
+        raise ValueError(
+            f"Unknown query backend: {name} (choose from {', '.join(BACKENDS)})"
+        )
+    if name == "pandas":
+        if df is None:
+            df, _ = normalize_tags(load_sources(source), aliases)
+        return PandasBackend(df, dataset_version(source))
+    return DuckDBBackend(source, aliases=aliases)
+
+
+def as_backend(data):
+    """``data`` itself if it is a backend, else a ``PandasBackend`` over it."""
+    if isinstance(data, pd.DataFrame):
+        return PandasBackend(data)
+    return data
@@ -0,0 +1,216 @@
+"""Data-size benchmarks for the CloudMart analytics.
+
+For each size, a synthetic export is generated with ``cloudmart_synth`` and
+the dashboard's work is timed step by step: loading (cold parse and warm
+cache read), each Task Set's computations, the Task 4.5 filter path and the
+CSV exports. Results are saved as JSON so a later run can be compared with
+them::
+
+    python cloudmart_bench.py --sizes 1K 100K 1M --output bench.json
+    python cloudmart_bench.py --sizes 1K 100K 1M --compare bench.json
+
+Generated exports are kept in ``--workdir`` and reused by later runs.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from cloudmart_aggregates import FILTER_DIMENSIONS, CostRollups
+from cloudmart_autofill import TagInference
+from cloudmart_analytics import (
+    UntaggedPages,
+    filtered_view,
+    task_set_1,
+    task_set_2,
+    task_set_3,
+    task_set_4,
+    task_set_5,
+    untagged_for_edit,
+)
+from cloudmart_data import build_cache, load_dataset
+from cloudmart_export import export_to_tempfile, frame_chunks
+from cloudmart_index import DimensionIndex
+from cloudmart_normalize import load_aliases, normalize_tags
+from cloudmart_patches import RemediationOverlay, TagPatches
+from cloudmart_policy import evaluate_policies, load_policies
+from cloudmart_presence import TagPresence
+from cloudmart_synth import parse_size, write_synthetic
+
+DEFAULT_SIZES = ["1K", "10K", "100K", "1M"]
+DEFAULT_WORKDIR = "bench_data"
+# A step counts as a regression when it is this much slower than the baseline
+# and by more than the noise floor
+REGRESSION_RATIO = 1.25
+NOISE_FLOOR_SECONDS = 0.01
+DEFAULT_REPEAT = 3
+
+# A typical Task 4.5 selection: two services in one region
+FILTER_SELECTIONS = {"Service": ["EC2", "S3"], "Region": ["us-east-1"]}
+EDITOR_PAGE_SIZE = 50
+
+
+class Timer:
+    """Collects the best wall-clock time of named steps."""
+
+    def __init__(self, repeat=DEFAULT_REPEAT):
+        self.repeat = repeat
+        self.timings = {}
+
+    def __call__(self, name, func, *args, **kwargs):
+        best = None
+        for _ in range(self.repeat):
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        self.timings[name] = best
+        return result
+
+
+def synthetic_file(rows, workdir=DEFAULT_WORKDIR, seed=0):
+    """Path of a synthetic export with ``rows`` rows, generated if missing."""
+    os.makedirs(workdir, exist_ok=True)
+    path = os.path.join(workdir, f"cloudmart_{rows}_seed{seed}.csv")
+    if not os.path.exists(path):
+        write_synthetic(path, rows, seed=seed)
+    return path
+
+
+def _export(chunks, fmt="csv"):
+    os.remove(export_to_tempfile(chunks(), fmt))
+
+
+def bench_size(path, repeat=DEFAULT_REPEAT):
+    """Time every dashboard step over the export at ``path``."""
+    timer = Timer(repeat)
+
+    # Loading; the cold parse also (re)writes the Parquet cache
+    timer("load_cold", build_cache, path)
+    df = timer("load_warm", load_dataset, path)
+    df, _ = timer("normalize_tags", normalize_tags, df, load_aliases())
+
+    # Task Sets 1-4
+    rollups = timer("rollups", CostRollups, df)
+    timer("task_set_1", task_set_1, df, rollups)
+    timer("task_set_2", task_set_2, df, rollups)
+    timer("tag_presence", TagPresence, df)
+    timer("task_set_3", task_set_3, df)
+    timer("tag_policies", evaluate_policies, df, load_policies())
+    timer("task_set_4", task_set_4, df, rollups)
+
+    # Task 4.5 filter path
+    filter_cube = timer("filter_cube", CostRollups, df, dimensions=FILTER_DIMENSIONS)
+    dimension_index = timer("dimension_index", DimensionIndex, df)
+    timer("filtered_view", filtered_view, filter_cube, FILTER_SELECTIONS)
+    timer(
+        "filtered_preview",
+        lambda: dimension_index.select(FILTER_SELECTIONS).head(df, 20),
+    )
+
+    # Task Set 5 and the exports
+    timer("untagged_for_edit", untagged_for_edit, df)
+    pages = timer("untagged_pages", UntaggedPages, df)
+    # Later repeats page through the memoized search, like page flips do
+    timer(
+        "editor_page",
+        lambda: pages.page(pages.select("ec2", "cost_desc"), 0, EDITOR_PAGE_SIZE),
+    )
+    inference = timer("tag_inference", TagInference, df)
+    timer("fill_proposals", inference.proposals)
+    overlay = timer("remediation_overlay", RemediationOverlay, df)
+    remediated = timer("remediated_dataset", overlay.frame, TagPatches())
+    timer("task_set_5", task_set_5, df, remediated, rollups)
+    timer("export_original", _export, lambda: frame_chunks(df))
+    timer("export_original_gzip", _export, lambda: frame_chunks(df), "csv.gz")
+    timer("export_original_parquet", _export, lambda: frame_chunks(df), "parquet")
+    timer("export_remediated", _export, lambda: overlay.iter_frames(TagPatches()))
+    timer(
+        "export_untagged",
+        _export,
+        lambda: frame_chunks(task_set_3(df)["untagged_resources"]),
+    )
+    return timer.timings
+
+
+def run(sizes, workdir=DEFAULT_WORKDIR, repeat=DEFAULT_REPEAT, seed=0):
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "sizes": {},
+    }
+    for rows in sizes:
+        path = synthetic_file(rows, workdir, seed=seed)
+        results["sizes"][str(rows)] = bench_size(path, repeat=repeat)
+    return results
+
+
+def compare(results, baseline, ratio=REGRESSION_RATIO):
+    """``(rows, step, baseline seconds, seconds)`` of steps slower than ``ratio``."""
+    regressions = []
+    for rows, timings in results["sizes"].items():
+        previous = baseline["sizes"].get(rows, {})
+        for step, seconds in timings.items():
+            before = previous.get(step)
+            if (
+                before
+                and seconds > before * ratio
+                and seconds - before > NOISE_FLOOR_SECONDS
+            ):
+                regressions.append((rows, step, before, seconds))
+    return regressions
+
+
+def format_results(results):
+    table = pd.DataFrame(results["sizes"])
+    table.columns = [f"{int(rows):,} rows" for rows in table.columns]
+    return table.map(lambda seconds: f"{seconds * 1000:,.1f} ms").to_string()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        nargs="+",
+        type=parse_size,
+        default=[parse_size(size) for size in DEFAULT_SIZES],
+        help=f"row counts (default: {' '.join(DEFAULT_SIZES)})",
+    )
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR)
+    parser.add_argument(
+        "--repeat", type=int, default=DEFAULT_REPEAT, help="runs per step (best)"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", help="write results to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to check against")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, args.workdir, repeat=args.repeat, seed=args.seed)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline)
+        for rows, step, before, seconds in regressions:
+            print(
+                f"REGRESSION {step} at {int(rows):,} rows: "
+                f"{before * 1000:,.1f} ms -> {seconds * 1000:,.1f} ms",
+                file=sys.stderr,
+            )
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Size limits for the dashboard's Plotly figures.
+
+Category charts are drawn from rollups whose size grows with the data
+(thousands of Projects, CostCenters or Owners across accounts), and every
+category ends up in the figure JSON sent to the browser. ``budgeted_figure``
+bounds that payload:
+
+* ``top_categories`` keeps the largest categories by value and folds the
+  long tail into a single "Other" category;
+* scatter traces with many points are switched to WebGL (``Scattergl``);
+* if the figure JSON is still over its byte budget, the category cap is
+  halved until it fits.
+
+Defaults can be overridden with the ``CLOUDMART_CHART_CATEGORIES`` and
+``CLOUDMART_CHART_KB`` environment variables.
+"""
+
+import os
+
+import pandas as pd
+import plotly.graph_objects as go
+
+OTHER = "Other"
+
+# Most categories drawn per chart, including "Other"
+MAX_CATEGORIES = int(os.environ.get("CLOUDMART_CHART_CATEGORIES", "25"))
+# Largest figure JSON sent to the browser per chart
+FIGURE_BUDGET_BYTES = int(os.environ.get("CLOUDMART_CHART_KB", "256")) * 1024
+# Scatter traces with more points than this are drawn with WebGL
+WEBGL_POINTS = 1000
+
+
+def top_categories(data, category, value, max_categories=MAX_CATEGORIES, by=None):
+    """Rows of the ``max_categories - 1`` largest categories plus "Other".
+
+    Categories are ranked by their total ``value``. The rest are summed into
+    an "Other" category, once per ``by`` group (e.g. per Tagged status) if
+    given. Kept rows stay in their original order, followed by "Other".
+    """
+    totals = data.groupby(category, observed=True)[value].sum()
+    if len(totals) <= max_categories:
+        return data
+
+    keep = totals.sort_values(ascending=False).index[: max(max_categories - 1, 1)]
+    kept = data[category].isin(keep)
+    tail = data[~kept]
+    if by is None:
+        other = pd.DataFrame({value: [tail[value].sum()]})
+    else:
+        other = tail.groupby(by, observed=True)[value].sum().reset_index()
+    other[category] = OTHER
+
+    head = data[kept].astype({category: object})
+    return pd.concat(
+        [head, other[head.columns.intersection(other.columns)]], ignore_index=True
+    )
+
+
+def use_webgl(fig, max_points=WEBGL_POINTS):
+    """Redraw scatter traces with more than ``max_points`` points in WebGL."""
+    traces = []
+    changed = False
+    for trace in fig.data:
+        if (
+            isinstance(trace, go.Scatter)
+            and trace.x is not None
+            and len(trace.x) > max_points
+        ):
+            trace = go.Scattergl(trace.to_plotly_json())
+            changed = True
+        traces.append(trace)
+    if changed:
+        fig = go.Figure(data=traces, layout=fig.layout)
+    return fig
+
+
+def figure_bytes(fig):
+    """Size of the figure JSON sent to the browser."""
+    return len(fig.to_json())
+
+
+def budgeted_figure(
+    make_figure,
+    data,
+    category,
+    value,
+    by=None,
+    max_categories=MAX_CATEGORIES,
+    budget_bytes=FIGURE_BUDGET_BYTES,
+):
+    """``make_figure(capped_data)``, within ``max_categories`` and the budget.
+
+    The category cap is halved (down to two: one kept category and "Other")
+    until the figure JSON fits in ``budget_bytes``.
+    """
+    categories = max_categories
+    while True:
+        capped = top_categories(data, category, value, categories, by=by)
+        fig = use_webgl(make_figure(capped))
+        if categories <= 2 or figure_bytes(fig) <= budget_bytes:
+            return fig
+        categories = max(categories // 2, 2)
@@ -1,9 +1,54 @@
-import io
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor, wait
 
 import pandas as pd
 import plotly.express as px
 import streamlit as st
 
+from cloudmart_aggregates import FILTER_DIMENSIONS
+from cloudmart_analytics import (
+    LOWEST_COMPLETENESS_COLUMNS,
+    PAGE_SORTS,
+    UNTAGGED_COLUMNS,
+    RemediationMetrics,
+    UntaggedPages,
+    filtered_view,
+    task_set_1,
+    task_set_2,
+    task_set_3,
+    task_set_4,
+)
+from cloudmart_autofill import (
+    DEFAULT_MIN_CONFIDENCE,
+    TagInference,
+    summarize,
+    to_patches,
+)
+from cloudmart_backend import QUERY_BACKEND, open_backend
+from cloudmart_charts import budgeted_figure
+from cloudmart_data import DATA_SOURCE, sources_stamp
+from cloudmart_export import (
+    EXPORT_FORMATS,
+    PreparedFile,
+    export_to_tempfile,
+    frame_chunks,
+    text_to_tempfile,
+)
+from cloudmart_history import HISTORY_DIMENSIONS, HISTORY_DIR, SnapshotStore
+from cloudmart_index import DimensionIndex
+from cloudmart_normalize import ALIASES_FILE, aliases_stamp, load_aliases
+from cloudmart_patches import RemediationOverlay, TagPatches
+from cloudmart_policy import (
+    POLICY_FILE,
+    evaluate_policies,
+    load_policies,
+    policy_stamp,
+)
+from cloudmart_schema import TAG_FIELDS, with_tag_labels
+from cloudmart_shared import load_shared, shared_report
+
 # Page configuration
 st.set_page_config(page_title="CloudMart Resource Tagging Dashboard", layout="wide")
 
@@ -12,852 +57,1463 @@ st.markdown("### Week 10 Activity - Data Exploration")
 st.markdown("---")
 
 
+# Dataset versions kept by every cache keyed on the data: the current one,
+# and the one before for sessions still finishing a run on it. Each append
+# makes a new version; older ones are evicted rather than kept alive, with
+# their frame, indexes and figures, for the life of the server
+DATASET_VERSIONS = 2
+
+
 # Load dataset function
-@st.cache_data
-def load_data():
-    # Read file and handle the quoted CSV format
-    # Use relative path so it works on any system
+# The stamp argument is every source file's (path, size, mtime) and the alias
+# file's, so the Streamlit cache entry is replaced as soon as an export is
+# added or changes, or the aliases are edited
+@st.cache_resource(max_entries=DATASET_VERSIONS)
+def load_data(stamp):
+    # Stream the quoted CSV format in bounded chunks, through the Parquet
+    # sidecar caches (see cloudmart_data). CLOUDMART_DATA may name a file, a
+    # directory of per-account exports or a glob; stale files parse in parallel.
+    # Tag values are mapped to canonical ones through the alias file (see
+    # cloudmart_normalize), once per distinct value.
+    # The loaded frame is published once per host and memory-mapped read-only
+    # (see cloudmart_shared), so sessions and server processes share one copy
+    sources, _ = stamp
+    return load_shared(DATA_SOURCE, sources, aliases=load_aliases(ALIASES_FILE))
+
+
+# Values changed by the normalization, kept with the shared dataset
+@st.cache_data(max_entries=DATASET_VERSIONS)
+def load_normalization_report(stamp):
+    sources, _ = stamp
+    return shared_report(DATA_SOURCE, sources, aliases=load_aliases(ALIASES_FILE))
+
+
+def get_source_stamp():
     try:
-        with open("cloudmart_multi_account.csv", "r") as f:
-            content = f.read()
-            lines = content.strip().split("\n")
-            cleaned_lines = [line.strip('"') for line in lines]
-            cleaned_content = "\n".join(cleaned_lines)
-
-        df = pd.read_csv(io.StringIO(cleaned_content))
-        df = df.replace("", pd.NA)
-        return df
+        sources = sources_stamp(DATA_SOURCE)
     except FileNotFoundError:
         st.error(
-            "❌ Error: 'cloudmart_multi_account.csv' file not found. Please ensure the CSV file is in the same directory as this script."
+            f"❌ Error: no CSV files found for '{DATA_SOURCE}'. Please ensure the CSV file is in the same directory as this script, or set CLOUDMART_DATA to a file, directory or glob of exports."
         )
         st.stop()
+    try:
+        load_aliases(ALIASES_FILE)
+    except ValueError as e:
+        st.error(f"❌ Error: invalid alias file '{ALIASES_FILE}': {e}")
+        st.stop()
+    return sources, aliases_stamp(ALIASES_FILE)
+
+
+# Most recent backend, whose aggregates the next one can extend; one per
+# alias file version, since rows normalized differently cannot be mixed
+@st.cache_resource(max_entries=DATASET_VERSIONS)
+def latest_backend(aliases):
+    return {}
+
+
+# Query backend for the row scans (CLOUDMART_BACKEND: pandas over the loaded
+# frame, or duckdb over the Parquet caches); shared by all sessions. When
+# rows were only appended to the exports, the previous backend's rollups and
+# tag presence masks are extended with the new rows instead of recomputed
+@st.cache_resource(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_backend(stamp):
+    backend = open_backend(
+        QUERY_BACKEND,
+        DATA_SOURCE,
+        df=load_data(stamp),
+        aliases=load_aliases(ALIASES_FILE),
+    )
+    latest = latest_backend(stamp[1])
+    if "backend" in latest:
+        backend.extend_from(latest["backend"])
+    latest["backend"] = backend
+    return backend
+
+
+# All Task Set 2/4 cost and count rollups come from one scan of the data
+@st.cache_data(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_rollups(stamp):
+    return load_backend(stamp).rollups()
+
+
+# Service x Region x Department x Tagged cube behind the Task 4.5 filters
+@st.cache_data(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_filter_cube(stamp):
+    return load_backend(stamp).rollups(FILTER_DIMENSIONS)
+
+
+# Posting-list indexes for row-level filtering; read-only, so one shared copy
+@st.cache_resource(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_dimension_index(stamp):
+    return DimensionIndex(load_data(stamp))
+
+
+# Task 5.4 "before" totals; edits only update the rows they touch
+@st.cache_resource(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_remediation_metrics(stamp):
+    return RemediationMetrics(load_data(stamp), load_rollups(stamp))
+
+
+# Remediated dataset as tag patches over the shared, read-only base frame
+@st.cache_resource(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_remediation_overlay(stamp):
+    return RemediationOverlay(load_data(stamp))
+
+
+# Exports are written only when asked for, in chunks, to a temporary file.
+# A prepared file is reused until its signature (source, format, edits)
+# changes, and deleted when it is replaced or the session ends. The file is
+# only read into the download button on the run its button was clicked:
+# Streamlit holds a download's bytes in memory, and the Task 5 editor reruns
+# on every edit
+def prepared_download(label, key, file_name, mime, signature, prepare):
+    state_key = f"export_{key}"
+    prepared = st.session_state.get(state_key)
+    ready = prepared is not None and prepared.matches(signature)
+    action = "📥 Get" if ready else "⚙️ Prepare"
+    if not st.button(f"{action} {label}", key=f"prepare_{key}"):
+        return
+    if not ready:
+        if prepared is not None:
+            prepared.remove()
+        prepared = PreparedFile(prepare(), signature)
+        st.session_state[state_key] = prepared
+
+    with open(prepared.path, "rb") as f:
+        st.download_button(
+            label=f"📥 Download {label}",
+            data=f,
+            file_name=file_name,
+            mime=mime,
+            key=key,
+            on_click="ignore",
+        )
 
 
-df = load_data()
+def export_download(label, key, file_name, fmt, signature, chunks):
+    suffix, mime = EXPORT_FORMATS[fmt]
+    prepared_download(
+        label,
+        key,
+        file_name + suffix,
+        mime,
+        signature,
+        lambda: export_to_tempfile(chunks(), fmt),
+    )
 
-# ============================================================================
-# TASK SET 1 - DATA EXPLORATION
-# ============================================================================
 
-st.header("Task Set 1 - Data Exploration")
+# The session's tag edits are counted, so the count can stand in for their
+# content in download signatures
+def count_edit():
+    st.session_state["edit_count"] = st.session_state.get("edit_count", 0) + 1
 
-# Task 1.1: Load the dataset and display the first 5 rows
-st.subheader("Task 1.1: Load the dataset and display the first 5 rows")
-st.write("**Hint:** Use pd.read_csv() or upload via Streamlit")
-st.dataframe(df.head())
-st.success(
-    f"✓ Dataset loaded successfully with {len(df)} rows and {len(df.columns)} columns"
-)
 
-st.markdown("---")
+def merge_patches(patches):
+    for key in ["editor_patches", "editor_base_patches"]:
+        st.session_state[key] = patches.update(st.session_state.get(key, TagPatches()))
+    count_edit()
 
-# Task 1.2: Check for missing values in the dataset
-st.subheader("Task 1.2: Check for missing values in the dataset")
-st.write("**Hint:** df.isnull().sum()")
-missing_values = df.isnull().sum()
-st.write("Missing values per column:")
-st.dataframe(missing_values)
 
-st.markdown("---")
+# Untagged resources for the Task 5.1 editor, searched and paged server-side
+@st.cache_resource(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_untagged_pages(stamp):
+    return UntaggedPages(load_data(stamp))
 
-# Task 1.3: Identify which columns have the most missing values
-st.subheader("Task 1.3: Identify which columns have the most missing values")
-st.write("**Hint:** Look for Department, Project, or Owner")
-missing_sorted = missing_values[missing_values > 0].sort_values(ascending=False)
-st.write("Columns with missing values (sorted by count):")
-st.dataframe(missing_sorted)
-st.info(f"Columns with most missing values: {', '.join(missing_sorted.index.tolist())}")
 
-st.markdown("---")
+# Bulk fill suggestions for the untagged rows' missing tags, learned from the
+# tagged rows; read-only, so one shared copy
+@st.cache_resource(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_fill_proposals(stamp):
+    return TagInference(load_data(stamp)).proposals()
 
-# Task 1.4: Count total resources and how many are tagged vs untagged
-st.subheader("Task 1.4: Count total resources and how many are tagged vs untagged")
-st.write("**Hint:** Use df['Tagged'].value_counts()")
-tagged_counts = df["Tagged"].value_counts()
-st.write("Tagged vs Untagged count:")
-st.dataframe(tagged_counts)
-
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.metric("Total Resources", len(df))
-with col2:
-    st.metric("Tagged (Yes)", tagged_counts.get("Yes", 0))
-with col3:
-    st.metric("Untagged (No)", tagged_counts.get("No", 0))
 
-st.markdown("---")
+# Tag policy violations over the shared frame; the policy stamp changes when
+# the policy file is edited, so rules are re-read and re-evaluated
+@st.cache_resource(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_policy_result(stamp, policies):
+    return evaluate_policies(load_data(stamp), load_policies(POLICY_FILE))
 
-# Task 1.5: What percentage of resources are untagged?
-st.subheader("Task 1.5: What percentage of resources are untagged?")
-st.write("**Hint:** Compute (untagged / total) * 100")
 
-total = len(df)
-untagged = tagged_counts.get("No", 0)
-percentage_untagged = (untagged / total) * 100
+# Task Set 2 tables, read from the rollups
+@st.cache_data(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_cost_visibility(stamp):
+    return task_set_2(load_data(stamp), load_rollups(stamp))
 
-st.write(f"**Calculation:** ({untagged} / {total}) * 100 = {percentage_untagged:.2f}%")
-st.metric("Percentage of Untagged Resources", f"{percentage_untagged:.2f}%")
 
-st.markdown("---")
+# Task Set 3 scores, missing fields and untagged resources; read-only, so one
+# shared copy
+@st.cache_resource(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_compliance(stamp):
+    return task_set_3(load_backend(stamp))
+
+
+def missing_fields_figure(missing_counts):
+    missing_fields = missing_counts.rename_axis("Tag Field").reset_index(name="Missing")
+    return budgeted_figure(
+        lambda data: px.bar(
+            data,
+            x="Tag Field",
+            y="Missing",
+            labels={"Missing": "Number of Missing Values"},
+            title="Missing Tag Fields Frequency",
+        ),
+        missing_fields,
+        "Tag Field",
+        "Missing",
+    )
 
-# ============================================================================
-# TASK SET 2 - COST VISIBILITY
-# ============================================================================
 
-st.header("Task Set 2 - Cost Visibility")
+# Task 3.3 chart, built once per dataset; figures are only read when drawn
+@st.cache_resource(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_compliance_figure(stamp):
+    return missing_fields_figure(load_compliance(stamp)["missing_counts"])
 
-# Task 2.1: Calculate total cost of tagged vs untagged resources
-st.subheader("Task 2.1: Calculate total cost of tagged vs untagged resources")
-st.write("**Hint:** Group by Tagged and sum MonthlyCostUSD")
 
-cost_by_tagged = df.groupby("Tagged")["MonthlyCostUSD"].sum().reset_index()
-st.write("Total cost by tagging status:")
-st.dataframe(cost_by_tagged)
+def visualization_figures(chart_data):
+    """Task 4.1-4.4 figures of ``task_set_4`` results."""
+    figures = {}
 
-col1, col2 = st.columns(2)
-with col1:
-    tagged_cost = cost_by_tagged[cost_by_tagged["Tagged"] == "Yes"][
-        "MonthlyCostUSD"
-    ].values
-    st.metric(
-        "Tagged Resources Cost",
-        f"${tagged_cost[0]:,.2f}" if len(tagged_cost) > 0 else "$0.00",
+    figures["tagged_pie"] = px.pie(
+        chart_data["tagged_counts_viz"],
+        values="Count",
+        names="Tagged",
+        title="Tagged vs Untagged Resources",
+        color="Tagged",
+        color_discrete_map={"Yes": "#28a745", "No": "#dc3545"},
     )
-with col2:
-    untagged_cost = cost_by_tagged[cost_by_tagged["Tagged"] == "No"][
-        "MonthlyCostUSD"
-    ].values
-    st.metric(
-        "Untagged Resources Cost",
-        f"${untagged_cost[0]:,.2f}" if len(untagged_cost) > 0 else "$0.00",
+
+    # Charts show the largest categories and fold the rest into "Other"
+    figures["department_bar"] = budgeted_figure(
+        lambda data: px.bar(
+            data,
+            x="Department",
+            y="MonthlyCostUSD",
+            color="Tagged",
+            title="Cost per Department by Tagging Status",
+            barmode="group",
+            labels={"MonthlyCostUSD": "Monthly Cost (USD)", "Department": "Department"},
+            color_discrete_map={"Yes": "#28a745", "No": "#dc3545"},
+        ),
+        chart_data["cost_dept_tagged_viz"],
+        "Department",
+        "MonthlyCostUSD",
+        by="Tagged",
     )
 
-st.markdown("---")
+    figures["service_bar"] = budgeted_figure(
+        lambda data: px.bar(
+            data.sort_values("MonthlyCostUSD"),
+            x="MonthlyCostUSD",
+            y="Service",
+            orientation="h",
+            title="Total Cost per Service",
+            labels={"MonthlyCostUSD": "Monthly Cost (USD)", "Service": "Service"},
+            color="MonthlyCostUSD",
+            color_continuous_scale="Blues",
+        ),
+        chart_data["cost_by_service"],
+        "Service",
+        "MonthlyCostUSD",
+    )
 
-# Task 2.2: Compute the percentage of total cost that is untagged
-st.subheader("Task 2.2: Compute the percentage of total cost that is untagged")
-st.write("**Hint:** (untagged_cost / total_cost) * 100")
+    cost_by_env = chart_data["cost_by_env"]
+    figures["environment_pie"] = budgeted_figure(
+        lambda data: px.pie(
+            data,
+            values="MonthlyCostUSD",
+            names="Environment",
+            title="Cost by Environment (Pie Chart)",
+        ),
+        cost_by_env,
+        "Environment",
+        "MonthlyCostUSD",
+    )
+    figures["environment_bar"] = budgeted_figure(
+        lambda data: px.bar(
+            data,
+            x="Environment",
+            y="MonthlyCostUSD",
+            title="Cost by Environment (Bar Chart)",
+            labels={
+                "MonthlyCostUSD": "Monthly Cost (USD)",
+                "Environment": "Environment",
+            },
+            color="Environment",
+        ),
+        cost_by_env,
+        "Environment",
+        "MonthlyCostUSD",
+    )
+    return figures
 
-total_cost = df["MonthlyCostUSD"].sum()
-untagged_cost_value = untagged_cost[0] if len(untagged_cost) > 0 else 0
-percentage_untagged_cost = (untagged_cost_value / total_cost) * 100
 
-st.write(
-    f"**Calculation:** (${untagged_cost_value:,.2f} / ${total_cost:,.2f}) * 100 = {percentage_untagged_cost:.2f}%"
-)
-st.metric("Percentage of Untagged Cost", f"{percentage_untagged_cost:.2f}%")
+# Task Set 4 charts, built once per dataset
+@st.cache_resource(max_entries=DATASET_VERSIONS, show_spinner=False)
+def load_visualization_figures(stamp):
+    return visualization_figures(task_set_4(load_data(stamp), load_rollups(stamp)))
 
-st.markdown("---")
 
-# Task 2.3: Identify which department has the most untagged cost
-st.subheader("Task 2.3: Identify which department has the most untagged cost")
-st.write("**Hint:** Group by Department and Tagged")
+# Only the cache entries are kept; futures hold no copy of the results
+def precompute(load, stamp):
+    load(stamp)
+
+
+def precompute_policies(stamp):
+    policies = policy_stamp(POLICY_FILE)
+    if policies is not None:
+        load_policy_result(stamp, policies)
+
 
-cost_by_dept_tagged = (
-    df.groupby(["Department", "Tagged"])["MonthlyCostUSD"].sum().reset_index()
+# Threads computing the sections' results in the background (0 disables it);
+# they share the loaded frame and the caches with the sessions, which a
+# process pool could not
+BACKGROUND_WORKERS = int(
+    os.environ.get("CLOUDMART_WORKERS", min(4, os.cpu_count() or 1))
 )
-untagged_by_dept = cost_by_dept_tagged[
-    cost_by_dept_tagged["Tagged"] == "No"
-].sort_values("MonthlyCostUSD", ascending=False)
 
-st.write("Untagged cost by department:")
-st.dataframe(untagged_by_dept)
+# Heavy results of each section, in the order of the sections
+BACKGROUND_JOBS = {
+    "rollups": load_rollups,
+    "cost_visibility": load_cost_visibility,
+    "compliance": load_compliance,
+    "compliance_figure": load_compliance_figure,
+    "visualization_figures": load_visualization_figures,
+    "filter_cube": load_filter_cube,
+    "dimension_index": load_dimension_index,
+    "untagged_pages": load_untagged_pages,
+    "fill_proposals": load_fill_proposals,
+    "remediation_overlay": load_remediation_overlay,
+    "remediation_metrics": load_remediation_metrics,
+    "policies": precompute_policies,
+}
+
+
+@st.cache_resource
+def worker_pool():
+    return ThreadPoolExecutor(
+        max_workers=BACKGROUND_WORKERS, thread_name_prefix="cloudmart-precompute"
+    )
+
+
+# As soon as a dataset is loaded, every section's results are computed on
+# the pool, once per server process. The jobs fill the loaders' caches; a
+# session asking for a result still being computed waits for that job
+# rather than starting the work again. Failed jobs are left for the
+# section's own loader call to raise
+@st.cache_resource(max_entries=DATASET_VERSIONS)
+def background_jobs(stamp):
+    if BACKGROUND_WORKERS <= 0:
+        return {}
+    pool = worker_pool()
+    return {
+        name: pool.submit(precompute, load, stamp)
+        for name, load in BACKGROUND_JOBS.items()
+    }
+
+
+# Placeholder shown while the named background jobs are still running
+def wait_for(*names):
+    pending = [
+        future
+        for name, future in background_jobs(stamp).items()
+        if name in names and not future.done()
+    ]
+    if pending:
+        with st.spinner("⏳ Computing in the background…"):
+            wait(pending)
+
+
+# Snapshot history; the store version changes when a snapshot is recorded,
+# and only the small metrics/rollups/deltas files are read. Like the dataset
+# caches, only the current and the previous store version are kept
+@st.cache_data(max_entries=DATASET_VERSIONS)
+def load_history(version):
+    store = SnapshotStore(HISTORY_DIR)
+    return store.snapshots(), store.changes()
+
+
+# One entry per dimension of each kept store version
+@st.cache_data(max_entries=DATASET_VERSIONS * len(HISTORY_DIMENSIONS))
+def load_dimension_trend(version, dimension):
+    return SnapshotStore(HISTORY_DIR).dimension_trend(dimension)
+
+
+# Task 4.5 filter values: "All" (or nothing selected) means no filter on
+# that column
+def filter_values(selected):
+    if "All" in selected or len(selected) == 0:
+        return None
+    return selected
+
+
+stamp = get_source_stamp()
+df = load_data(stamp)
+background_jobs(stamp)
+
+
+# ============================================================================
+# TASK SET 1 - DATA EXPLORATION
+# ============================================================================
+
 
-if len(untagged_by_dept) > 0:
-    top_dept = untagged_by_dept.iloc[0]
+def render_data_exploration():
+    st.header("Task Set 1 - Data Exploration")
+
+    # Task 1.1: Load the dataset and display the first 5 rows
+    st.subheader("Task 1.1: Load the dataset and display the first 5 rows")
+    st.write("**Hint:** Use pd.read_csv() or upload via Streamlit")
+    st.dataframe(with_tag_labels(df.head()))
+    st.success(
+        f"✓ Dataset loaded successfully with {len(df)} rows and {len(df.columns)} columns"
+    )
+    normalization = load_normalization_report(stamp)
+    if normalization is not None and normalization.empty:
+        st.caption(
+            f"Tag values checked against `{ALIASES_FILE}`; none needed normalizing."
+        )
+    elif normalization is not None:
+        with st.expander(
+            f"🧹 {len(normalization)} tag values normalized while loading "
+            f"({normalization['Rows'].sum():,} cells)"
+        ):
+            st.write(f"Raw values mapped to canonical ones through `{ALIASES_FILE}`:")
+            st.dataframe(normalization, hide_index=True)
+
+    st.markdown("---")
+
+    # The preview above is shown first; the rest waits for the rollups
+    wait_for("rollups")
+    # All computations live in cloudmart_analytics; this script only renders them
+    exploration = task_set_1(load_backend(stamp), load_rollups(stamp))
+
+    # Task 1.2: Check for missing values in the dataset
+    st.subheader("Task 1.2: Check for missing values in the dataset")
+    st.write("**Hint:** df.isnull().sum()")
+    missing_values = exploration["missing_values"]
+    st.write("Missing values per column:")
+    st.dataframe(missing_values)
+
+    st.markdown("---")
+
+    # Task 1.3: Identify which columns have the most missing values
+    st.subheader("Task 1.3: Identify which columns have the most missing values")
+    st.write("**Hint:** Look for Department, Project, or Owner")
+    missing_sorted = exploration["missing_sorted"]
+    st.write("Columns with missing values (sorted by count):")
+    st.dataframe(missing_sorted)
     st.info(
-        f"Department with most untagged cost: **{top_dept['Department']}** with ${top_dept['MonthlyCostUSD']:,.2f}"
+        f"Columns with most missing values: {', '.join(missing_sorted.index.tolist())}"
     )
 
-st.markdown("---")
+    st.markdown("---")
 
-# Task 2.4: Which project consumes the most cost overall?
-st.subheader("Task 2.4: Which project consumes the most cost overall?")
-st.write("**Hint:** Use .groupby('Project')['MonthlyCostUSD'].sum()")
+    # Task 1.4: Count total resources and how many are tagged vs untagged
+    st.subheader("Task 1.4: Count total resources and how many are tagged vs untagged")
+    st.write("**Hint:** Use df['Tagged'].value_counts()")
+    tagged_counts = exploration["tagged_counts"]
+    st.write("Tagged vs Untagged count:")
+    st.dataframe(tagged_counts)
 
-cost_by_project = (
-    df.groupby("Project")["MonthlyCostUSD"]
-    .sum()
-    .reset_index()
-    .sort_values("MonthlyCostUSD", ascending=False)
-)
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Resources", exploration["total_resources"])
+    with col2:
+        st.metric("Tagged (Yes)", exploration["tagged"])
+    with col3:
+        st.metric("Untagged (No)", exploration["untagged"])
 
-st.write("Total cost by project (top 10):")
-st.dataframe(cost_by_project.head(10))
+    st.markdown("---")
 
-if len(cost_by_project) > 0:
-    top_project = cost_by_project.iloc[0]
-    st.metric(
-        f"Highest Cost Project: {top_project['Project']}",
-        f"${top_project['MonthlyCostUSD']:,.2f}",
+    # Task 1.5: What percentage of resources are untagged?
+    st.subheader("Task 1.5: What percentage of resources are untagged?")
+    st.write("**Hint:** Compute (untagged / total) * 100")
+
+    total = exploration["total_resources"]
+    untagged = exploration["untagged"]
+    percentage_untagged = exploration["percentage_untagged"]
+
+    st.write(
+        f"**Calculation:** ({untagged} / {total}) * 100 = {percentage_untagged:.2f}%"
     )
+    st.metric("Percentage of Untagged Resources", f"{percentage_untagged:.2f}%")
 
-st.markdown("---")
+    st.markdown("---")
 
-# Task 2.5: Compare Prod vs Dev environments in terms of cost and tagging quality
-st.subheader(
-    "Task 2.5: Compare Prod vs Dev environments in terms of cost and tagging quality"
-)
-st.write("**Hint:** Group by Environment and Tagged")
 
-cost_by_env_tagged = (
-    df.groupby(["Environment", "Tagged"])["MonthlyCostUSD"].sum().reset_index()
-)
-st.write("Cost by environment and tagging status:")
-st.dataframe(cost_by_env_tagged)
-
-# Create a pivot table for better visualization
-pivot_env = cost_by_env_tagged.pivot(
-    index="Environment", columns="Tagged", values="MonthlyCostUSD"
-).fillna(0)
-st.write("Cost comparison (Pivot view):")
-st.dataframe(pivot_env)
-
-# Calculate tagging percentage per environment
-env_summary = (
-    df.groupby("Environment")
-    .agg({"ResourceID": "count", "MonthlyCostUSD": "sum"})
-    .reset_index()
-)
-env_summary.columns = ["Environment", "Total Resources", "Total Cost"]
+# ============================================================================
+# TASK SET 2 - COST VISIBILITY
+# ============================================================================
 
-tagged_counts_env = (
-    df[df["Tagged"] == "Yes"].groupby("Environment")["ResourceID"].count().reset_index()
-)
-tagged_counts_env.columns = ["Environment", "Tagged Resources"]
 
-env_summary = env_summary.merge(tagged_counts_env, on="Environment", how="left").fillna(
-    0
-)
-env_summary["Tagging %"] = (
-    env_summary["Tagged Resources"] / env_summary["Total Resources"] * 100
-).round(2)
+def render_cost_visibility():
+    st.header("Task Set 2 - Cost Visibility")
 
-st.write("Environment summary with tagging percentage:")
-st.dataframe(env_summary)
+    wait_for("cost_visibility")
+    cost_visibility = load_cost_visibility(stamp)
+
+    # Task 2.1: Calculate total cost of tagged vs untagged resources
+    st.subheader("Task 2.1: Calculate total cost of tagged vs untagged resources")
+    st.write("**Hint:** Group by Tagged and sum MonthlyCostUSD")
+
+    cost_by_tagged = cost_visibility["cost_by_tagged"]
+    st.write("Total cost by tagging status:")
+    st.dataframe(cost_by_tagged)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.metric("Tagged Resources Cost", f"${cost_visibility['tagged_cost']:,.2f}")
+    with col2:
+        st.metric(
+            "Untagged Resources Cost", f"${cost_visibility['untagged_cost']:,.2f}"
+        )
+
+    st.markdown("---")
+
+    # Task 2.2: Compute the percentage of total cost that is untagged
+    st.subheader("Task 2.2: Compute the percentage of total cost that is untagged")
+    st.write("**Hint:** (untagged_cost / total_cost) * 100")
+
+    total_cost = cost_visibility["total_cost"]
+    untagged_cost_value = cost_visibility["untagged_cost"]
+    percentage_untagged_cost = cost_visibility["percentage_untagged_cost"]
+
+    st.write(
+        f"**Calculation:** (${untagged_cost_value:,.2f} / ${total_cost:,.2f}) * 100 = {percentage_untagged_cost:.2f}%"
+    )
+    st.metric("Percentage of Untagged Cost", f"{percentage_untagged_cost:.2f}%")
+
+    st.markdown("---")
+
+    # Task 2.3: Identify which department has the most untagged cost
+    st.subheader("Task 2.3: Identify which department has the most untagged cost")
+    st.write("**Hint:** Group by Department and Tagged")
+
+    untagged_by_dept = cost_visibility["untagged_by_dept"]
+
+    st.write("Untagged cost by department:")
+    st.dataframe(untagged_by_dept)
+
+    if len(untagged_by_dept) > 0:
+        top_dept = untagged_by_dept.iloc[0]
+        st.info(
+            f"Department with most untagged cost: **{top_dept['Department']}** with ${top_dept['MonthlyCostUSD']:,.2f}"
+        )
+
+    st.markdown("---")
+
+    # Task 2.4: Which project consumes the most cost overall?
+    st.subheader("Task 2.4: Which project consumes the most cost overall?")
+    st.write("**Hint:** Use .groupby('Project')['MonthlyCostUSD'].sum()")
+
+    cost_by_project = cost_visibility["cost_by_project"]
+
+    st.write("Total cost by project (top 10):")
+    st.dataframe(cost_by_project.head(10))
+
+    if len(cost_by_project) > 0:
+        top_project = cost_by_project.iloc[0]
+        st.metric(
+            f"Highest Cost Project: {top_project['Project']}",
+            f"${top_project['MonthlyCostUSD']:,.2f}",
+        )
+
+    st.markdown("---")
+
+    # Task 2.5: Compare Prod vs Dev environments in terms of cost and tagging quality
+    st.subheader(
+        "Task 2.5: Compare Prod vs Dev environments in terms of cost and tagging quality"
+    )
+    st.write("**Hint:** Group by Environment and Tagged")
+
+    cost_by_env_tagged = cost_visibility["cost_by_env_tagged"]
+    st.write("Cost by environment and tagging status:")
+    st.dataframe(cost_by_env_tagged)
+
+    # Pivot table for better visualization
+    pivot_env = cost_visibility["pivot_env"]
+    st.write("Cost comparison (Pivot view):")
+    st.dataframe(pivot_env)
+
+    # Tagging percentage per environment
+    env_summary = cost_visibility["env_summary"]
+
+    st.write("Environment summary with tagging percentage:")
+    st.dataframe(env_summary)
+
+    st.markdown("---")
 
-st.markdown("---")
 
 # ============================================================================
 # TASK SET 3 - TAGGING COMPLIANCE
 # ============================================================================
 
-st.header("Task Set 3 - Tagging Compliance")
 
-# Task 3.1: Create a "Tag Completeness Score" per resource
-st.subheader("Task 3.1: Create a 'Tag Completeness Score' per resource")
-st.write("**Hint:** Count how many of the tag fields are non-empty")
+def render_tagging_compliance():
 
-# Define tag fields to check
-tag_fields = ["Department", "Project", "Environment", "Owner", "CostCenter"]
+    st.header("Task Set 3 - Tagging Compliance")
 
-# Create a copy of the dataframe with completeness score
-df_with_score = df.copy()
+    wait_for("compliance")
+    backend = load_backend(stamp)
+    compliance = load_compliance(stamp)
 
-# Count non-null values for each resource across tag fields
-df_with_score["Tag_Completeness_Score"] = df_with_score[tag_fields].notna().sum(axis=1)
-df_with_score["Tag_Completeness_Percentage"] = (
-    df_with_score["Tag_Completeness_Score"] / len(tag_fields) * 100
-).round(2)
+    # Task 3.1: Create a "Tag Completeness Score" per resource
+    st.subheader("Task 3.1: Create a 'Tag Completeness Score' per resource")
+    st.write("**Hint:** Count how many of the tag fields are non-empty")
 
-st.write("Resources with completeness scores (first 10):")
-st.dataframe(
-    df_with_score[
-        ["ResourceID", "Service", "Tagged"]
-        + tag_fields
-        + ["Tag_Completeness_Score", "Tag_Completeness_Percentage"]
-    ].head(10)
-)
+    # Tag fields checked for completeness
+    tag_fields = TAG_FIELDS
 
-avg_completeness = df_with_score["Tag_Completeness_Percentage"].mean()
-st.metric("Average Tag Completeness", f"{avg_completeness:.2f}%")
+    # Only the rows shown are scored here; the backend scores the rest
+    df_with_score = backend.scored(tag_fields, 10)
 
-st.markdown("---")
+    st.write("Resources with completeness scores (first 10):")
+    st.dataframe(
+        with_tag_labels(
+            df_with_score[
+                ["ResourceID", "Service", "Tagged"]
+                + tag_fields
+                + ["Tag_Completeness_Score", "Tag_Completeness_Percentage"]
+            ]
+        )
+    )
 
-# Task 3.2: Find top 5 resources with lowest completeness scores
-st.subheader("Task 3.2: Find top 5 resources with lowest completeness scores")
-st.write("**Hint:** Sort by the new score column")
+    avg_completeness = compliance["avg_completeness"]
+    st.metric("Average Tag Completeness", f"{avg_completeness:.2f}%")
 
-lowest_completeness = df_with_score.sort_values("Tag_Completeness_Score").head(5)
-st.write("Top 5 resources with lowest completeness scores:")
-st.dataframe(
-    lowest_completeness[
-        [
-            "ResourceID",
-            "Service",
-            "Department",
-            "Project",
-            "Owner",
-            "Tag_Completeness_Score",
-            "Tag_Completeness_Percentage",
-            "MonthlyCostUSD",
-        ]
-    ]
-)
+    st.markdown("---")
 
-st.warning(
-    f"These 5 resources have the poorest tagging quality with completeness scores ranging from {lowest_completeness['Tag_Completeness_Score'].min()} to {lowest_completeness['Tag_Completeness_Score'].max()} out of {len(tag_fields)}"
-)
+    # Task 3.2: Find top 5 resources with lowest completeness scores
+    st.subheader("Task 3.2: Find top 5 resources with lowest completeness scores")
+    st.write("**Hint:** Sort by the new score column")
 
-st.markdown("---")
+    lowest_completeness = compliance["lowest_completeness"]
+    st.write("Top 5 resources with lowest completeness scores:")
+    st.dataframe(lowest_completeness[LOWEST_COMPLETENESS_COLUMNS])
 
-# Task 3.3: Identify the most frequently missing tag fields
-st.subheader("Task 3.3: Identify the most frequently missing tag fields")
-st.write("**Hint:** Count missing entries per column")
+    st.warning(
+        f"These 5 resources have the poorest tagging quality with completeness scores ranging from {lowest_completeness['Tag_Completeness_Score'].min()} to {lowest_completeness['Tag_Completeness_Score'].max()} out of {len(tag_fields)}"
+    )
 
-missing_counts = df[tag_fields].isnull().sum().sort_values(ascending=False)
-st.write("Missing tag field counts:")
-st.dataframe(missing_counts)
+    st.markdown("---")
 
-# Create a bar chart for missing fields
-fig_missing = px.bar(
-    x=missing_counts.index,
-    y=missing_counts.values,
-    labels={"x": "Tag Field", "y": "Number of Missing Values"},
-    title="Missing Tag Fields Frequency",
-)
-st.plotly_chart(fig_missing, use_container_width=True)
+    # Task 3.3: Identify the most frequently missing tag fields
+    st.subheader("Task 3.3: Identify the most frequently missing tag fields")
+    st.write("**Hint:** Count missing entries per column")
 
-if len(missing_counts) > 0:
-    st.info(
-        f"Most frequently missing tag field: **{missing_counts.index[0]}** with {missing_counts.values[0]} missing entries"
-    )
+    missing_counts = compliance["missing_counts"]
+    st.write("Missing tag field counts:")
+    st.dataframe(missing_counts)
 
-st.markdown("---")
+    # Create a bar chart for missing fields
+    wait_for("compliance_figure")
+    st.plotly_chart(load_compliance_figure(stamp), use_container_width=True)
 
-# Task 3.4: List all untagged resources and their costs
-st.subheader("Task 3.4: List all untagged resources and their costs")
-st.write("**Hint:** Filter where Tagged == 'No'")
+    if len(missing_counts) > 0:
+        st.info(
+            f"Most frequently missing tag field: **{missing_counts.index[0]}** with {missing_counts.values[0]} missing entries"
+        )
 
-untagged_resources = df[df["Tagged"] == "No"].sort_values(
-    "MonthlyCostUSD", ascending=False
-)
-st.write(f"Total untagged resources: {len(untagged_resources)}")
-st.write("Untagged resources (sorted by cost):")
-st.dataframe(
-    untagged_resources[
-        [
-            "ResourceID",
-            "Service",
-            "Region",
-            "Department",
-            "Project",
-            "Environment",
-            "MonthlyCostUSD",
-        ]
-    ]
-)
+    st.write("Resources by combination of missing tag fields:")
+    st.dataframe(compliance["missing_patterns"], hide_index=True)
 
-total_untagged_cost = untagged_resources["MonthlyCostUSD"].sum()
-st.metric("Total Cost of Untagged Resources", f"${total_untagged_cost:,.2f}")
+    st.markdown("---")
 
-st.markdown("---")
+    # Task 3.4: List all untagged resources and their costs
+    st.subheader("Task 3.4: List all untagged resources and their costs")
+    st.write("**Hint:** Filter where Tagged == 'No'")
 
-# Task 3.5: Export untagged resources to a new CSV file
-st.subheader("Task 3.5: Export untagged resources to a new CSV file")
-st.write("**Hint:** Use df[df['Tagged']=='No'].to_csv('untagged.csv')")
-
-# Provide download button in Streamlit (works on cloud and local)
-csv_data = untagged_resources.to_csv(index=False)
-st.download_button(
-    label="📥 Download Untagged Resources CSV",
-    data=csv_data,
-    file_name="untagged_resources.csv",
-    mime="text/csv",
-    key="download_untagged",
-)
-st.info(
-    f"Exported {len(untagged_resources)} untagged resources with a total cost of ${total_untagged_cost:,.2f}"
-)
+    untagged_resources = compliance["untagged_resources"]
+    st.write(f"Total untagged resources: {len(untagged_resources)}")
+    st.write("Untagged resources (sorted by cost):")
+    st.dataframe(untagged_resources[UNTAGGED_COLUMNS])
+
+    total_untagged_cost = compliance["total_untagged_cost"]
+    st.metric("Total Cost of Untagged Resources", f"${total_untagged_cost:,.2f}")
+
+    st.markdown("---")
+
+    # Task 3.5: Export untagged resources to a new CSV file
+    st.subheader("Task 3.5: Export untagged resources to a new CSV file")
+    st.write("**Hint:** Use df[df['Tagged']=='No'].to_csv('untagged.csv')")
+
+    # Provide download button in Streamlit (works on cloud and local)
+    export_download(
+        "Untagged Resources CSV",
+        key="download_untagged",
+        file_name="untagged_resources",
+        fmt="csv",
+        signature=stamp,
+        chunks=lambda: frame_chunks(untagged_resources),
+    )
+    st.info(
+        f"Exported {len(untagged_resources)} untagged resources with a total cost of ${total_untagged_cost:,.2f}"
+    )
+
+    st.markdown("---")
 
-st.markdown("---")
 
 # ============================================================================
 # TASK SET 4 - VISUALIZATION DASHBOARD
 # ============================================================================
 
-st.header("Task Set 4 - Visualization Dashboard")
 
-# Task 4.1: Create a pie chart of tagged vs untagged resources
-st.subheader("Task 4.1: Create a pie chart of tagged vs untagged resources")
-st.write("**Hint:** Use plotly.express.pie()")
+def render_visualization():
+    st.header("Task Set 4 - Visualization Dashboard")
 
-tagged_counts_viz = df["Tagged"].value_counts().reset_index()
-tagged_counts_viz.columns = ["Tagged", "Count"]
+    wait_for("visualization_figures")
+    figures = load_visualization_figures(stamp)
 
-fig_pie_tagged = px.pie(
-    tagged_counts_viz,
-    values="Count",
-    names="Tagged",
-    title="Tagged vs Untagged Resources",
-    color="Tagged",
-    color_discrete_map={"Yes": "#28a745", "No": "#dc3545"},
-)
-st.plotly_chart(fig_pie_tagged, use_container_width=True)
+    # Task 4.1: Create a pie chart of tagged vs untagged resources
+    st.subheader("Task 4.1: Create a pie chart of tagged vs untagged resources")
+    st.write("**Hint:** Use plotly.express.pie()")
+    st.plotly_chart(figures["tagged_pie"], use_container_width=True)
 
-st.markdown("---")
+    st.markdown("---")
 
-# Task 4.2: Plot a bar chart showing cost per department by tagging status
-st.subheader("Task 4.2: Plot a bar chart showing cost per department by tagging status")
-st.write("**Hint:** Use barmode='group'")
+    # Task 4.2: Plot a bar chart showing cost per department by tagging status
+    st.subheader(
+        "Task 4.2: Plot a bar chart showing cost per department by tagging status"
+    )
+    st.write("**Hint:** Use barmode='group'")
+    st.plotly_chart(figures["department_bar"], use_container_width=True)
 
-cost_dept_tagged_viz = (
-    df.groupby(["Department", "Tagged"])["MonthlyCostUSD"].sum().reset_index()
-)
+    st.markdown("---")
 
-fig_bar_dept = px.bar(
-    cost_dept_tagged_viz,
-    x="Department",
-    y="MonthlyCostUSD",
-    color="Tagged",
-    title="Cost per Department by Tagging Status",
-    barmode="group",
-    labels={"MonthlyCostUSD": "Monthly Cost (USD)", "Department": "Department"},
-    color_discrete_map={"Yes": "#28a745", "No": "#dc3545"},
-)
-st.plotly_chart(fig_bar_dept, use_container_width=True)
+    # Task 4.3: Show a horizontal bar chart of total cost per service
+    st.subheader("Task 4.3: Show a horizontal bar chart of total cost per service")
+    st.write("**Hint:** Group by Service")
+    st.plotly_chart(figures["service_bar"], use_container_width=True)
 
-st.markdown("---")
+    st.markdown("---")
 
-# Task 4.3: Show a horizontal bar chart of total cost per service
-st.subheader("Task 4.3: Show a horizontal bar chart of total cost per service")
-st.write("**Hint:** Group by Service")
+    # Task 4.4: Visualize cost by environment (Prod, Dev, Test)
+    st.subheader("Task 4.4: Visualize cost by environment (Prod, Dev, Test)")
+    st.write("**Hint:** Pie or bar chart works")
 
-cost_by_service = (
-    df.groupby("Service")["MonthlyCostUSD"]
-    .sum()
-    .reset_index()
-    .sort_values("MonthlyCostUSD", ascending=True)
-)
+    col1, col2 = st.columns(2)
+    with col1:
+        st.plotly_chart(figures["environment_pie"], use_container_width=True)
+    with col2:
+        st.plotly_chart(figures["environment_bar"], use_container_width=True)
 
-fig_hbar_service = px.bar(
-    cost_by_service,
-    x="MonthlyCostUSD",
-    y="Service",
-    orientation="h",
-    title="Total Cost per Service",
-    labels={"MonthlyCostUSD": "Monthly Cost (USD)", "Service": "Service"},
-    color="MonthlyCostUSD",
-    color_continuous_scale="Blues",
-)
-st.plotly_chart(fig_hbar_service, use_container_width=True)
-
-st.markdown("---")
+    st.markdown("---")
 
-# Task 4.4: Visualize cost by environment (Prod, Dev, Test)
-st.subheader("Task 4.4: Visualize cost by environment (Prod, Dev, Test)")
-st.write("**Hint:** Pie or bar chart works")
+    render_filters()
 
-cost_by_env = df.groupby("Environment")["MonthlyCostUSD"].sum().reset_index()
 
-col1, col2 = st.columns(2)
+# Filter widgets only rerun this fragment
+@st.fragment
+def render_filters():
+    wait_for("filter_cube", "dimension_index")
+    filter_cube = load_filter_cube(stamp)
+    dimension_index = load_dimension_index(stamp)
 
-with col1:
-    fig_pie_env = px.pie(
-        cost_by_env,
-        values="MonthlyCostUSD",
-        names="Environment",
-        title="Cost by Environment (Pie Chart)",
+    # Task 4.5: Add interactive filters in Streamlit (Service, Region, Department)
+    st.subheader(
+        "Task 4.5: Add interactive filters in Streamlit (Service, Region, Department)"
     )
-    st.plotly_chart(fig_pie_env, use_container_width=True)
+    st.write("**Hint:** Use st.selectbox() or st.multiselect()")
 
-with col2:
-    fig_bar_env = px.bar(
-        cost_by_env,
-        x="Environment",
-        y="MonthlyCostUSD",
-        title="Cost by Environment (Bar Chart)",
-        labels={"MonthlyCostUSD": "Monthly Cost (USD)", "Environment": "Environment"},
-        color="Environment",
-    )
-    st.plotly_chart(fig_bar_env, use_container_width=True)
+    st.write("### Interactive Filtering Dashboard")
 
-st.markdown("---")
+    # Create filters
+    col1, col2, col3 = st.columns(3)
 
-# Task 4.5: Add interactive filters in Streamlit (Service, Region, Department)
-st.subheader(
-    "Task 4.5: Add interactive filters in Streamlit (Service, Region, Department)"
-)
-st.write("**Hint:** Use st.selectbox() or st.multiselect()")
+    with col1:
+        service_filter = st.multiselect(
+            "Select Service(s)",
+            options=["All"] + filter_cube.rollup("Service")["Service"].tolist(),
+            default=["All"],
+        )
+
+    with col2:
+        region_filter = st.multiselect(
+            "Select Region(s)",
+            options=["All"] + filter_cube.rollup("Region")["Region"].tolist(),
+            default=["All"],
+        )
 
-st.write("### Interactive Filtering Dashboard")
+    with col3:
+        department_filter = st.multiselect(
+            "Select Department(s)",
+            options=["All"] + filter_cube.rollup("Department")["Department"].tolist(),
+            default=["All"],
+        )
+
+    filter_selections = {
+        "Service": filter_values(service_filter),
+        "Region": filter_values(region_filter),
+        "Department": filter_values(department_filter),
+    }
 
-# Create filters
-col1, col2, col3 = st.columns(3)
+    # Metrics and charts are answered from the pre-aggregated cube; matching
+    # rows are only looked up (through the index) for the preview table
+    filtered = filtered_view(filter_cube, filter_selections)
+    filtered_rows = dimension_index.select(filter_selections)
 
-with col1:
-    service_filter = st.multiselect(
-        "Select Service(s)",
-        options=["All"] + sorted(df["Service"].dropna().unique().tolist()),
-        default=["All"],
+    # Display filtered results
+    st.write(
+        f"**Filtered Results:** {filtered['total_resources']} resources out of {len(df)} total"
     )
 
-with col2:
-    region_filter = st.multiselect(
-        "Select Region(s)",
-        options=["All"] + sorted(df["Region"].dropna().unique().tolist()),
-        default=["All"],
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Total Cost (Filtered)", f"${filtered['total_cost']:,.2f}")
+    with col2:
+        st.metric("Tagged Resources", filtered["tagged"])
+    with col3:
+        st.metric("Untagged Resources", filtered["untagged"])
+
+    # Show filtered data (the only part that reads raw rows)
+    st.write("### Filtered Data Preview")
+    st.dataframe(
+        with_tag_labels(
+            filtered_rows.head(df, 20)[
+                [
+                    "ResourceID",
+                    "Service",
+                    "Region",
+                    "Department",
+                    "Project",
+                    "Environment",
+                    "Tagged",
+                    "MonthlyCostUSD",
+                ]
+            ]
+        )
     )
 
-with col3:
-    department_filter = st.multiselect(
-        "Select Department(s)",
-        options=["All"] + sorted(df["Department"].dropna().unique().tolist()),
-        default=["All"],
+    # Filtered visualizations
+    st.write("### Filtered Visualizations")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        # Filtered tagged vs untagged pie chart
+        filtered_tagged_counts = filtered["tagged_counts"]
+
+        fig_filtered_pie = px.pie(
+            filtered_tagged_counts,
+            values="Count",
+            names="Tagged",
+            title="Filtered: Tagged vs Untagged",
+            color="Tagged",
+            color_discrete_map={"Yes": "#28a745", "No": "#dc3545"},
+        )
+        st.plotly_chart(fig_filtered_pie, use_container_width=True)
+
+    with col2:
+        # Filtered cost by service
+        filtered_service_cost = filtered["top_services"]
+
+        fig_filtered_service = budgeted_figure(
+            lambda data: px.bar(
+                data,
+                x="Service",
+                y="MonthlyCostUSD",
+                title="Filtered: Top 10 Services by Cost",
+                labels={"MonthlyCostUSD": "Monthly Cost (USD)"},
+                color="MonthlyCostUSD",
+                color_continuous_scale="Viridis",
+            ),
+            filtered_service_cost,
+            "Service",
+            "MonthlyCostUSD",
+        )
+        st.plotly_chart(fig_filtered_service, use_container_width=True)
+
+    st.markdown("---")
+
+
+# ============================================================================
+# TASK SET 5 - TAG REMEDIATION WORKFLOW
+# ============================================================================
+
+
+def render_remediation_workflow():
+    st.header("Task Set 5 - Tag Remediation Workflow")
+
+    render_remediation()
+
+
+# Suggested fills listed at most in the bulk fill preview
+FILL_PREVIEW_ROWS = 1000
+
+
+# Task 5.2 in bulk: review the suggested fills above a confidence and accept
+# them all at once, as tag patches under the session's manual edits
+def render_bulk_fills():
+    wait_for("fill_proposals")
+    proposals = load_fill_proposals(stamp)
+    with st.expander(f"⚡ Fill missing tags in bulk ({len(proposals):,} suggestions)"):
+        st.write(
+            "Values are inferred from the tagged resources, e.g. the usual "
+            "Owner of a Project in the same account. The confidence is the "
+            "share of matching tagged resources with that value."
+        )
+        if proposals.empty:
+            st.info("No missing tags can be inferred from the tagged resources.")
+            return
+        st.dataframe(summarize(proposals), hide_index=True)
+
+        min_confidence = st.slider(
+            "Minimum confidence",
+            min_value=0.0,
+            max_value=1.0,
+            value=DEFAULT_MIN_CONFIDENCE,
+            step=0.05,
+            key="fill_confidence",
+        )
+        selected = proposals[proposals["Confidence"] >= min_confidence]
+        if len(selected) > FILL_PREVIEW_ROWS:
+            st.caption(
+                f"First {FILL_PREVIEW_ROWS:,} of {len(selected):,} suggested fills"
+            )
+        st.dataframe(selected.head(FILL_PREVIEW_ROWS), hide_index=True)
+
+        if st.button(
+            f"✅ Accept {len(selected):,} suggested fills",
+            key="accept_fills",
+            disabled=selected.empty,
+        ):
+            merge_patches(to_patches(selected))
+            st.success(
+                f"✓ Accepted {len(selected):,} suggested fills; they show in the "
+                "table below and in the downloads."
+            )
+
+
+# The editor, uploads and exports only rerun this fragment
+@st.fragment
+def render_remediation():
+    # Task 5.1: In Streamlit, create a table where untagged resources can be edited
+    st.subheader("Task 5.1: Create a table where untagged resources can be edited")
+    st.write("**Hint:** Use st.data_editor()")
+
+    # Previously saved tag patches can be re-applied before editing further.
+    # They are merged into the session's edits once per uploaded file, so
+    # they stay applied when the uploader is cleared by switching sections
+    patch_file = st.file_uploader(
+        "Re-apply saved tag patches (optional)", type="json", key="patch_upload"
+    )
+    if (
+        patch_file is not None
+        and st.session_state.get("applied_patch_file") != patch_file.file_id
+    ):
+        try:
+            saved_patches = TagPatches.from_json(patch_file.getvalue())
+        except (ValueError, KeyError) as e:
+            st.error(f"❌ Could not read tag patches: {e}")
+        else:
+            st.session_state["applied_patch_file"] = patch_file.file_id
+            merge_patches(saved_patches)
+
+    wait_for("untagged_pages")
+    untagged_pages = load_untagged_pages(stamp)
+
+    st.write(f"**Total Untagged Resources to Edit:** {len(untagged_pages)}")
+    st.info(
+        "You can edit the Department, Project, Environment, Owner, and CostCenter fields below. Other fields are read-only."
     )
 
-# Apply filters
-filtered_df = df.copy()
+    # Task 5.2: Fill missing tags (Department, Project, Owner) manually
+    st.subheader("Task 5.2: Fill missing tags (Department, Project, Owner) manually")
+    st.write("**Hint:** Simulate remediation")
 
-if "All" not in service_filter and len(service_filter) > 0:
-    filtered_df = filtered_df[filtered_df["Service"].isin(service_filter)]
+    render_bulk_fills()
 
-if "All" not in region_filter and len(region_filter) > 0:
-    filtered_df = filtered_df[filtered_df["Region"].isin(region_filter)]
+    st.write("Edit the table below to fill in missing tag information:")
 
-if "All" not in department_filter and len(department_filter) > 0:
-    filtered_df = filtered_df[filtered_df["Department"].isin(department_filter)]
+    # Search, sorting and paging happen here, so the editor only receives one
+    # page of rows
+    col1, col2, col3 = st.columns([2, 1, 1])
+    with col1:
+        editor_search = st.text_input(
+            "Search ResourceID, Service or Department", key="editor_search"
+        )
+    with col2:
+        editor_sort = st.selectbox(
+            "Sort by",
+            PAGE_SORTS,
+            format_func=lambda sort: {
+                None: "Source order",
+                "cost_desc": "Cost (high to low)",
+                "cost_asc": "Cost (low to high)",
+            }[sort],
+            key="editor_sort",
+        )
+    with col3:
+        editor_page_size = st.selectbox(
+            "Rows per page", [25, 50, 100, 250], index=1, key="editor_page_size"
+        )
+
+    matching_rows = untagged_pages.select(editor_search, editor_sort)
+    page_count = max(1, -(-len(matching_rows) // editor_page_size))
+    editor_page = (
+        st.number_input(
+            f"Page (of {page_count})",
+            min_value=1,
+            max_value=page_count,
+            value=1,
+            key="editor_page",
+        )
+        - 1
+    )
+    page_start = min(editor_page * editor_page_size, len(matching_rows))
+    page_end = min(page_start + editor_page_size, len(matching_rows))
+    st.caption(
+        f"Showing {page_start + 1 if page_end else 0}-{page_end} of {len(matching_rows)} matching resources"
+    )
 
-# Display filtered results
-st.write(f"**Filtered Results:** {len(filtered_df)} resources out of {len(df)} total")
+    # Edits are kept as sparse patches keyed by (AccountID, ResourceID), so they
+    # survive paging. Each page's editor starts from the edits made so far;
+    # the edits in it are merged on top of those
+    editor_key = (
+        "untagged_editor:"
+        + hashlib.sha1(
+            repr(
+                (editor_search.strip(), editor_sort, editor_page_size, editor_page)
+            ).encode()
+        ).hexdigest()
+    )
+    if editor_key not in st.session_state:
+        st.session_state["editor_base_patches"] = st.session_state.get(
+            "editor_patches", TagPatches()
+        )
+    editor_base_patches = st.session_state["editor_base_patches"]
 
-col1, col2, col3 = st.columns(3)
-with col1:
-    st.metric("Total Cost (Filtered)", f"${filtered_df['MonthlyCostUSD'].sum():,.2f}")
-with col2:
-    tagged_filtered = len(filtered_df[filtered_df["Tagged"] == "Yes"])
-    st.metric("Tagged Resources", tagged_filtered)
-with col3:
-    untagged_filtered = len(filtered_df[filtered_df["Tagged"] == "No"])
-    st.metric("Untagged Resources", untagged_filtered)
+    page_to_edit = editor_base_patches.apply_to(
+        untagged_pages.page(matching_rows, editor_page, editor_page_size)
+    )
 
-# Show filtered data
-st.write("### Filtered Data Preview")
-st.dataframe(
-    filtered_df[
-        [
+    # Use data_editor to allow editing - all columns included as per user's request
+    st.data_editor(
+        page_to_edit,
+        num_rows="fixed",
+        disabled=[
+            "AccountID",
             "ResourceID",
             "Service",
             "Region",
-            "Department",
-            "Project",
-            "Environment",
-            "Tagged",
+            "CreatedBy",
             "MonthlyCostUSD",
-        ]
-    ].head(20)
-)
+            "Tagged",
+        ],
+        use_container_width=True,
+        key=editor_key,
+    )
+
+    edited_rows = st.session_state[editor_key]["edited_rows"]
+    st.session_state["editor_patches"] = editor_base_patches.update(
+        TagPatches.from_edited_rows(page_to_edit, edited_rows)
+    )
+    # A page's editor starts without edits; any change to them is counted
+    page_edits = json.dumps(edited_rows, sort_keys=True, default=str)
+    seen_key, seen_edits = st.session_state.get("editor_seen_edits", (None, "{}"))
+    if page_edits != (seen_edits if seen_key == editor_key else "{}"):
+        count_edit()
+    st.session_state["editor_seen_edits"] = (editor_key, page_edits)
+
+    st.markdown("---")
+
+    # Task 5.3: Download the updated dataset
+    st.subheader("Task 5.3: Download the updated dataset")
+    st.write("**Hint:** Use st.download_button()")
+
+    # The remediated dataset is the base data with the tag patches applied on
+    # read. Edited resources count as tagged once all key fields are filled
+    tag_patches = st.session_state["editor_patches"]
+    edit_count = st.session_state.get("edit_count", 0)
+    wait_for("remediation_overlay")
+    remediation_overlay = load_remediation_overlay(stamp)
+
+    st.write("**Remediated Dataset Preview:**")
+    st.dataframe(remediation_overlay.head(tag_patches, 10))
+
+    # Download buttons for the original and remediated datasets and the patches
+    # Exports are built on request; gzip and Parquet suit large datasets
+    export_format = st.selectbox(
+        "Download format",
+        list(EXPORT_FORMATS),
+        format_func=lambda fmt: {"csv": "CSV", "csv.gz": "CSV (gzip)"}.get(
+            fmt, fmt.title()
+        ),
+        key="export_format",
+    )
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        export_download(
+            "Original Dataset",
+            key="download_original",
+            file_name="original",
+            fmt=export_format,
+            signature=(stamp, export_format),
+            chunks=lambda: frame_chunks(df),
+        )
+
+    with col2:
+        export_download(
+            "Remediated Dataset",
+            key="download_remediated",
+            file_name="remediated",
+            fmt=export_format,
+            signature=(stamp, export_format, edit_count),
+            chunks=lambda: remediation_overlay.iter_frames(tag_patches),
+        )
 
-# Filtered visualizations
-st.write("### Filtered Visualizations")
+    with col3:
+        prepared_download(
+            f"Tag Patches ({len(tag_patches)} edits)",
+            key="download_patches",
+            file_name="tag_patches.json",
+            mime="application/json",
+            signature=edit_count,
+            prepare=lambda: text_to_tempfile(tag_patches.to_json(), ".json"),
+        )
 
-col1, col2 = st.columns(2)
+    st.success("✓ You can now download both the original and remediated datasets!")
 
-with col1:
-    # Filtered tagged vs untagged pie chart
-    filtered_tagged_counts = filtered_df["Tagged"].value_counts().reset_index()
-    filtered_tagged_counts.columns = ["Tagged", "Count"]
+    st.markdown("---")
 
-    fig_filtered_pie = px.pie(
-        filtered_tagged_counts,
-        values="Count",
-        names="Tagged",
-        title="Filtered: Tagged vs Untagged",
-        color="Tagged",
-        color_discrete_map={"Yes": "#28a745", "No": "#dc3545"},
+    # Task 5.4: Compare cost visibility before and after remediation
+    st.subheader("Task 5.4: Compare cost visibility before and after remediation")
+    st.write("**Hint:** Recalculate tagging metrics after updates")
+
+    st.write("### Before and After Comparison")
+
+    # Only the patched resources are re-checked
+    wait_for("remediation_metrics")
+    remediation = load_remediation_metrics(stamp).compare(tag_patches)
+
+    # Before metrics (original dataset)
+    before_untagged = remediation["before_untagged"]
+    before_tagged = remediation["before_tagged"]
+    before_untagged_pct = remediation["before_untagged_pct"]
+    before_untagged_cost = remediation["before_untagged_cost"]
+    before_untagged_cost_pct = remediation["before_untagged_cost_pct"]
+
+    # After metrics (remediated dataset)
+    after_untagged = remediation["after_untagged"]
+    after_tagged = remediation["after_tagged"]
+    after_untagged_pct = remediation["after_untagged_pct"]
+    after_untagged_cost = remediation["after_untagged_cost"]
+    after_untagged_cost_pct = remediation["after_untagged_cost_pct"]
+
+    # Display comparison
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.metric(
+            "Untagged Resources",
+            f"{after_untagged}",
+            delta=f"{after_untagged - before_untagged}",
+            delta_color="inverse",
+        )
+        st.caption(f"Before: {before_untagged} | After: {after_untagged}")
+
+    with col2:
+        st.metric(
+            "Tagged Resources",
+            f"{after_tagged}",
+            delta=f"{after_tagged - before_tagged}",
+            delta_color="normal",
+        )
+        st.caption(f"Before: {before_tagged} | After: {after_tagged}")
+
+    with col3:
+        st.metric(
+            "Untagged %",
+            f"{after_untagged_pct:.2f}%",
+            delta=f"{after_untagged_pct - before_untagged_pct:.2f}%",
+            delta_color="inverse",
+        )
+        st.caption(
+            f"Before: {before_untagged_pct:.2f}% | After: {after_untagged_pct:.2f}%"
+        )
+
+    st.write("### Cost Visibility Comparison")
+
+    col1, col2, col3 = st.columns(3)
+
+    with col1:
+        st.metric(
+            "Untagged Cost",
+            f"${after_untagged_cost:,.2f}",
+            delta=f"${after_untagged_cost - before_untagged_cost:,.2f}",
+            delta_color="inverse",
+        )
+        st.caption(f"Before: ${before_untagged_cost:,.2f}")
+
+    with col2:
+        st.metric(
+            "Untagged Cost %",
+            f"{after_untagged_cost_pct:.2f}%",
+            delta=f"{after_untagged_cost_pct - before_untagged_cost_pct:.2f}%",
+            delta_color="inverse",
+        )
+        st.caption(f"Before: {before_untagged_cost_pct:.2f}%")
+
+    with col3:
+        improvement = remediation["improvement"]
+        st.metric(
+            "Improvement",
+            f"{improvement:.2f}%",
+            delta=f"{improvement:.2f}%",
+            delta_color="normal",
+        )
+        st.caption("Reduction in untagged resources")
+
+    # Visualization comparison
+    st.write("### Visual Comparison")
+
+    comparison_data = pd.DataFrame(
+        {
+            "Status": ["Before", "After"],
+            "Tagged": [before_tagged, after_tagged],
+            "Untagged": [before_untagged, after_untagged],
+        }
     )
-    st.plotly_chart(fig_filtered_pie, use_container_width=True)
 
-with col2:
-    # Filtered cost by service
-    filtered_service_cost = (
-        filtered_df.groupby("Service")["MonthlyCostUSD"]
-        .sum()
-        .reset_index()
-        .sort_values("MonthlyCostUSD", ascending=False)
-        .head(10)
+    fig_comparison = px.bar(
+        comparison_data,
+        x="Status",
+        y=["Tagged", "Untagged"],
+        title="Before vs After Remediation",
+        barmode="group",
+        labels={"value": "Number of Resources", "variable": "Tagging Status"},
+        color_discrete_map={"Tagged": "#28a745", "Untagged": "#dc3545"},
     )
+    st.plotly_chart(fig_comparison, use_container_width=True)
 
-    fig_filtered_service = px.bar(
-        filtered_service_cost,
-        x="Service",
-        y="MonthlyCostUSD",
-        title="Filtered: Top 10 Services by Cost",
-        labels={"MonthlyCostUSD": "Monthly Cost (USD)"},
-        color="MonthlyCostUSD",
-        color_continuous_scale="Viridis",
+    st.markdown("---")
+
+    # Task 5.5: Discuss how improved tagging affects accountability and reports
+    st.subheader(
+        "Task 5.5: Discuss how improved tagging affects accountability and reports"
     )
-    st.plotly_chart(fig_filtered_service, use_container_width=True)
+    st.write("**Hint:** Write a short reflection")
 
-st.markdown("---")
-# ============================================================================
-# TASK SET 5 - TAG REMEDIATION WORKFLOW
-# ============================================================================
+    st.write("### Impact of Improved Tagging on Accountability and Reports")
 
-st.header("Task Set 5 - Tag Remediation Workflow")
+    st.markdown("""
+    #### Key Benefits of Tag Remediation:
 
-# Task 5.1: In Streamlit, create a table where untagged resources can be edited
-st.subheader("Task 5.1: Create a table where untagged resources can be edited")
-st.write("**Hint:** Use st.data_editor()")
+    **1. Enhanced Cost Accountability**
+    - Improved tagging enables accurate cost allocation to specific departments, projects, and teams
+    - Finance teams can track spending more precisely and hold departments accountable for their cloud usage
+    - Budget owners can see exactly where their money is going
 
-# Get untagged resources for editing
-untagged_for_edit = df[df["Tagged"] == "No"].copy().reset_index(drop=True)
+    **2. Better Financial Reporting**
+    - Complete tags allow for detailed cost breakdowns in reports
+    - Executives can make informed decisions based on accurate cost visibility
+    - Trend analysis becomes more reliable when resources are properly categorized
 
-st.write(f"**Total Untagged Resources to Edit:** {len(untagged_for_edit)}")
-st.info(
-    "You can edit the Department, Project, Environment, Owner, and CostCenter fields below. Other fields are read-only."
-)
+    **3. Improved Governance and Compliance**
+    - Tag compliance ensures organizational policies are followed
+    - Easier to identify resource owners for security and compliance audits
+    - Reduces "orphaned" resources that nobody claims ownership of
 
-# Task 5.2: Fill missing tags (Department, Project, Owner) manually
-st.subheader("Task 5.2: Fill missing tags (Department, Project, Owner) manually")
-st.write("**Hint:** Simulate remediation")
+    **4. Optimized Resource Management**
+    - Teams can identify underutilized resources within their projects
+    - Easier to implement cost optimization strategies when resources are properly tagged
+    - Facilitates cleanup of unused or unnecessary resources
 
-st.write("Edit the table below to fill in missing tag information:")
+    **5. Better Operational Efficiency**
+    - Automated policies can be applied based on tags (e.g., auto-shutdown for Dev resources)
+    - Faster incident response when resource owners are clearly identified
+    - Simplified resource lifecycle management
 
-# Use data_editor to allow editing - all columns included as per user's request
-edited_df = st.data_editor(
-    untagged_for_edit,
-    num_rows="fixed",
-    disabled=[
-        "AccountID",
-        "ResourceID",
-        "Service",
-        "Region",
-        "CreatedBy",
-        "MonthlyCostUSD",
-        "Tagged",
-    ],
-    use_container_width=True,
-    key="untagged_editor",
-)
+    #### Recommendations for Maintaining Tag Compliance:
 
-st.markdown("---")
+    1. **Implement automated tagging** at resource creation time using Infrastructure as Code (Terraform, CloudFormation)
+    2. **Set up tag policies** that require specific tags before resources can be created
+    3. **Regular audits** using dashboards like this one to identify and remediate untagged resources
+    4. **Training and documentation** to ensure all teams understand tagging requirements
+    5. **Cost allocation reports** that highlight departments with poor tagging compliance
+    6. **Gamification** - reward teams with high tag compliance rates
 
-# Task 5.3: Download the updated dataset
-st.subheader("Task 5.3: Download the updated dataset")
-st.write("**Hint:** Use st.download_button()")
+    #### Conclusion:
 
-# Mark edited resources as tagged if key fields are filled
-edited_df_copy = edited_df.copy()
+    The remediation process demonstrated in this dashboard shows tangible improvements in cost visibility and accountability.
+    By reducing untagged resources from **{:.2f}%** to **{:.2f}%**, the organization gains better control over its cloud spending
+    and can make more informed financial decisions. Maintaining this level of tag compliance should be an ongoing priority.
+    """.format(before_untagged_pct, after_untagged_pct))
 
-# Check if key tag fields are filled
-edited_df_copy["Tags_Filled"] = (
-    edited_df_copy["Department"].notna()
-    & edited_df_copy["Project"].notna()
-    & edited_df_copy["Owner"].notna()
-    & edited_df_copy["CostCenter"].notna()
-    & edited_df_copy["Environment"].notna()
-)
+    st.markdown("---")
 
-# Update Tagged status for remediated resources
-edited_df_copy.loc[edited_df_copy["Tags_Filled"], "Tagged"] = "Yes"
-edited_df_copy = edited_df_copy.drop(columns=["Tags_Filled"])
 
-# Create remediated dataset by combining edited untagged with original tagged resources
-originally_tagged = df[df["Tagged"] == "Yes"].copy()
-remediated_full_dataset = pd.concat(
-    [originally_tagged, edited_df_copy], ignore_index=True
-)
+# ============================================================================
+# TAG POLICIES
+# ============================================================================
 
-st.write("**Remediated Dataset Preview:**")
-st.dataframe(remediated_full_dataset.head(10))
+# Violating resources listed at most in the policy violations table
+POLICY_PREVIEW_ROWS = 100
 
-# Download buttons for both original and remediated datasets
-col1, col2 = st.columns(2)
 
-with col1:
-    original_csv = df.to_csv(index=False)
-    st.download_button(
-        label="📥 Download Original Dataset",
-        data=original_csv,
-        file_name="original.csv",
-        mime="text/csv",
-        key="download_original",
+def render_policies():
+    st.header("Tag Policies")
+    st.write(
+        "Conditional tagging rules from the policy file "
+        f"`{POLICY_FILE}` (set `CLOUDMART_POLICIES` to use another), checked "
+        "against every resource at once."
     )
 
-with col2:
-    remediated_csv = remediated_full_dataset.to_csv(index=False)
-    st.download_button(
-        label="📥 Download Remediated Dataset",
-        data=remediated_csv,
-        file_name="remediated.csv",
-        mime="text/csv",
-        key="download_remediated",
+    policies = policy_stamp(POLICY_FILE)
+    if policies is None:
+        st.info(f"No policy file found at `{POLICY_FILE}`.")
+        return
+    wait_for("policies")
+    try:
+        result = load_policy_result(stamp, policies)
+    except ValueError as e:
+        st.error(f"❌ Invalid policy file `{POLICY_FILE}`: {e}")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Rules", len(result.rules))
+    with col2:
+        st.metric("Resources Violating a Rule", f"{result.violating_rows:,}")
+    with col3:
+        share = result.violating_rows / len(df) * 100 if len(df) else 0
+        st.metric("Violating Share", f"{share:.1f}%")
+
+    st.subheader("Violations per rule")
+    st.dataframe(result.rule_violations(), hide_index=True)
+
+    st.subheader("Resources with the most violations")
+    resources = result.resource_violations(POLICY_PREVIEW_ROWS)
+    if resources.empty:
+        st.success("✓ Every resource meets every policy")
+        return
+    if result.violating_rows > POLICY_PREVIEW_ROWS:
+        st.caption(
+            f"First {POLICY_PREVIEW_ROWS:,} of {result.violating_rows:,} "
+            "violating resources"
+        )
+    st.dataframe(resources, hide_index=True)
+    export_download(
+        "Policy Violations CSV",
+        key="download_policy_violations",
+        file_name="policy_violations",
+        fmt="csv",
+        signature=(stamp, policies),
+        chunks=lambda: frame_chunks(result.resource_violations()),
     )
 
-st.success("✓ You can now download both the original and remediated datasets!")
 
-st.markdown("---")
+# ============================================================================
+# COMPLIANCE HISTORY
+# ============================================================================
 
-# Task 5.4: Compare cost visibility before and after remediation
-st.subheader("Task 5.4: Compare cost visibility before and after remediation")
-st.write("**Hint:** Recalculate tagging metrics after updates")
-
-st.write("### Before and After Comparison")
-
-# Before metrics (original dataset)
-before_total_resources = len(df)
-before_untagged = len(df[df["Tagged"] == "No"])
-before_tagged = len(df[df["Tagged"] == "Yes"])
-before_untagged_pct = before_untagged / before_total_resources * 100
-before_untagged_cost = df[df["Tagged"] == "No"]["MonthlyCostUSD"].sum()
-before_total_cost = df["MonthlyCostUSD"].sum()
-before_untagged_cost_pct = before_untagged_cost / before_total_cost * 100
-
-# After metrics (remediated dataset)
-after_total_resources = len(remediated_full_dataset)
-after_untagged = len(remediated_full_dataset[remediated_full_dataset["Tagged"] == "No"])
-after_tagged = len(remediated_full_dataset[remediated_full_dataset["Tagged"] == "Yes"])
-after_untagged_pct = (
-    (after_untagged / after_total_resources * 100) if after_total_resources > 0 else 0
-)
-after_untagged_cost = remediated_full_dataset[
-    remediated_full_dataset["Tagged"] == "No"
-]["MonthlyCostUSD"].sum()
-after_total_cost = remediated_full_dataset["MonthlyCostUSD"].sum()
-after_untagged_cost_pct = (
-    (after_untagged_cost / after_total_cost * 100) if after_total_cost > 0 else 0
-)
+# Resource changes listed at most in the "what changed" table
+DELTA_PREVIEW_ROWS = 1000
 
-# Display comparison
-col1, col2, col3 = st.columns(3)
 
-with col1:
-    st.metric(
-        "Untagged Resources",
-        f"{after_untagged}",
-        delta=f"{after_untagged - before_untagged}",
-        delta_color="inverse",
+def render_history():
+    st.header("Compliance History")
+    st.write(
+        "Snapshots of the tagging metrics (Task 1.5, 2.2 and 3.1) per scan, "
+        f"stored in `{HISTORY_DIR}` and ordered by the date of their data. "
+        "Earlier exports can be added with "
+        "`python cloudmart_history.py record <export> --label <YYYY-MM>`."
     )
-    st.caption(f"Before: {before_untagged} | After: {after_untagged}")
 
-with col2:
-    st.metric(
-        "Tagged Resources",
-        f"{after_tagged}",
-        delta=f"{after_tagged - before_tagged}",
-        delta_color="normal",
+    store = SnapshotStore(HISTORY_DIR)
+    if st.button("📸 Record a snapshot of the current data", key="record_snapshot"):
+        try:
+            snapshot = store.record(df, DATA_SOURCE, fingerprint=json.dumps(stamp[0]))
+            st.success(f"✓ Snapshot {snapshot} recorded")
+        except OSError as e:
+            st.error(f"❌ Could not write to {HISTORY_DIR}: {e}")
+
+    snapshots, changes = load_history(store.version())
+    if snapshots is None:
+        st.info("No snapshots recorded yet.")
+        return
+
+    st.subheader("Trends")
+    fig_shares = px.line(
+        snapshots,
+        x="Label",
+        y=["PercentageUntagged", "PercentageUntaggedCost", "AvgCompleteness"],
+        markers=True,
+        title="Untagged Share and Tag Completeness per Snapshot",
+        labels={"Label": "Snapshot", "value": "%", "variable": "Metric"},
     )
-    st.caption(f"Before: {before_tagged} | After: {after_tagged}")
-
-with col3:
-    st.metric(
-        "Untagged %",
-        f"{after_untagged_pct:.2f}%",
-        delta=f"{after_untagged_pct - before_untagged_pct:.2f}%",
-        delta_color="inverse",
+    st.plotly_chart(fig_shares, use_container_width=True)
+
+    fig_cost = px.line(
+        snapshots,
+        x="Label",
+        y="UntaggedCost",
+        markers=True,
+        title="Untagged Cost per Snapshot",
+        labels={"Label": "Snapshot", "UntaggedCost": "Untagged Cost (USD)"},
     )
-    st.caption(f"Before: {before_untagged_pct:.2f}% | After: {after_untagged_pct:.2f}%")
-
-st.write("### Cost Visibility Comparison")
-
-col1, col2, col3 = st.columns(3)
+    st.plotly_chart(fig_cost, use_container_width=True)
 
-with col1:
-    st.metric(
-        "Untagged Cost",
-        f"${after_untagged_cost:,.2f}",
-        delta=f"${after_untagged_cost - before_untagged_cost:,.2f}",
-        delta_color="inverse",
+    dimension = st.selectbox(
+        "Untagged cost by", HISTORY_DIMENSIONS, key="history_dimension"
     )
-    st.caption(f"Before: ${before_untagged_cost:,.2f}")
-
-with col2:
-    st.metric(
-        "Untagged Cost %",
-        f"{after_untagged_cost_pct:.2f}%",
-        delta=f"{after_untagged_cost_pct - before_untagged_cost_pct:.2f}%",
-        delta_color="inverse",
+    trend = load_dimension_trend(store.version(), dimension)
+    fig_dimension = budgeted_figure(
+        lambda data: px.line(
+            data,
+            x="Label",
+            y="UntaggedCost",
+            color="Value",
+            markers=True,
+            title=f"Untagged Cost per {dimension}",
+            labels={
+                "Label": "Snapshot",
+                "UntaggedCost": "Untagged Cost (USD)",
+                "Value": dimension,
+            },
+        ),
+        trend,
+        "Value",
+        "UntaggedCost",
+        by="Label",
     )
-    st.caption(f"Before: {before_untagged_cost_pct:.2f}%")
+    st.plotly_chart(fig_dimension, use_container_width=True)
 
-with col3:
-    improvement = before_untagged_pct - after_untagged_pct
-    st.metric(
-        "Improvement",
-        f"{improvement:.2f}%",
-        delta=f"{improvement:.2f}%",
-        delta_color="normal",
-    )
-    st.caption("Reduction in untagged resources")
+    st.markdown("---")
 
-# Visualization comparison
-st.write("### Visual Comparison")
+    if changes is None:
+        st.info("Record a second snapshot to see what changed between scans.")
+        return
 
-comparison_data = pd.DataFrame(
-    {
-        "Status": ["Before", "After"],
-        "Tagged": [before_tagged, after_tagged],
-        "Untagged": [before_untagged, after_untagged],
-    }
-)
+    st.subheader(f"What changed since {changes['previous']}")
+    st.dataframe(changes["metrics"], hide_index=True)
 
-fig_comparison = px.bar(
-    comparison_data,
-    x="Status",
-    y=["Tagged", "Untagged"],
-    title="Before vs After Remediation",
-    barmode="group",
-    labels={"value": "Number of Resources", "variable": "Tagging Status"},
-    color_discrete_map={"Tagged": "#28a745", "Untagged": "#dc3545"},
-)
-st.plotly_chart(fig_comparison, use_container_width=True)
+    st.write("Changes per Department, AccountID and Environment:")
+    st.dataframe(changes["dimensions"], hide_index=True)
 
-st.markdown("---")
+    st.write("Resources changed:")
+    st.dataframe(changes["change_counts"], hide_index=True)
+    deltas = changes["deltas"]
+    if len(deltas) > DELTA_PREVIEW_ROWS:
+        st.caption(f"First {DELTA_PREVIEW_ROWS:,} of {len(deltas):,} changes")
+    st.dataframe(deltas.head(DELTA_PREVIEW_ROWS), hide_index=True)
 
-# Task 5.5: Discuss how improved tagging affects accountability and reports
-st.subheader(
-    "Task 5.5: Discuss how improved tagging affects accountability and reports"
-)
-st.write("**Hint:** Write a short reflection")
-
-st.write("### Impact of Improved Tagging on Accountability and Reports")
-
-st.markdown(
-    """
-#### Key Benefits of Tag Remediation:
-
-**1. Enhanced Cost Accountability**
-- Improved tagging enables accurate cost allocation to specific departments, projects, and teams
-- Finance teams can track spending more precisely and hold departments accountable for their cloud usage
-- Budget owners can see exactly where their money is going
-
-**2. Better Financial Reporting**
-- Complete tags allow for detailed cost breakdowns in reports
-- Executives can make informed decisions based on accurate cost visibility
-- Trend analysis becomes more reliable when resources are properly categorized
-
-**3. Improved Governance and Compliance**
-- Tag compliance ensures organizational policies are followed
-- Easier to identify resource owners for security and compliance audits
-- Reduces "orphaned" resources that nobody claims ownership of
-
-**4. Optimized Resource Management**
-- Teams can identify underutilized resources within their projects
-- Easier to implement cost optimization strategies when resources are properly tagged
-- Facilitates cleanup of unused or unnecessary resources
-
-**5. Better Operational Efficiency**
-- Automated policies can be applied based on tags (e.g., auto-shutdown for Dev resources)
-- Faster incident response when resource owners are clearly identified
-- Simplified resource lifecycle management
-
-#### Recommendations for Maintaining Tag Compliance:
-
-1. **Implement automated tagging** at resource creation time using Infrastructure as Code (Terraform, CloudFormation)
-2. **Set up tag policies** that require specific tags before resources can be created
-3. **Regular audits** using dashboards like this one to identify and remediate untagged resources
-4. **Training and documentation** to ensure all teams understand tagging requirements
-5. **Cost allocation reports** that highlight departments with poor tagging compliance
-6. **Gamification** - reward teams with high tag compliance rates
-
-#### Conclusion:
-
-The remediation process demonstrated in this dashboard shows tangible improvements in cost visibility and accountability.
-By reducing untagged resources from **{:.2f}%** to **{:.2f}%**, the organization gains better control over its cloud spending
-and can make more informed financial decisions. Maintaining this level of tag compliance should be an ongoing priority.
-""".format(before_untagged_pct, after_untagged_pct)
-)
 
-st.markdown("---")
+# ============================================================================
+# NAVIGATION
+# ============================================================================
+
+# Only the selected Task Set is rendered; its results are computed in the
+# background as soon as the data is loaded (see background_jobs)
+SECTIONS = {
+    "Task Set 1 - Data Exploration": render_data_exploration,
+    "Task Set 2 - Cost Visibility": render_cost_visibility,
+    "Task Set 3 - Tagging Compliance": render_tagging_compliance,
+    "Task Set 4 - Visualization Dashboard": render_visualization,
+    "Task Set 5 - Tag Remediation Workflow": render_remediation_workflow,
+    "Tag Policies": render_policies,
+    "Compliance History": render_history,
+}
+
+section = st.sidebar.radio("Section", list(SECTIONS), key="section")
+SECTIONS[section]()
@@ -0,0 +1,543 @@
+"""Data loading for the CloudMart dashboard.
+
+The billing exports wrap every line in double quotes, e.g.::
+
+    "AccountID,ResourceID,Service,..."
+    "1001,i-001,EC2,..."
+
+so they cannot be handed to ``pd.read_csv`` directly. The loader here strips
+the wrapping quotes line by line while reading and feeds pandas in chunks of
+at most ``chunk_bytes`` of text, so the raw file is never held in memory.
+
+Chunks are parsed as strings and column types are inferred once over the
+whole column, so a chunk boundary can never change a column's dtype.
+
+Parsed data is converted to the typed schema in ``cloudmart_schema`` and kept
+in a Parquet sidecar next to the source file (see ``load_dataset``) so later
+starts read columns instead of re-parsing text.
+
+Real billing data arrives as one export per account (and sometimes per
+month). ``load_sources`` takes a file, a directory or a glob, parses the
+files whose cache is stale across a process pool, and concatenates them into
+one typed frame with a ``SourceFile`` column. ``CLOUDMART_DATA`` selects the
+source the dashboard loads.
+"""
+
+import glob
+import hashlib
+import io
+import json
+import os
+import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pandas.api.types import union_categoricals
+
+from cloudmart_schema import apply_schema
+
+DATA_FILE = "cloudmart_multi_account.csv"
+
+# Upper bound on the raw text buffered per parsed chunk. Override with the
+# CLOUDMART_CHUNK_MB environment variable on memory-constrained workers.
+DEFAULT_CHUNK_BYTES = int(os.environ.get("CLOUDMART_CHUNK_MB", "64")) * 1024 * 1024
+
+CACHE_SUFFIX = ".parquet"
+# Parquet schema metadata key holding the fingerprint of the source file.
+_FINGERPRINT_KEY = b"cloudmart.source"
+# Small sidecar of the cache recording a later (size, mtime) of the source
+# whose content still hashed to the cached fingerprint.
+STAMP_SUFFIX = ".stamp"
+_HASH_BLOCK_BYTES = 8 * 1024 * 1024
+# Bump whenever the cached frame's layout changes, so old caches are rebuilt.
+CACHE_VERSION = 1
+
+
+def _unquote(line):
+    return line.rstrip("\r\n").strip('"')
+
+
+def _parse_chunk(lines):
+    return pd.read_csv(io.StringIO("\n".join(lines)), dtype=str)
+
+
+def _infer_numeric(df):
+    # Same result read_csv's own inference gives on the whole file: a column
+    # becomes numeric only if every non-missing value parses as a number.
+    for column in df.columns:
+        try:
+            df[column] = pd.to_numeric(df[column])
+        except (ValueError, TypeError):
+            pass
+    return df
+
+
+def iter_quoted_csv(path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Yield string-typed DataFrame chunks from a quoted-line CSV file.
+
+    Each chunk is parsed from at most ``chunk_bytes`` of unquoted text (or a
+    single line, if one line is longer than that).
+    """
+    with open(path, "r") as f:
+        header = ""
+        for line in f:
+            header = _unquote(line)
+            if header:
+                break
+        if not header:
+            raise pd.errors.EmptyDataError(f"No columns to parse from {path}")
+        yield from _quoted_chunks(f, header, chunk_bytes)
+
+
+def _quoted_chunks(lines, header, chunk_bytes):
+    buffer = [header]
+    size = 0
+    yielded = False
+    for line in lines:
+        line = _unquote(line)
+        if not line:
+            continue
+        buffer.append(line)
+        size += len(line) + 1
+        if size >= chunk_bytes:
+            yield _parse_chunk(buffer)
+            yielded = True
+            buffer = [header]
+            size = 0
+
+    # A header-only file still yields one empty frame with its columns.
+    if size or not yielded:
+        yield _parse_chunk(buffer)
+
+
+def read_quoted_csv(path=DATA_FILE, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Load a quoted-line CSV file into a single DataFrame.
+
+    Empty strings are normalised to ``pd.NA``, matching the original
+    whole-file loader.
+    """
+    chunks = list(iter_quoted_csv(path, chunk_bytes=chunk_bytes))
+    if len(chunks) == 1:
+        df = chunks[0]
+    else:
+        df = pd.concat(chunks, ignore_index=True)
+    del chunks
+    return _infer_numeric(df).replace("", pd.NA)
+
+
+# ============================================================================
+# Columnar sidecar cache
+# ============================================================================
+
+
+def source_stamp(path=DATA_FILE):
+    """Cheap (size, mtime) stamp of ``path``, suitable as a cache key."""
+    stat = os.stat(path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def file_fingerprint(path=DATA_FILE):
+    """Size, mtime and SHA-256 of ``path``."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+    size, mtime_ns = source_stamp(path)
+    return {
+        "version": CACHE_VERSION,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "sha256": digest.hexdigest(),
+    }
+
+
+def cache_path(path=DATA_FILE):
+    return path + CACHE_SUFFIX
+
+
+def _read_cached_fingerprint(cache):
+    try:
+        metadata = pq.read_schema(cache).metadata or {}
+    except (OSError, ValueError):
+        return None
+    raw = metadata.get(_FINGERPRINT_KEY)
+    return json.loads(raw) if raw else None
+
+
+def _write_atomically(target, write):
+    # Write next to the final file under a name of its own and rename, so a
+    # reader never sees a half-written file and concurrent writers (server
+    # replicas, the loader pool) do not write over each other's.
+    fd, tmp = tempfile.mkstemp(
+        dir=os.path.dirname(target) or ".",
+        prefix=f".{os.path.basename(target)}.",
+        suffix=".tmp",
+    )
+    os.close(fd)
+    try:
+        write(tmp)
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def _write_cache(table, cache, fingerprint):
+    metadata = dict(table.schema.metadata or {})
+    metadata[_FINGERPRINT_KEY] = json.dumps(fingerprint).encode()
+    table = table.replace_schema_metadata(metadata)
+    _write_atomically(cache, lambda tmp: pq.write_table(table, tmp))
+
+
+def _read_stamp(cache):
+    try:
+        with open(cache + STAMP_SUFFIX) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_stamp(cache, stamp):
+    def write(tmp):
+        with open(tmp, "w") as f:
+            json.dump(stamp, f)
+
+    _write_atomically(cache + STAMP_SUFFIX, write)
+
+
+def cache_is_fresh(path=DATA_FILE):
+    """Return True if the sidecar cache for ``path`` matches the source.
+
+    Size and mtime are compared first. If only the mtime differs (the file
+    was touched or copied) the content hash decides. A matching cache is
+    not rewritten: the new mtime goes to a small stamp sidecar, so the file
+    is only hashed again when it changes again.
+    """
+    cache = cache_path(path)
+    cached = _read_cached_fingerprint(cache)
+    if cached is None or cached.get("version") != CACHE_VERSION:
+        return False
+
+    size, mtime_ns = source_stamp(path)
+    if cached["size"] != size:
+        return False
+    if cached["mtime_ns"] == mtime_ns:
+        return True
+    stamp = {"sha256": cached["sha256"], "size": size, "mtime_ns": mtime_ns}
+    if _read_stamp(cache) == stamp:
+        return True
+
+    if file_fingerprint(path)["sha256"] != cached["sha256"]:
+        return False
+    try:
+        _write_stamp(cache, stamp)
+    except OSError:
+        pass
+    return True
+
+
+def build_cache(path=DATA_FILE, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Parse ``path`` and (re)write its sidecar cache. Returns the typed frame."""
+    fingerprint = file_fingerprint(path)
+    df = apply_schema(read_quoted_csv(path, chunk_bytes=chunk_bytes))
+    try:
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        _write_cache(table, cache_path(path), fingerprint)
+    except OSError:
+        # Read-only checkouts still work, they just re-parse on every start.
+        pass
+    return df
+
+
+# ============================================================================
+# Incremental refresh of appended exports
+# ============================================================================
+
+
+def _hash_prefix(f, size):
+    digest = hashlib.sha256()
+    last = b""
+    while size:
+        block = f.read(min(_HASH_BLOCK_BYTES, size))
+        if not block:
+            return None, last
+        digest.update(block)
+        size -= len(block)
+        last = block[-1:]
+    return digest, last
+
+
+def _typed_like(tail, cached):
+    # Give the new rows the column types the whole file would have: a
+    # column stays numeric only if the new values are numeric too
+    tail = tail.replace("", pd.NA)
+    for column in tail.columns:
+        if column == "Tagged":
+            continue
+        dtype = cached[column].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            dtype = dtype.categories.dtype
+        if not pd.api.types.is_numeric_dtype(dtype):
+            continue
+        try:
+            values = pd.to_numeric(tail[column])
+        except (ValueError, TypeError):
+            return None
+        if pd.api.types.is_integer_dtype(dtype) and not (
+            pd.api.types.is_integer_dtype(values.dtype) or len(values) == 0
+        ):
+            return None
+        tail[column] = values
+    return apply_schema(tail)
+
+
+def append_to_cache(path=DATA_FILE, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Refresh the cache of a file that only grew, parsing just the new rows.
+
+    The file counts as appended to when it is larger than when cached, its
+    first (cached size) bytes still hash to the cached SHA-256 and they end
+    with a complete line. Returns the updated typed frame, or ``None`` when
+    the file must be parsed again in full.
+    """
+    cache = cache_path(path)
+    cached = _read_cached_fingerprint(cache)
+    if cached is None or cached.get("version") != CACHE_VERSION:
+        return None
+    size, mtime_ns = source_stamp(path)
+    if size <= cached["size"]:
+        return None
+
+    with open(path, "rb") as f:
+        digest, last = _hash_prefix(f, cached["size"])
+        if digest is None or last != b"\n" or digest.hexdigest() != cached["sha256"]:
+            return None
+        offset = f.tell()
+        for block in iter(lambda: f.read(_HASH_BLOCK_BYTES), b""):
+            digest.update(block)
+
+        f.seek(offset)
+        previous = apply_schema(pd.read_parquet(cache))
+        header = ",".join(previous.columns)
+        with io.TextIOWrapper(f) as lines:
+            tail = pd.concat(
+                list(_quoted_chunks(lines, header, chunk_bytes)), ignore_index=True
+            )
+    if list(tail.columns) != list(previous.columns):
+        return None
+    tail = _typed_like(tail, previous)
+    if tail is None:
+        return None
+
+    df = _concat([previous, tail], list(previous.columns))
+    fingerprint = {
+        "version": CACHE_VERSION,
+        "size": size,
+        "mtime_ns": mtime_ns,
+        "sha256": digest.hexdigest(),
+        # The cached content this one extends, for incremental aggregates
+        "appended_to": {"sha256": cached["sha256"], "rows": len(previous)},
+    }
+    try:
+        _write_cache(pa.Table.from_pandas(df, preserve_index=False), cache, fingerprint)
+    except OSError:
+        pass
+    return df
+
+
+def refresh_cache(path=DATA_FILE, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Bring the cache of ``path`` up to date: by appending if possible,
+    else by a full ``build_cache``. Returns the typed frame."""
+    df = append_to_cache(path, chunk_bytes=chunk_bytes)
+    if df is None:
+        df = build_cache(path, chunk_bytes=chunk_bytes)
+    return df
+
+
+def load_dataset(path=DATA_FILE, columns=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Load ``path`` as a typed frame through its columnar cache.
+
+    Only ``columns`` are read from the cache when given. The cache is built
+    on first use and refreshed whenever the source file changes: only the
+    new rows are parsed when the file was appended to.
+    """
+    if cache_is_fresh(path):
+        return pd.read_parquet(cache_path(path), columns=columns)
+
+    df = refresh_cache(path, chunk_bytes=chunk_bytes)
+    return df if columns is None else df[list(columns)]
+
+
+# ============================================================================
+# Multi-file ingestion
+# ============================================================================
+
+# Data source setting: a CSV file, a directory of CSV files, or a glob
+DATA_SOURCE = os.environ.get("CLOUDMART_DATA", DATA_FILE)
+
+SOURCE_COLUMN = "SourceFile"
+# Account IDs are taken from file names (e.g. ``123456789012-2026-01.csv``)
+# when a file has no AccountID column
+ACCOUNT_ID_PATTERN = re.compile(r"\d{4,}")
+
+
+def expand_sources(source=DATA_SOURCE):
+    """Sorted CSV files named by ``source`` (a file, directory or glob)."""
+    if os.path.isdir(source):
+        paths = glob.glob(os.path.join(source, "*.csv"))
+    elif glob.has_magic(source):
+        paths = glob.glob(source)
+    else:
+        paths = [source] if os.path.exists(source) else []
+    if not paths:
+        raise FileNotFoundError(f"No CSV files found for {source}")
+    return sorted(paths)
+
+
+def sources_stamp(source=DATA_SOURCE):
+    """``source_stamp`` of every file in ``source``, as a cache key."""
+    return tuple((path, *source_stamp(path)) for path in expand_sources(source))
+
+
+def dataset_version(source=DATA_SOURCE):
+    """``(path, sha256, rows, appended_to)`` of each cached file of ``source``.
+
+    Compare two versions with ``appended_positions``. Files without a cache
+    have ``None`` fields.
+    """
+    version = []
+    for path in expand_sources(source):
+        cache = cache_path(path)
+        fingerprint = _read_cached_fingerprint(cache) or {}
+        try:
+            rows = pq.ParquetFile(cache).metadata.num_rows
+        except (OSError, ValueError):
+            rows = None
+        version.append(
+            (path, fingerprint.get("sha256"), rows, fingerprint.get("appended_to"))
+        )
+    return tuple(version)
+
+
+def appended_positions(before, after):
+    """Row positions ``after`` added to ``before``, if rows were only appended.
+
+    Both are ``dataset_version`` results. Returns ``None`` when any file was
+    rewritten (or files were added or removed), since earlier rows changed.
+    """
+    if [entry[0] for entry in before] != [entry[0] for entry in after]:
+        return None
+    positions = []
+    offset = 0
+    for (_, old_sha, old_rows, _), (_, sha, rows, appended_to) in zip(before, after):
+        if None in (old_sha, old_rows, sha, rows):
+            return None
+        if sha != old_sha:
+            if appended_to != {"sha256": old_sha, "rows": old_rows}:
+                return None
+            positions.append(np.arange(offset + old_rows, offset + rows))
+        offset += rows
+    if not positions:
+        return np.array([], dtype=np.int64)
+    return np.concatenate(positions)
+
+
+def _ingest(path, chunk_bytes):
+    # Runs in a worker: parse into the sidecar cache, and only ship the
+    # frame back if the cache could not be written
+    df = refresh_cache(path, chunk_bytes=chunk_bytes)
+    return None if cache_is_fresh(path) else df
+
+
+def account_id_from_name(path):
+    match = ACCOUNT_ID_PATTERN.search(os.path.basename(path))
+    if match is None:
+        raise ValueError(f"{path} has no AccountID column or account ID in its name")
+    return int(match.group())
+
+
+def _check_schema(frames, paths):
+    expected = list(frames[0].columns)
+    for df, path in zip(frames[1:], paths[1:]):
+        if set(df.columns) != set(expected):
+            missing = sorted(set(expected) - set(df.columns))
+            extra = sorted(set(df.columns) - set(expected))
+            raise ValueError(
+                f"{path} does not match the schema of {paths[0]}: "
+                f"missing {missing}, unexpected {extra}"
+            )
+    return expected
+
+
+def _concat(frames, columns):
+    frames = [df[columns] for df in frames]
+    # Categories differ between files; concat would fall back to object
+    categorical = [
+        column
+        for column in columns
+        if all(isinstance(df[column].dtype, pd.CategoricalDtype) for df in frames)
+    ]
+    combined = pd.concat(
+        [df.drop(columns=categorical) for df in frames], ignore_index=True
+    )
+    for column in categorical:
+        combined[column] = union_categoricals(
+            [df[column] for df in frames], sort_categories=True
+        )
+    return combined[columns]
+
+
+def refresh_caches(paths, max_workers=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """Rebuild the stale caches of ``paths``, in parallel when several are stale.
+
+    Returns ``{path: frame}`` for files parsed by a worker whose cache could
+    not be written; every other file can be read from its cache.
+    """
+    frames = {}
+    stale = [path for path in paths if not cache_is_fresh(path)]
+    if len(stale) > 1 and max_workers != 1:
+        workers = min(len(stale), max_workers or os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(_ingest, stale, [chunk_bytes] * len(stale))
+            for path, df in zip(stale, results):
+                if df is not None:
+                    frames[path] = df
+    return frames
+
+
+def load_sources(
+    source=DATA_SOURCE, columns=None, max_workers=None, chunk_bytes=DEFAULT_CHUNK_BYTES
+):
+    """Load every export named by ``source`` into one typed frame.
+
+    Files with a stale cache are parsed in parallel (up to ``max_workers``
+    processes, default one per CPU). All files must share their columns; a
+    missing ``AccountID`` is filled from the file name. When there is more
+    than one file, each row records its file in ``SourceFile``.
+    """
+    paths = expand_sources(source)
+    frames = refresh_caches(paths, max_workers, chunk_bytes)
+
+    loaded = []
+    for path in paths:
+        df = frames.pop(path, None)
+        if df is None:
+            df = load_dataset(path, chunk_bytes=chunk_bytes)
+        if "AccountID" not in df.columns:
+            df.insert(0, "AccountID", account_id_from_name(path))
+        # Integer categoricals come back from Parquet as plain integers
+        df = apply_schema(df)
+        if len(paths) > 1:
+            codes = np.full(len(df), paths.index(path), dtype="int32")
+            df[SOURCE_COLUMN] = pd.Categorical.from_codes(codes, categories=paths)
+        loaded.append(df)
+
+    combined = (
+        loaded[0] if len(loaded) == 1 else _concat(loaded, _check_schema(loaded, paths))
+    )
+    return combined if columns is None else combined[list(columns)]
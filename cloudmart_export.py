@@ -0,0 +1,142 @@
+"""Chunked CSV, gzip and Parquet exports for the dashboard downloads.
+
+Exports are written from an iterable of DataFrame chunks straight to a file,
+so no full-size CSV string is ever built. ``frame_chunks`` slices a loaded
+frame; ``RemediationOverlay.iter_frames`` yields the remediated dataset the
+same way without materializing it.
+
+``Tagged`` is written as Yes/No and categorical columns as their values, so
+every format matches what the original loader read.
+
+A ``PreparedFile`` deletes its temporary file when it is replaced or
+garbage collected, e.g. with the state of a session that ended.
+"""
+
+import gzip
+import os
+import tempfile
+import weakref
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cloudmart_schema import with_tag_labels
+
+DEFAULT_EXPORT_CHUNK_ROWS = 100_000
+
+# Format name -> (file suffix, MIME type)
+EXPORT_FORMATS = {
+    "csv": (".csv", "text/csv"),
+    "csv.gz": (".csv.gz", "application/gzip"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+
+def frame_chunks(df, chunk_rows=DEFAULT_EXPORT_CHUNK_ROWS):
+    """Yield ``df`` in row slices of ``chunk_rows``, with Yes/No Tagged labels."""
+    # Always at least one chunk, so an empty export still has its header
+    for start in range(0, max(len(df), 1), chunk_rows):
+        yield with_tag_labels(df.iloc[start : start + chunk_rows])
+
+
+def _write_csv(chunks, f):
+    header = True
+    for chunk in chunks:
+        chunk.to_csv(f, index=False, header=header)
+        header = False
+
+
+def _plain_table(chunk):
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    # Dictionary (categorical) columns are stored as their values, so chunks
+    # with different categories still share one schema
+    fields = []
+    for field in table.schema:
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(field.type.value_type)
+        elif pa.types.is_large_string(field.type):
+            # pandas' Arrow-backed strings; plain strings like other exports
+            field = field.with_type(pa.string())
+        elif pa.types.is_null(field.type):
+            field = field.with_type(pa.string())
+        fields.append(field)
+    return table.cast(pa.schema(fields))
+
+
+def _write_parquet(chunks, path):
+    writer = None
+    try:
+        for chunk in chunks:
+            table = _plain_table(chunk)
+            if writer is None:
+                schema = table.schema.remove_metadata()
+                writer = pq.ParquetWriter(path, schema)
+            writer.write_table(table.cast(schema))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_export(chunks, path, fmt="csv"):
+    """Write DataFrame ``chunks`` to ``path`` as ``fmt`` (see EXPORT_FORMATS)."""
+    if fmt == "csv":
+        with open(path, "w", newline="") as f:
+            _write_csv(chunks, f)
+    elif fmt == "csv.gz":
+        with gzip.open(path, "wt", newline="") as f:
+            _write_csv(chunks, f)
+    elif fmt == "parquet":
+        _write_parquet(chunks, path)
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+    return path
+
+
+def _to_tempfile(write, suffix, prefix):
+    fd, path = tempfile.mkstemp(prefix=prefix, suffix=suffix)
+    os.close(fd)
+    try:
+        write(path)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+def export_to_tempfile(chunks, fmt="csv", prefix="cloudmart_"):
+    """Write ``chunks`` to a new temporary file and return its path."""
+    suffix, _ = EXPORT_FORMATS[fmt]
+    return _to_tempfile(lambda path: write_export(chunks, path, fmt), suffix, prefix)
+
+
+def text_to_tempfile(text, suffix, prefix="cloudmart_"):
+    """Write ``text`` to a new temporary file and return its path."""
+
+    def write(path):
+        with open(path, "w") as f:
+            f.write(text)
+
+    return _to_tempfile(write, suffix, prefix)
+
+
+def _remove_file(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class PreparedFile:
+    """A temporary file built for ``signature``, deleted with this object.
+
+    ``remove()`` deletes it at once; otherwise it goes when the object is
+    garbage collected, or at exit at the latest.
+    """
+
+    def __init__(self, path, signature):
+        self.path = path
+        self.signature = signature
+        self.remove = weakref.finalize(self, _remove_file, path)
+
+    def matches(self, signature):
+        return self.signature == signature and os.path.exists(self.path)
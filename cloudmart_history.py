@@ -0,0 +1,524 @@
+"""Compliance snapshot history for CloudMart billing exports.
+
+A ``SnapshotStore`` is a directory of small, append-only Parquet files, one
+set per recorded scan:
+
+* ``metrics/<id>.parquet``: one row with the headline metrics (Task 1.5
+  untagged share, Task 2.2 untagged cost share, Task 3.1 average
+  completeness, ...);
+* ``rollups/<id>.parquet``: the same counts per Department, AccountID and
+  Environment;
+* ``deltas/<id>.parquet``: the resources that changed since the previous
+  snapshot (added, removed, newly tagged or untagged, tags or cost changed),
+  with their state on both sides;
+* ``states/<id>.parquet``: the per-resource state of the latest snapshot
+  only, which the next one's deltas are computed from. An earlier
+  snapshot's state is rebuilt from it by undoing the deltas in between.
+
+Snapshots are ordered by the date of their data, not by when they were
+recorded: a label such as ``2026-01`` or ``2026-01-31`` gives that date,
+else ``--date`` or the day it was recorded does. An earlier month can be
+backfilled after later ones; the deltas of the snapshot that follows it
+are then recomputed against it. Trend and "what changed" queries read the
+metrics, rollups and deltas files only, never a raw export::
+
+    python cloudmart_history.py record exports/2026-01/ --label 2026-01
+    python cloudmart_history.py show
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+from cloudmart_aggregates import COST
+from cloudmart_backend import PandasBackend
+from cloudmart_data import load_sources, sources_stamp
+from cloudmart_normalize import ALIASES_FILE, load_aliases, normalize_tags
+from cloudmart_patches import KEY_COLUMNS, resource_keys
+from cloudmart_schema import untagged_mask
+
+HISTORY_DIR = os.environ.get("CLOUDMART_HISTORY", "cloudmart_history")
+HISTORY_DIMENSIONS = ["Department", "AccountID", "Environment"]
+
+METRICS = [
+    "TotalResources",
+    "Untagged",
+    "PercentageUntagged",
+    "TotalCost",
+    "UntaggedCost",
+    "PercentageUntaggedCost",
+    "AvgCompleteness",
+]
+ROLLUP_MEASURES = ["Resources", "Untagged", "Cost", "UntaggedCost", "AvgCompleteness"]
+
+# Labels that name the date of their data; a month stands for its first day
+DATE_LABEL = re.compile(r"\d{4}-\d{2}(-\d{2})?")
+
+# Delta kinds, in order of precedence when a resource changed in several ways
+CHANGES = [
+    "Added",
+    "Removed",
+    "Now tagged",
+    "No longer tagged",
+    "Tags changed",
+    "Cost changed",
+]
+
+
+def data_date(label, taken_at):
+    """``YYYY-MM-DD`` of the data of a snapshot: its label's date if it is
+    one (see DATE_LABEL), else the day it was taken."""
+    if label and DATE_LABEL.fullmatch(label):
+        try:
+            return pd.Timestamp(label).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    return pd.Timestamp(taken_at).strftime("%Y-%m-%d")
+
+
+def _percentage(part, whole):
+    return float(part / whole * 100) if whole > 0 else 0.0
+
+
+def snapshot_metrics(df, backend=None):
+    """Headline metrics of ``df``, keyed like METRICS."""
+    backend = backend if backend is not None else PandasBackend(df)
+    untagged = untagged_mask(df)
+    total_cost = float(df[COST].sum())
+    untagged_cost = float(df.loc[untagged, COST].sum())
+    average, _ = backend.completeness(n=0)
+    return {
+        "TotalResources": len(df),
+        "Untagged": int(untagged.sum()),
+        "PercentageUntagged": _percentage(int(untagged.sum()), len(df)),
+        "TotalCost": total_cost,
+        "UntaggedCost": untagged_cost,
+        "PercentageUntaggedCost": _percentage(untagged_cost, total_cost),
+        "AvgCompleteness": average,
+    }
+
+
+def snapshot_rollups(df, backend=None, dimensions=HISTORY_DIMENSIONS):
+    """ROLLUP_MEASURES per value of each of ``dimensions``, in long form."""
+    backend = backend if backend is not None else PandasBackend(df)
+    presence = backend.presence()
+    untagged = untagged_mask(df).to_numpy()
+    cost = df[COST].to_numpy()
+    rows = pd.DataFrame(
+        {
+            "Untagged": untagged,
+            "Cost": cost,
+            "UntaggedCost": np.where(untagged, cost, 0.0),
+            "AvgCompleteness": presence.percentages(presence.scores),
+        }
+    )
+    tables = []
+    for dimension in dimensions:
+        rows["Value"] = df[dimension].to_numpy()
+        table = (
+            rows.groupby("Value", observed=True)
+            .agg(
+                Resources=("Cost", "size"),
+                Untagged=("Untagged", "sum"),
+                Cost=("Cost", "sum"),
+                UntaggedCost=("UntaggedCost", "sum"),
+                AvgCompleteness=("AvgCompleteness", "mean"),
+            )
+            .reset_index()
+        )
+        table["Value"] = table["Value"].astype(str)
+        table.insert(0, "Dimension", dimension)
+        tables.append(table)
+    return pd.concat(tables, ignore_index=True)
+
+
+def resource_state(df, backend=None):
+    """Tagged flag, tag presence mask and cost per ``(AccountID, ResourceID)``.
+
+    A resource listed on several rows keeps its first row's flag and mask
+    and the total of its costs.
+    """
+    backend = backend if backend is not None else PandasBackend(df)
+    keys = resource_keys(df)
+    state = pd.DataFrame(
+        {
+            "Tagged": df["Tagged"].array,
+            "Mask": backend.presence().mask,
+            "Cost": df[COST].to_numpy(),
+        },
+        index=keys,
+    )
+    costs = state["Cost"].groupby(level=KEY_COLUMNS, sort=False, observed=True).sum()
+    state = state[~keys.duplicated()].copy()
+    state["Cost"] = costs.reindex(state.index).to_numpy()
+    return state
+
+
+def _same(before, after):
+    return (before == after).fillna(False).to_numpy() | (
+        before.isna().to_numpy() & after.isna().to_numpy()
+    )
+
+
+def resource_deltas(before, after):
+    """Resources whose state differs between two ``resource_state`` frames."""
+    joined = before.join(after, how="outer", lsuffix="Before", rsuffix="After")
+    was_tagged = joined["TaggedBefore"].fillna(False).to_numpy(dtype=bool)
+    is_tagged = joined["TaggedAfter"].fillna(False).to_numpy(dtype=bool)
+    change = np.select(
+        [
+            joined["MaskBefore"].isna().to_numpy(),
+            joined["MaskAfter"].isna().to_numpy(),
+            is_tagged & ~was_tagged,
+            was_tagged & ~is_tagged,
+            ~_same(joined["MaskBefore"], joined["MaskAfter"]),
+            ~_same(joined["CostBefore"], joined["CostAfter"]),
+        ],
+        CHANGES,
+        default="",
+    )
+    deltas = joined[change != ""].reset_index()
+    deltas.insert(2, "Change", change[change != ""])
+    return deltas.astype(
+        {
+            "TaggedBefore": "boolean",
+            "TaggedAfter": "boolean",
+            "MaskBefore": "UInt8",
+            "MaskAfter": "UInt8",
+        }
+    )
+
+
+def apply_deltas(state, deltas, side="After"):
+    """``state`` carried across ``resource_deltas``: forward to their
+    ``After`` side, or back to their ``Before`` side."""
+    changed = deltas.set_index(KEY_COLUMNS)
+    values = changed[[f"Tagged{side}", f"Mask{side}", f"Cost{side}"]]
+    values.columns = ["Tagged", "Mask", "Cost"]
+    # Resources absent on that side (added or removed) have no mask
+    values = values[values["Mask"].notna()].astype(state.dtypes.to_dict())
+    return pd.concat([state.drop(changed.index, errors="ignore"), values])
+
+
+def _write(frame, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write next to the final file and rename, so readers never see a
+    # half-written snapshot (dot files are skipped when reading a directory)
+    directory, name = os.path.split(path)
+    tmp = os.path.join(directory, f".{name}.{os.getpid()}.tmp")
+    frame.to_parquet(tmp, index=False)
+    os.replace(tmp, path)
+
+
+def _read_dir(path, filters=None):
+    if not os.path.isdir(path) or not any(
+        name.endswith(".parquet") for name in os.listdir(path)
+    ):
+        return None
+    return pq.read_table(path, filters=filters).to_pandas()
+
+
+class SnapshotStore:
+    """Append-only compliance snapshots under the directory ``path``."""
+
+    def __init__(self, path=HISTORY_DIR):
+        self.path = path
+
+    def _file(self, kind, snapshot):
+        return os.path.join(self.path, kind, f"{snapshot:06d}.parquet")
+
+    def snapshot_ids(self):
+        metrics = os.path.join(self.path, "metrics")
+        if not os.path.isdir(metrics):
+            return []
+        return sorted(
+            int(name.split(".")[0])
+            for name in os.listdir(metrics)
+            if name.endswith(".parquet")
+        )
+
+    def version(self):
+        """Changes whenever a snapshot is recorded; use as a cache key."""
+        return tuple(self.snapshot_ids())
+
+    def _reserve_id(self):
+        # An id is taken by creating its file exclusively, so concurrent
+        # records never get the same one
+        directory = os.path.join(self.path, "ids")
+        os.makedirs(directory, exist_ok=True)
+        taken = self.snapshot_ids() + [
+            int(name) for name in os.listdir(directory) if name.isdigit()
+        ]
+        snapshot = max(taken, default=0) + 1
+        while True:
+            try:
+                fd = os.open(
+                    os.path.join(directory, f"{snapshot:06d}"),
+                    os.O_CREAT | os.O_EXCL | os.O_WRONLY,
+                )
+            except FileExistsError:
+                snapshot += 1
+                continue
+            os.close(fd)
+            return snapshot
+
+    def _kept_states(self):
+        directory = os.path.join(self.path, "states")
+        if not os.path.isdir(directory):
+            return []
+        return [
+            int(name.split(".")[0])
+            for name in os.listdir(directory)
+            if name.endswith(".parquet") and not name.startswith(".")
+        ]
+
+    def _state(self, snapshot, snapshots):
+        """Resource state of ``snapshot``, from the kept state and the deltas
+        between the two (``snapshots`` gives their order)."""
+        ids = snapshots["Snapshot"].tolist()
+        kept = max((i for i in self._kept_states() if i in ids), key=ids.index)
+        state = pd.read_parquet(self._file("states", kept)).set_index(KEY_COLUMNS)
+        start, end = ids.index(kept), ids.index(snapshot)
+        # A snapshot's deltas lead from the one before it to it
+        for position in range(start, end, -1):
+            state = apply_deltas(state, self.deltas(ids[position]), "Before")
+        for position in range(start + 1, end + 1):
+            state = apply_deltas(state, self.deltas(ids[position]), "After")
+        return state
+
+    def _keep_state(self, snapshot, state):
+        # Only the latest snapshot's state is kept
+        _write(state.reset_index(), self._file("states", snapshot))
+        for other in self._kept_states():
+            if other != snapshot:
+                try:
+                    os.remove(self._file("states", other))
+                except FileNotFoundError:
+                    pass
+
+    def _write_deltas(self, snapshot, before, after):
+        if before is None:
+            deltas = resource_deltas(after.iloc[:0], after.iloc[:0])
+        else:
+            deltas = resource_deltas(before, after)
+        deltas.insert(0, "Snapshot", snapshot)
+        _write(deltas, self._file("deltas", snapshot))
+
+    def record(
+        self, df, source, label=None, fingerprint=None, taken_at=None, date=None
+    ):
+        """Record a snapshot of ``df`` and return its id.
+
+        A scan whose ``fingerprint`` was already recorded is not recorded
+        again; its existing id is returned. ``date`` (``YYYY-MM-DD``, by
+        default ``data_date``) places the snapshot among the others. The
+        first snapshot has no deltas.
+        """
+        snapshots = self.snapshots()
+        if fingerprint is not None and snapshots is not None:
+            seen = snapshots[snapshots["Fingerprint"] == fingerprint]
+            if len(seen):
+                return int(seen["Snapshot"].iloc[-1])
+
+        taken_at = taken_at or datetime.now(timezone.utc)
+        label = label or taken_at.strftime("%Y-%m-%d")
+        date = pd.Timestamp(date).strftime("%Y-%m-%d") if date else None
+        date = date or data_date(label, taken_at)
+
+        # The snapshots dated before and after this one; a new id sorts
+        # last among those of the same date
+        previous = following = None
+        if snapshots is not None:
+            earlier = snapshots["DataDate"] <= date
+            if earlier.any():
+                previous = int(snapshots.loc[earlier, "Snapshot"].iloc[-1])
+            if not earlier.all():
+                following = int(snapshots.loc[~earlier, "Snapshot"].iloc[0])
+        before = None if previous is None else self._state(previous, snapshots)
+        after = None if following is None else self._state(following, snapshots)
+
+        snapshot = self._reserve_id()
+        backend = PandasBackend(df)
+        state = resource_state(df, backend)
+        self._write_deltas(snapshot, before, state)
+
+        rollups = snapshot_rollups(df, backend)
+        rollups.insert(0, "Snapshot", snapshot)
+        _write(rollups, self._file("rollups", snapshot))
+
+        # Written last: a snapshot exists once its metrics file does
+        metrics = {
+            "Snapshot": snapshot,
+            "Label": label,
+            "DataDate": date,
+            "TakenAt": taken_at.isoformat(timespec="seconds"),
+            "Source": str(source),
+            "Fingerprint": fingerprint or "",
+            **snapshot_metrics(df, backend),
+        }
+        _write(pd.DataFrame([metrics]), self._file("metrics", snapshot))
+
+        # A backfilled snapshot comes between two: the next one's changes
+        # are now the ones since this snapshot, and the latest state stays
+        if following is not None:
+            self._write_deltas(following, state, after)
+        else:
+            self._keep_state(snapshot, state)
+        return snapshot
+
+    def snapshots(self):
+        """Metrics of every snapshot, by date of data (``None`` if empty)."""
+        metrics = _read_dir(os.path.join(self.path, "metrics"))
+        if metrics is None:
+            return None
+        return metrics.sort_values(["DataDate", "Snapshot"], ignore_index=True)
+
+    def rollups(self, dimension=None):
+        """Per-dimension rollups of every snapshot, in long form."""
+        filters = None if dimension is None else [("Dimension", "=", dimension)]
+        rollups = _read_dir(os.path.join(self.path, "rollups"), filters)
+        if rollups is None:
+            return None
+        snapshots = self.snapshots()
+        labels = snapshots.set_index("Snapshot")["Label"]
+        rollups.insert(1, "Label", rollups["Snapshot"].map(labels))
+        order = pd.Series(snapshots.index, index=snapshots["Snapshot"])
+        rollups["Order"] = rollups["Snapshot"].map(order)
+        return rollups.sort_values(
+            ["Order", "Dimension", "Value"], ignore_index=True
+        ).drop(columns="Order")
+
+    def dimension_trend(self, dimension, measure="UntaggedCost"):
+        """``measure`` per snapshot and value of ``dimension``."""
+        rollups = self.rollups(dimension)
+        if rollups is None:
+            return None
+        return rollups[["Snapshot", "Label", "Value", measure]]
+
+    def deltas(self, snapshot=None):
+        """Resource changes since the snapshot before ``snapshot`` (default:
+        the latest)."""
+        snapshots = self.snapshots()
+        if snapshots is None:
+            return None
+        snapshot = snapshots["Snapshot"].iloc[-1] if snapshot is None else snapshot
+        return pd.read_parquet(self._file("deltas", snapshot))
+
+    def changes(self, snapshot=None):
+        """What changed in ``snapshot`` (default: latest) since the one before.
+
+        Returns ``None`` until there are two snapshots, else a dict with the
+        metric changes, per-dimension changes (largest untagged cost change
+        first), resource change counts and the resource deltas.
+        """
+        snapshots = self.snapshots()
+        if snapshots is None or len(snapshots) < 2:
+            return None
+        ids = snapshots["Snapshot"].tolist()
+        snapshot = ids[-1] if snapshot is None else snapshot
+        position = ids.index(snapshot)
+        if position == 0:
+            return None
+        previous = ids[position - 1]
+
+        by_id = snapshots.set_index("Snapshot")
+        metrics = pd.DataFrame(
+            {
+                "Before": by_id.loc[previous, METRICS].astype(float),
+                "After": by_id.loc[snapshot, METRICS].astype(float),
+            }
+        ).rename_axis("Metric")
+        metrics["Change"] = metrics["After"] - metrics["Before"]
+
+        rollups = self.rollups()
+        keys = ["Dimension", "Value"]
+        dimensions = (
+            rollups[rollups["Snapshot"] == previous]
+            .set_index(keys)[ROLLUP_MEASURES]
+            .join(
+                rollups[rollups["Snapshot"] == snapshot].set_index(keys)[
+                    ROLLUP_MEASURES
+                ],
+                how="outer",
+                lsuffix="Before",
+                rsuffix="After",
+            )
+        )
+        for measure in ["Untagged", "UntaggedCost", "AvgCompleteness"]:
+            dimensions[f"{measure}Change"] = dimensions[f"{measure}After"].fillna(
+                0
+            ) - dimensions[f"{measure}Before"].fillna(0)
+        dimensions = dimensions.reset_index().sort_values(
+            "UntaggedCostChange", key=abs, ascending=False, kind="stable"
+        )
+
+        deltas = self.deltas(snapshot)
+        counts = (
+            deltas["Change"]
+            .value_counts()
+            .reindex(CHANGES, fill_value=0)
+            .rename_axis("Change")
+            .rename("Resources")
+        )
+        return {
+            "snapshot": by_id.loc[snapshot, "Label"],
+            "previous": by_id.loc[previous, "Label"],
+            "metrics": metrics.reset_index(),
+            "dimensions": dimensions.reset_index(drop=True),
+            "change_counts": counts.reset_index(),
+            "deltas": deltas,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--store", default=HISTORY_DIR, help="history directory")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record = commands.add_parser("record", help="record a snapshot of an export")
+    record.add_argument("source", help="CSV file, directory or glob")
+    record.add_argument("--label", help="snapshot label (default: today's date)")
+    record.add_argument(
+        "--date",
+        help="date of the data, YYYY-MM-DD (default: the label's, else today)",
+    )
+    commands.add_parser("show", help="print the metrics of every snapshot")
+    args = parser.parse_args(argv)
+
+    store = SnapshotStore(args.store)
+    if args.command == "record":
+        try:
+            # Normalized like the dashboard's data, so snapshots compare
+            df, _ = normalize_tags(
+                load_sources(args.source), load_aliases(ALIASES_FILE)
+            )
+            fingerprint = json.dumps(sources_stamp(args.source))
+        except (OSError, ValueError, pd.errors.ParserError) as e:
+            print(f"cloudmart_history: {args.source}: {e}", file=sys.stderr)
+            return 1
+        try:
+            snapshot = store.record(
+                df, args.source, args.label, fingerprint, date=args.date
+            )
+        except ValueError as e:
+            print(f"cloudmart_history: {e}", file=sys.stderr)
+            return 1
+        print(f"Snapshot {snapshot} recorded in {args.store}")
+        return 0
+
+    snapshots = store.snapshots()
+    if snapshots is None:
+        print(f"No snapshots in {args.store}")
+        return 0
+    print(snapshots[["Snapshot", "Label", "DataDate"] + METRICS].to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Inverted indexes on the CloudMart dimension columns.
+
+For each indexed column, ``DimensionIndex`` keeps a posting list of row
+positions per distinct value, stored CSR-style: one array of row ids grouped
+by value (ascending within each value) plus an offsets array. A column's
+categorical codes double as its forward index, so no extra per-row copy is
+made.
+
+A filter is evaluated as
+
+* the union of the posting lists of the selected values, for the most
+  selective filtered dimension, then
+* an intersection with every other filtered dimension, done by looking up
+  each surviving row's code in that dimension's selected-value bitmap.
+
+The result is a lazy ``RowSelection``: only row ids are computed, and rows are
+taken from the frame when a table or export asks for them.
+"""
+
+import numpy as np
+import pandas as pd
+
+INDEX_DIMENSIONS = [
+    "Service",
+    "Region",
+    "Department",
+    "Environment",
+    "AccountID",
+    "Tagged",
+]
+
+
+class _PostingLists:
+    def __init__(self, column):
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes = column.cat.codes.to_numpy()
+            values = column.cat.categories
+        else:
+            codes, values = pd.factorize(column, sort=True)
+        self.values = pd.Index(values)
+        self.codes = codes
+
+        # Missing values get code -1, so slot 0 of the offsets holds them.
+        row_dtype = np.int32 if len(column) < np.iinfo(np.int32).max else np.int64
+        self.row_ids = np.argsort(codes, kind="stable").astype(row_dtype)
+        counts = np.bincount(codes + 1, minlength=len(self.values) + 1)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def _slots(self, values):
+        positions = self.values.get_indexer(pd.Index(list(values)))
+        return np.unique(positions[positions >= 0]) + 1
+
+    def count(self, values):
+        slots = self._slots(values)
+        return int((self.offsets[slots + 1] - self.offsets[slots]).sum())
+
+    def rows(self, values):
+        """Sorted row ids holding any of ``values`` (union of posting lists)."""
+        slots = self._slots(values)
+        if len(slots) == 0:
+            return self.row_ids[:0]
+        if len(slots) == 1:
+            return self.row_ids[self.offsets[slots[0]] : self.offsets[slots[0] + 1]]
+        return np.sort(
+            np.concatenate(
+                [self.row_ids[self.offsets[s] : self.offsets[s + 1]] for s in slots]
+            )
+        )
+
+    def bitmap(self, values):
+        """Selected-value bitmap, indexed by code + 1."""
+        bitmap = np.zeros(len(self.values) + 1, dtype=bool)
+        bitmap[self._slots(values)] = True
+        return bitmap
+
+
+class DimensionIndex:
+    """Posting-list indexes over the dimension columns of one frame."""
+
+    def __init__(self, df, dimensions=INDEX_DIMENSIONS):
+        self.n_rows = len(df)
+        self.postings = {
+            column: _PostingLists(df[column])
+            for column in dimensions
+            if column in df.columns
+        }
+
+    def select(self, selections):
+        """Lazy selection of rows whose values are in ``selections``.
+
+        ``selections`` maps a dimension to the values to keep; ``None`` means
+        no filter on that dimension.
+        """
+        unknown = [
+            column
+            for column, values in selections.items()
+            if values is not None and column not in self.postings
+        ]
+        if unknown:
+            raise KeyError(f"Not an indexed dimension: {', '.join(unknown)}")
+        return RowSelection(self, selections)
+
+    def row_ids(self, selections):
+        active = [
+            (column, values)
+            for column, values in selections.items()
+            if values is not None
+        ]
+        if not active:
+            return np.arange(self.n_rows)
+
+        # Start from the smallest posting-list union; the remaining filters
+        # only look at the rows that survive it.
+        active.sort(key=lambda item: self.postings[item[0]].count(item[1]))
+        column, values = active[0]
+        rows = self.postings[column].rows(values)
+        for column, values in active[1:]:
+            postings = self.postings[column]
+            rows = rows[postings.bitmap(values)[postings.codes[rows] + 1]]
+        return rows
+
+
+class RowSelection:
+    """Rows matching a filter, materialized only when asked for."""
+
+    def __init__(self, index, selections):
+        self.index = index
+        self.selections = dict(selections)
+        self._row_ids = None
+
+    @property
+    def row_ids(self):
+        if self._row_ids is None:
+            self._row_ids = self.index.row_ids(self.selections)
+        return self._row_ids
+
+    def __len__(self):
+        return len(self.row_ids)
+
+    def head(self, df, n=5):
+        """First ``n`` matching rows of ``df``."""
+        return df.iloc[self.row_ids[:n]]
+
+    def frame(self, df):
+        """All matching rows of ``df``."""
+        return df.iloc[self.row_ids]
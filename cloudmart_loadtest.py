@@ -0,0 +1,482 @@
+"""Concurrent-session load test for the CloudMart dashboard.
+
+Runs ``cloudmart_dashboard.py`` as N simulated sessions at once, in one
+process like one Streamlit worker serving N analysts, with Streamlit's
+headless ``AppTest``. Each session replays interaction scripts (browsing
+the sections, changing the Task 4.5 filters, editing cells in the Task 5.1
+``untagged_editor`` and preparing the downloads), and every script rerun is
+timed. For each session count the rerun latency percentiles, the peak RSS
+and the hit rate of the Streamlit caches are reported::
+
+    python cloudmart_loadtest.py --size 100K --sessions 1 2 4 8
+    python cloudmart_loadtest.py --size 1M --sessions 4 16 --output load.json
+
+Each session count runs in a fresh process, so its Streamlit caches start
+cold and its peak RSS is its own; the Parquet cache and the shared dataset
+are built beforehand, as on a host already serving the same export. Runs
+offline, against the synthetic exports kept in ``--workdir``.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import numpy as np
+import pandas as pd
+import streamlit
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from streamlit.runtime import Runtime
+from streamlit.runtime.caching.cache_data_api import DataCache
+from streamlit.runtime.caching.cache_resource_api import ResourceCache
+from streamlit.runtime.caching.cache_utils import CachedFunc
+from streamlit.runtime.caching.storage.dummy_cache_storage import (
+    MemoryCacheStorageManager,
+)
+from streamlit.runtime.media_file_manager import MediaFileManager
+from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+from streamlit.testing.v1 import AppTest
+
+from cloudmart_bench import DEFAULT_WORKDIR, synthetic_file
+from cloudmart_export import PreparedFile
+from cloudmart_normalize import load_aliases
+from cloudmart_shared import load_shared
+from cloudmart_synth import parse_size
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+DASHBOARD = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "cloudmart_dashboard.py"
+)
+
+DEFAULT_SIZE = "10K"
+DEFAULT_SESSIONS = [1, 2, 4, 8]
+DEFAULT_ROUNDS = 2
+# Seconds a single rerun may take before the session fails
+DEFAULT_TIMEOUT = 300
+PERCENTILES = [50, 95, 99]
+
+SECTIONS = [
+    "Task Set 1 - Data Exploration",
+    "Task Set 2 - Cost Visibility",
+    "Task Set 3 - Tagging Compliance",
+    "Task Set 4 - Visualization Dashboard",
+    "Task Set 5 - Tag Remediation Workflow",
+    "Tag Policies",
+    "Compliance History",
+]
+VISUALIZATION = SECTIONS[3]
+REMEDIATION = SECTIONS[4]
+FILTER_LABELS = ["Select Service(s)", "Select Region(s)", "Select Department(s)"]
+FILTER_CHANGES = 3
+# Editor rows edited per script; the first page always has this many rows
+EDITED_ROWS = 3
+EDITED_FIELD = "Owner"
+SEARCH_TERM = "ec2"
+DOWNLOADS = ["prepare_download_original", "prepare_download_remediated"]
+
+
+# Streamlit releases whose internals _patch_streamlit and Session.rerun
+# were checked against. Others stop the load test at startup rather than
+# run it with hooks that may silently no longer fire
+STREAMLIT_VERSIONS = ["1.51"]
+
+# Internals the load test relies on: the cache hit and write hooks (hit
+# rates), Runtime registration and the script cache (concurrent AppTest
+# runs), and AppTest's run with explicit widget states (editor state)
+STREAMLIT_INTERNALS = [
+    (CachedFunc, "_handle_cache_hit"),
+    (DataCache, "write_result"),
+    (ResourceCache, "write_result"),
+    (Runtime, "instance"),
+    (Runtime, "exists"),
+    (Runtime, "_instance"),
+    (ScriptCache, "get_bytecode"),
+    (AppTest, "_run"),
+]
+
+
+class CacheStats:
+    """Hits and computed values of every ``st.cache_data``/``st.cache_resource``
+    function, counted through the hooks ``_patch_streamlit`` installs."""
+
+    def __init__(self):
+        self.hits = Counter()
+        self.misses = Counter()
+        self._lock = threading.Lock()
+
+    def count(self, counter, name):
+        with self._lock:
+            counter[name] += 1
+
+    def summary(self):
+        names = sorted(set(self.hits) | set(self.misses))
+        functions = {
+            name.rsplit(".", 1)[-1]: {
+                "hits": self.hits[name],
+                "misses": self.misses[name],
+            }
+            for name in names
+        }
+        hits, misses = sum(self.hits.values()), sum(self.misses.values())
+        return {
+            "hit_rate": hits / (hits + misses) if hits + misses else None,
+            "functions": functions,
+        }
+
+
+def _patch_streamlit(stats):
+    """Patch Streamlit's internals for the load test, counting cache hits and
+    misses into ``stats``.
+
+    This is the only place the load test changes Streamlit. Raises
+    RuntimeError on a Streamlit release it was not checked against.
+    """
+    version = ".".join(streamlit.__version__.split(".")[:2])
+    missing = [
+        f"{owner.__name__}.{name}"
+        for owner, name in STREAMLIT_INTERNALS
+        if not hasattr(owner, name)
+    ]
+    if version not in STREAMLIT_VERSIONS or missing:
+        raise RuntimeError(
+            f"cloudmart_loadtest relies on Streamlit internals checked against "
+            f"Streamlit {', '.join(STREAMLIT_VERSIONS)}, not "
+            f"{streamlit.__version__}"
+            + (f" (missing: {', '.join(missing)})" if missing else "")
+            + "; check _patch_streamlit and Session.rerun, then add the release "
+            "to STREAMLIT_VERSIONS"
+        )
+
+    handle_hit = CachedFunc._handle_cache_hit
+
+    def counting_hit(func, result):
+        stats.count(stats.hits, func._info.display_name)
+        return handle_hit(func, result)
+
+    CachedFunc._handle_cache_hit = counting_hit
+    for cache_class in (DataCache, ResourceCache):
+        # Only a miss computes and writes a value
+        write_result = cache_class.write_result
+
+        def counting_write(cache, key, value, messages, write=write_result):
+            stats.count(stats.misses, cache.display_name)
+            return write(cache, key, value, messages)
+
+        cache_class.write_result = counting_write
+
+    # AppTest registers a mock Runtime for the length of each run and clears
+    # it afterwards, which breaks the other sessions' concurrent runs. Keep
+    # one registered for the whole test instead
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: cls._instance or runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+    # Each run also compiles the script afresh, unlike a server, which keeps
+    # the bytecode; concurrent compiles even trip CPython 3.11's parser. Keep
+    # one compiled copy
+    shared = ScriptCache()
+    get_bytecode = ScriptCache.get_bytecode
+    ScriptCache.get_bytecode = lambda self, path: get_bytecode(shared, path)
+
+
+class Session:
+    """One simulated analyst: an ``AppTest`` and the times of its reruns."""
+
+    def __init__(self, seed=0, timeout=DEFAULT_TIMEOUT):
+        self.app = AppTest.from_file(DASHBOARD, default_timeout=timeout)
+        self.seed = seed
+        self.random = random.Random(seed)
+        # AppTest does not model st.data_editor, so its state (the edited
+        # cells) is sent along with the other widgets', like the browser does
+        self.editor_states = {}
+        self.latencies = []
+
+    def _editors(self):
+        return [
+            element
+            for element in self.app.get("arrow_data_frame")
+            if "untagged_editor" in element.proto.id
+        ]
+
+    def _editor_states(self):
+        # AppTest's public run sends the modelled widgets only; the editors'
+        # states are added to them through its internals (see
+        # STREAMLIT_INTERNALS)
+        editors = [e for e in self._editors() if e.proto.id in self.editor_states]
+        if not editors:
+            return None
+        states = self.app._tree.get_widget_states()
+        for editor in editors:
+            states.widgets.append(
+                WidgetState(
+                    id=editor.proto.id, string_value=self.editor_states[editor.proto.id]
+                )
+            )
+        return states
+
+    def rerun(self):
+        states = self._editor_states() if self.editor_states else None
+        start = time.perf_counter()
+        if states is None:
+            self.app.run()
+        else:
+            self.app._run(states)
+        self.latencies.append(time.perf_counter() - start)
+        if self.app.exception:
+            raise RuntimeError(self.app.exception[0].value)
+        shown = {editor.proto.id for editor in self._editors()}
+        self.editor_states = {
+            id_: state for id_, state in self.editor_states.items() if id_ in shown
+        }
+
+    def section(self, name):
+        self.app.sidebar.radio(key="section").set_value(name)
+        self.rerun()
+
+    def choose(self, label, values=None):
+        """Pick ``values`` (random options if ``None``) in a multiselect."""
+        widget = next(w for w in self.app.multiselect if w.label == label)
+        if values is None:
+            options = [option for option in widget.options if option != "All"]
+            values = self.random.sample(
+                options, self.random.randint(1, min(3, len(options)))
+            )
+        widget.set_value(values)
+        self.rerun()
+
+    def type(self, key, text):
+        self.app.text_input(key=key).input(text)
+        self.rerun()
+
+    def click(self, key):
+        self.app.button(key=key).click()
+        self.rerun()
+
+    def edit(self, rows, field, value):
+        """Edit ``field`` of the first ``rows`` editor rows, one cell a rerun."""
+        editor = self._editors()[0]
+        edited = {}
+        for row in range(rows):
+            edited[str(row)] = {field: value}
+            self.editor_states[editor.proto.id] = json.dumps(
+                {"edited_rows": edited, "added_rows": [], "deleted_rows": []}
+            )
+            self.rerun()
+
+
+def browse(session):
+    for name in SECTIONS:
+        session.section(name)
+
+
+def filter_costs(session):
+    session.section(VISUALIZATION)
+    for _ in range(FILTER_CHANGES):
+        session.choose(session.random.choice(FILTER_LABELS))
+    for label in FILTER_LABELS:
+        session.choose(label, ["All"])
+
+
+def remediate(session):
+    session.section(REMEDIATION)
+    session.edit(EDITED_ROWS, EDITED_FIELD, f"analyst{session.seed}@cloudmart.com")
+    session.type("editor_search", SEARCH_TERM)
+    session.type("editor_search", "")
+    for key in DOWNLOADS:
+        # Prepares the download, or gets it again when it is unchanged
+        session.click(key)
+
+
+SCRIPTS = [browse, filter_costs, remediate]
+
+
+def _remove_exports(session):
+    for key, prepared in session.app.session_state.filtered_state.items():
+        if isinstance(prepared, PreparedFile):
+            prepared.remove()
+
+
+def _peak_rss_mb():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+def run_sessions(sessions, rounds=DEFAULT_ROUNDS, timeout=DEFAULT_TIMEOUT, seed=0):
+    """Run ``sessions`` concurrent sessions in this process and measure them.
+
+    Every session loads the app, then replays all ``SCRIPTS`` ``rounds``
+    times, each session starting at a different script.
+    """
+    logging.getLogger("streamlit").setLevel(logging.ERROR)
+    stats = CacheStats()
+    _patch_streamlit(stats)
+
+    simulated = [Session(seed + i, timeout) for i in range(sessions)]
+    start_line = threading.Barrier(sessions)
+    errors = []
+
+    def drive(index, session):
+        start_line.wait()
+        try:
+            session.rerun()
+            for step in range(rounds * len(SCRIPTS)):
+                SCRIPTS[(index + step) % len(SCRIPTS)](session)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            _remove_exports(session)
+
+    threads = [
+        threading.Thread(target=drive, args=(index, session))
+        for index, session in enumerate(simulated)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    if errors:
+        raise errors[0]
+
+    latencies = np.concatenate([session.latencies for session in simulated])
+    result = {
+        "sessions": sessions,
+        "reruns": len(latencies),
+        "seconds": elapsed,
+        "reruns_per_second": len(latencies) / elapsed,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+    for percentile in PERCENTILES:
+        result[f"p{percentile}"] = float(np.percentile(latencies, percentile))
+    result["cache"] = stats.summary()
+    return result
+
+
+def _run_level(path, sessions, args, history):
+    # A fresh worker process per level; the export and an empty snapshot
+    # history are passed through the dashboard's settings
+    env = dict(os.environ, CLOUDMART_DATA=path, CLOUDMART_HISTORY=history)
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "result.json")
+        subprocess.run(
+            [
+                sys.executable,
+                os.path.abspath(__file__),
+                "--worker",
+                str(sessions),
+                "--result",
+                output,
+                "--rounds",
+                str(args.rounds),
+                "--timeout",
+                str(args.timeout),
+                "--seed",
+                str(args.seed),
+            ],
+            env=env,
+            check=True,
+        )
+        with open(output) as f:
+            return json.load(f)
+
+
+def run(size, sessions, args):
+    path = synthetic_file(size, args.workdir, seed=args.seed)
+    # Build the Parquet cache and publish the shared dataset up front
+    load_shared(path, aliases=load_aliases())
+    results = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "streamlit": streamlit.__version__,
+        "rows": size,
+        "rounds": args.rounds,
+        "levels": [],
+    }
+    with tempfile.TemporaryDirectory() as history:
+        for count in sessions:
+            results["levels"].append(_run_level(path, count, args, history))
+    return results
+
+
+def format_results(results):
+    rows = []
+    for level in results["levels"]:
+        row = {"sessions": level["sessions"], "reruns": level["reruns"]}
+        for percentile in PERCENTILES:
+            row[f"p{percentile}"] = f"{level[f'p{percentile}'] * 1000:,.0f} ms"
+        row["reruns/s"] = f"{level['reruns_per_second']:,.1f}"
+        rss = level["peak_rss_mb"]
+        row["peak RSS"] = "n/a" if rss is None else f"{rss:,.0f} MB"
+        hit_rate = level["cache"]["hit_rate"]
+        row["cache hits"] = "n/a" if hit_rate is None else f"{hit_rate:.1%}"
+        rows.append(row)
+    return pd.DataFrame(rows).to_string(index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--size",
+        type=parse_size,
+        default=parse_size(DEFAULT_SIZE),
+        help=f"rows in the synthetic export (default: {DEFAULT_SIZE})",
+    )
+    parser.add_argument(
+        "--sessions",
+        nargs="+",
+        type=int,
+        default=DEFAULT_SESSIONS,
+        help=f"concurrent session counts (default: {' '.join(map(str, DEFAULT_SESSIONS))})",
+    )
+    parser.add_argument(
+        "--rounds",
+        type=int,
+        default=DEFAULT_ROUNDS,
+        help="times each session replays every script",
+    )
+    parser.add_argument("--workdir", default=DEFAULT_WORKDIR)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--timeout", type=float, default=DEFAULT_TIMEOUT, help="seconds per rerun"
+    )
+    parser.add_argument("-o", "--output", help="write results to this JSON file")
+    # Internal: run one level in this process (see _run_level)
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        result = run_sessions(args.worker, args.rounds, args.timeout, args.seed)
+        with open(args.result, "w") as f:
+            json.dump(result, f)
+        return 0
+
+    results = run(args.size, args.sessions, args)
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,185 @@
+"""Load-time normalization of tag values.
+
+Exports spell one value several ways: ``prod`` or ``Production`` for
+``Prod``, stray whitespace, ``marketing`` next to ``Marketing``. Grouped as
+they are, one logical bucket is split over several keys in every Task 2 and
+Task 4 rollup. ``normalize_tags`` maps raw values to canonical ones as the
+data is loaded, following a JSON alias file (``CLOUDMART_ALIASES``, by
+default ``cloudmart_aliases.json``)::
+
+    {"version": 1, "columns": {
+        "Environment": {"aliases": {"Prod": ["production", "prd"]}},
+        "Owner": {"case": "lower"},
+        "Department": {}
+    }}
+
+In every listed column:
+
+* surrounding whitespace is removed and inner runs of it become one space;
+  values left empty become missing;
+* a value equal to a canonical value or one of its aliases, ignoring case,
+  becomes that canonical value;
+* ``case`` (``lower``, ``upper`` or ``title``) rewrites the other values;
+  without it, they keep their spelling. Case variants are only merged
+  through an alias or ``case``, never by guessing one, so a stray
+  ``MARKETING`` in an export cannot relabel the ``Marketing`` rows.
+
+Only a column's categories are mapped, each once; rows follow through their
+category codes (one lookup per column), so normalizing costs next to nothing
+whatever the number of rows, and the groupbys downstream need no string
+work. A report lists every value that was changed and on how many rows.
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+ALIASES_FILE = os.environ.get("CLOUDMART_ALIASES", "cloudmart_aliases.json")
+ALIASES_VERSION = 1
+
+CASES = {"lower": str.lower, "upper": str.upper, "title": str.title}
+REPORT_COLUMNS = ["Column", "Value", "Canonical", "Rows", "Reason"]
+
+
+def _clean(value):
+    return " ".join(value.split())
+
+
+def parse_aliases(document):
+    """``{column: settings}`` of a parsed alias document, validated."""
+    if not isinstance(document, dict) or document.get("version") != ALIASES_VERSION:
+        version = document.get("version") if isinstance(document, dict) else None
+        raise ValueError(f"Unsupported alias file version: {version}")
+    columns = document.get("columns")
+    if not isinstance(columns, dict):
+        raise ValueError("An alias file needs a 'columns' mapping")
+    for column, settings in columns.items():
+        if not isinstance(settings, dict) or set(settings) - {"aliases", "case"}:
+            raise ValueError(f"Settings of {column} may only hold 'aliases' and 'case'")
+        aliases = settings.get("aliases", {})
+        if not isinstance(aliases, dict) or not all(
+            isinstance(names, list) and all(isinstance(name, str) for name in names)
+            for names in aliases.values()
+        ):
+            raise ValueError(f"Aliases of {column} must map values to lists of names")
+        seen = {}
+        for canonical, names in aliases.items():
+            for name in [canonical, *names]:
+                key = _clean(name).casefold()
+                if seen.setdefault(key, canonical) != canonical:
+                    raise ValueError(
+                        f"{column} alias {name!r} is given for both "
+                        f"{seen[key]!r} and {canonical!r}"
+                    )
+        if settings.get("case") not in (None, *CASES):
+            raise ValueError(f"Case of {column} must be one of {sorted(CASES)}")
+    return columns
+
+
+def load_aliases(path=ALIASES_FILE):
+    """Alias settings of the file at ``path``, or None when there is none."""
+    try:
+        with open(path) as f:
+            document = json.load(f)
+    except FileNotFoundError:
+        return None
+    return parse_aliases(document)
+
+
+def aliases_stamp(path=ALIASES_FILE):
+    """``(path, size, mtime)`` of the alias file, or None when there is none."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _alias_lookup(settings):
+    # Case-folded alias (or canonical value) -> canonical value
+    return {
+        _clean(name).casefold(): canonical
+        for canonical, names in settings.get("aliases", {}).items()
+        for name in [canonical, *names]
+    }
+
+
+def canonical_values(values, settings):
+    """Canonical value (None for missing) of each distinct value in ``values``."""
+    lookup = _alias_lookup(settings)
+    case = CASES.get(settings.get("case"))
+    cleaned = [_clean(value) for value in values]
+
+    canonical = []
+    for value in cleaned:
+        key = value.casefold()
+        if not value:
+            canonical.append(None)
+        elif key in lookup:
+            canonical.append(lookup[key])
+        elif case is not None:
+            canonical.append(case(value))
+        else:
+            canonical.append(value)
+    return canonical
+
+
+def _row_counts(codes, size):
+    return np.bincount(codes[codes >= 0], minlength=size)
+
+
+def _reason(value, canonical, lookup_hit):
+    if canonical is None:
+        return "empty"
+    if canonical == _clean(value):
+        return "whitespace"
+    return "alias" if lookup_hit else "case"
+
+
+def normalize_tags(df, aliases):
+    """``(df with canonical values, report)`` for ``aliases`` (``load_aliases``).
+
+    The report has a row per changed value (``REPORT_COLUMNS``). Columns
+    that are missing from ``df`` or do not hold text are left alone.
+    """
+    report = []
+    normalized = {}
+    for column, settings in (aliases or {}).items():
+        if column not in df.columns:
+            continue
+        series = df[column]
+        if not isinstance(series.dtype, pd.CategoricalDtype):
+            series = series.astype("category")
+        categories = series.cat.categories
+        if categories.inferred_type not in ("string", "empty"):
+            continue
+        codes = series.cat.codes.to_numpy()
+        values = categories.tolist()
+        canonical = canonical_values(values, settings)
+        if canonical == values:
+            continue
+        # Rows per value are only counted when the column has to change
+        rows = _row_counts(codes, len(values))
+
+        aliased = _alias_lookup(settings)
+        for value, target, count in zip(values, canonical, rows):
+            if target != value:
+                reason = _reason(value, target, _clean(value).casefold() in aliased)
+                report.append((column, value, target, int(count), reason))
+
+        targets = pd.Index(sorted({value for value in canonical if value is not None}))
+        # The extra last slot keeps missing values (code -1) missing
+        lookup = np.append(targets.get_indexer(canonical), -1).astype(codes.dtype)
+        normalized[column] = pd.Categorical.from_codes(
+            lookup[codes],
+            dtype=pd.CategoricalDtype(targets, ordered=series.cat.ordered),
+            validate=False,
+        )
+
+    if normalized:
+        df = df.copy(deep=False)
+        for column, values in normalized.items():
+            df[column] = values
+    return df, pd.DataFrame(report, columns=REPORT_COLUMNS)
@@ -0,0 +1,205 @@
+"""Sparse tag patches for the Task Set 5 remediation workflow.
+
+A remediation is stored as ``TagPatches``: only the tag cells a user
+changed, keyed by ``(AccountID, ResourceID)``. Patches can be saved to and
+loaded from JSON, so edits survive a session and can be audited or
+re-applied to a newer export of the same accounts.
+
+``RemediationOverlay`` applies patches over the loaded dataset lazily: the
+base frame is never copied as a whole, and only the rows a preview or export
+asks for are materialized. Rows keep their source-file order.
+
+Remediated rows follow the dashboard's rule: an untagged resource becomes
+tagged once all ``TAG_FIELDS`` are filled. Rows with no Tagged flag are left
+out of the remediated dataset, as before.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from cloudmart_export import DEFAULT_EXPORT_CHUNK_ROWS
+from cloudmart_schema import TAG_FIELDS, tagged_mask, untagged_mask, with_tag_labels
+
+KEY_COLUMNS = ["AccountID", "ResourceID"]
+PATCH_VERSION = 1
+# From this many patches on, matching_rows joins instead of searching per key
+BULK_MATCH_KEYS = 1000
+
+
+def _key_strings(column):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        # Convert the categories, not every row
+        return column.cat.rename_categories(column.cat.categories.astype(str))
+    return column.astype(str)
+
+
+def resource_keys(df):
+    """``(AccountID, ResourceID)`` of every row of ``df``, as strings."""
+    return pd.MultiIndex.from_arrays(
+        [_key_strings(df[column]) for column in KEY_COLUMNS], names=KEY_COLUMNS
+    )
+
+
+def row_lookup(keys):
+    """Row positions indexed by (sorted) resource key, for ``matching_rows``."""
+    return pd.Series(np.arange(len(keys)), index=keys).sort_index()
+
+
+def matching_rows(lookup, patch_keys):
+    """``(position, key)`` of every row in ``lookup`` whose key is patched.
+
+    Keys need not be unique: a resource listed on several rows gets each of
+    them. A few patches are each a binary search, so their cost follows the
+    number of patches rather than the number of rows; many patches (bulk
+    fills) are matched in one hash join over the rows instead.
+    """
+    patch_keys = list(patch_keys)
+    if len(patch_keys) >= BULK_MATCH_KEYS and len(lookup):
+        patched = pd.MultiIndex.from_tuples(patch_keys, names=lookup.index.names)
+        matches = lookup[lookup.index.isin(patched)]
+    else:
+        present = [key for key in patch_keys if key in lookup.index]
+        if not present:
+            return []
+        matches = lookup.loc[present]
+    return list(zip(matches.to_numpy(), matches.index))
+
+
+def _same_value(a, b):
+    if pd.isna(a) or pd.isna(b):
+        return pd.isna(a) and pd.isna(b)
+    return a == b
+
+
+class TagPatches:
+    """Tag cells changed by a user, keyed by ``(AccountID, ResourceID)``.
+
+    A patch applies to every row of its resource.
+    """
+
+    def __init__(self, cells=None):
+        # {(account, resource): {field: value}}; None clears a tag
+        self.cells = {key: dict(fields) for key, fields in (cells or {}).items()}
+
+    def __len__(self):
+        # Number of patched cells
+        return sum(len(fields) for fields in self.cells.values())
+
+    def keys(self):
+        return list(self.cells)
+
+    def set(self, account, resource, field, value):
+        if field not in TAG_FIELDS:
+            raise KeyError(f"Not a tag field: {field}")
+        value = None if pd.isna(value) else value
+        self.cells.setdefault((str(account), str(resource)), {})[field] = value
+
+    def update(self, other):
+        """New patches with ``other`` applied on top of these."""
+        merged = TagPatches(self.cells)
+        for key, fields in other.cells.items():
+            merged.cells.setdefault(key, {}).update(fields)
+        return merged
+
+    @classmethod
+    def from_edited_rows(cls, frame, edited_rows):
+        """Patches for ``st.data_editor`` edits made to ``frame``.
+
+        ``edited_rows`` is the editor's ``{position: {column: value}}`` state.
+        Edits to non-tag columns and edits that leave a value unchanged are
+        dropped.
+        """
+        patches = cls()
+        for position, edits in edited_rows.items():
+            row = frame.iloc[int(position)]
+            for field, value in edits.items():
+                if field in TAG_FIELDS and not _same_value(row[field], value):
+                    patches.set(row["AccountID"], row["ResourceID"], field, value)
+        return patches
+
+    def apply_to(self, frame):
+        """Copy of ``frame`` with the patched cells of its rows replaced."""
+        matches = matching_rows(row_lookup(resource_keys(frame)), self.keys())
+        if not matches:
+            return frame
+
+        fields = sorted({field for fields in self.cells.values() for field in fields})
+        # Object columns so new values need not be existing categories
+        frame = frame.astype({field: object for field in fields})
+        columns = {field: frame.columns.get_loc(field) for field in fields}
+        for position, key in matches:
+            for field, value in self.cells[key].items():
+                frame.iat[position, columns[field]] = value
+        return frame
+
+    def to_records(self):
+        return [
+            {"AccountID": account, "ResourceID": resource, "field": f, "value": v}
+            for (account, resource), fields in self.cells.items()
+            for f, v in fields.items()
+        ]
+
+    def to_json(self):
+        return json.dumps(
+            {"version": PATCH_VERSION, "patches": self.to_records()}, indent=2
+        )
+
+    @classmethod
+    def from_json(cls, text):
+        document = json.loads(text)
+        if document.get("version") != PATCH_VERSION:
+            raise ValueError(f"Unsupported patch version: {document.get('version')}")
+        patches = cls()
+        for record in document["patches"]:
+            patches.set(
+                record["AccountID"],
+                record["ResourceID"],
+                record["field"],
+                record["value"],
+            )
+        return patches
+
+    def save(self, path):
+        with open(path, "w") as f:
+            f.write(self.to_json())
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as f:
+            return cls.from_json(f.read())
+
+
+class RemediationOverlay:
+    """The remediated dataset as ``TagPatches`` over a read-only base frame."""
+
+    def __init__(self, df):
+        self.df = df
+        untagged = untagged_mask(df).to_numpy()
+        self.rows = np.flatnonzero(tagged_mask(df).to_numpy() | untagged)
+        self.untagged = untagged
+
+    def __len__(self):
+        return len(self.rows)
+
+    def head(self, patches, n=10):
+        """First ``n`` rows of the remediated dataset."""
+        return self._materialize(self.rows[:n], patches)
+
+    def frame(self, patches):
+        """The whole remediated dataset."""
+        return self._materialize(self.rows, patches)
+
+    def iter_frames(self, patches, chunk_rows=DEFAULT_EXPORT_CHUNK_ROWS):
+        """The remediated dataset in chunks of ``chunk_rows``, for exports."""
+        for start in range(0, max(len(self.rows), 1), chunk_rows):
+            yield self._materialize(self.rows[start : start + chunk_rows], patches)
+
+    def _materialize(self, rows, patches):
+        part = with_tag_labels(self.df.iloc[rows]).reset_index(drop=True)
+        part = patches.apply_to(part)
+        untagged = self.untagged[rows]
+        filled = part[TAG_FIELDS].notna().all(axis=1).to_numpy()
+        part.loc[untagged & filled, "Tagged"] = "Yes"
+        return part
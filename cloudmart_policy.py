@@ -0,0 +1,357 @@
+"""Declarative tag policies, evaluated over the whole frame at once.
+
+Task 3 only checks the ``Tagged`` flag and whether the ``TAG_FIELDS`` are
+filled. Policies are conditional rules kept in a JSON file
+(``CLOUDMART_POLICIES``, by default ``cloudmart_policies.json``)::
+
+    {"version": 1, "rules": [
+        {"name": "prod-owner", "when": {"Environment": "Prod"},
+         "require": ["Owner", "CostCenter"]},
+        {"name": "owner-email", "match": {"Owner": "*@cloudmart.com"}},
+        {"name": "cost-center", "allowed_by": {"CostCenter": {
+            "by": "Department", "values": {"Marketing": ["CC101"]}}}}
+    ]}
+
+A rule applies to the rows meeting all of its ``when`` conditions (to every
+row when it has none); a condition is a value, a list of values, or
+``{"match": glob}`` / ``{"regex": pattern}``. A row the rule applies to
+violates it when
+
+* ``require``: any of the listed columns is missing;
+* ``match`` / ``regex``: a column's value does not match the glob (``*``,
+  ``?``) or regular expression as a whole;
+* ``allowed``: a column's value is not one of the listed values;
+* ``allowed_by``: a column's value is not listed for the row's value of the
+  ``by`` column (such as the CostCenters of its Department); rows whose
+  ``by`` value is not listed at all fail too.
+
+Missing values only violate ``require``; the other checks look at the values
+that are there. Values are compared as text.
+
+``evaluate_policies`` never tests a row on its own: every condition and check
+is run once over a column's distinct values (its categories), giving a lookup
+table that rows index with their category codes (``lut[codes]``). A rule then
+costs a few array operations whatever the number of rows, and conditions or
+checks shared by several rules are only computed once. Each rule's violating
+rows are kept as one packed bit row (``np.packbits``), an eighth of a byte
+per row, from which the rules a resource violates are read back.
+"""
+
+import fnmatch
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+
+from cloudmart_patches import KEY_COLUMNS
+from cloudmart_schema import COST_COLUMN
+
+POLICY_FILE = os.environ.get("CLOUDMART_POLICIES", "cloudmart_policies.json")
+POLICY_VERSION = 1
+
+CHECKS = ["require", "match", "regex", "allowed", "allowed_by"]
+RULE_KEYS = {"name", "description", "when"} | set(CHECKS)
+
+RULE_COLUMNS = ["Rule", "Description", "Checked", "Violations", "Violation Cost"]
+RESOURCE_COLUMNS = KEY_COLUMNS + ["Service", COST_COLUMN, "Violations", "Rules"]
+
+
+def _fail(rule, message):
+    raise ValueError(f"Policy rule {rule!r}: {message}")
+
+
+def _is_columns(value):
+    return isinstance(value, list) and all(isinstance(item, str) for item in value)
+
+
+def _is_values(value):
+    return isinstance(value, list) and all(
+        isinstance(item, (str, int, float)) for item in value
+    )
+
+
+def _compile(rule, column, pattern, glob):
+    if not isinstance(pattern, str):
+        _fail(rule, f"the pattern for {column} must be a string")
+    try:
+        return re.compile(fnmatch.translate(pattern) if glob else pattern)
+    except re.error as e:
+        _fail(rule, f"bad pattern for {column}: {e}")
+
+
+def _condition(rule, column, spec):
+    # ("in", values) or ("pattern", compiled regex)
+    if isinstance(spec, dict):
+        if len(spec) != 1 or next(iter(spec)) not in ("match", "regex"):
+            _fail(
+                rule,
+                f"the condition on {column} must be a value, a list, "
+                "{'match': glob} or {'regex': pattern}",
+            )
+        kind, pattern = next(iter(spec.items()))
+        return ("pattern", _compile(rule, column, pattern, kind == "match"))
+    values = spec if isinstance(spec, list) else [spec]
+    if not _is_values(values):
+        _fail(rule, f"the condition on {column} must be a value or a list")
+    return ("in", [str(value) for value in values])
+
+
+def parse_rule(spec):
+    """Validated, compiled form of one rule of a policy file."""
+    if not isinstance(spec, dict) or not isinstance(spec.get("name"), str):
+        raise ValueError(f"Policy rules need a name: {spec!r}")
+    name = spec["name"]
+    unknown = set(spec) - RULE_KEYS
+    if unknown:
+        _fail(name, f"unknown keys {sorted(unknown)}")
+    if not any(check in spec for check in CHECKS):
+        _fail(name, f"needs at least one of {CHECKS}")
+
+    rule = {
+        "name": name,
+        "description": spec.get("description", ""),
+        "when": [],
+        "require": spec.get("require", []),
+        "match": [],
+        "allowed": [],
+        "allowed_by": [],
+    }
+    if not isinstance(spec.get("when", {}), dict):
+        _fail(name, "'when' must map columns to conditions")
+    for column, condition in spec.get("when", {}).items():
+        rule["when"].append((column, _condition(name, column, condition)))
+    if not _is_columns(rule["require"]):
+        _fail(name, "'require' must be a list of columns")
+    for key in ("match", "regex"):
+        if not isinstance(spec.get(key, {}), dict):
+            _fail(name, f"'{key}' must map columns to patterns")
+        for column, pattern in spec.get(key, {}).items():
+            rule["match"].append(
+                (column, _compile(name, column, pattern, key == "match"))
+            )
+    if not isinstance(spec.get("allowed", {}), dict):
+        _fail(name, "'allowed' must map columns to lists of values")
+    for column, values in spec.get("allowed", {}).items():
+        if not _is_values(values):
+            _fail(name, f"the allowed values of {column} must be a list")
+        rule["allowed"].append((column, [str(value) for value in values]))
+    if not isinstance(spec.get("allowed_by", {}), dict):
+        _fail(name, "'allowed_by' must map columns to {'by': ..., 'values': ...}")
+    for column, allowed in spec.get("allowed_by", {}).items():
+        if (
+            not isinstance(allowed, dict)
+            or not isinstance(allowed.get("by"), str)
+            or not isinstance(allowed.get("values"), dict)
+            or not all(_is_values(values) for values in allowed["values"].values())
+        ):
+            _fail(name, f"'allowed_by' of {column} needs 'by' and 'values' lists")
+        listed = {
+            str(key): [str(value) for value in values]
+            for key, values in allowed["values"].items()
+        }
+        rule["allowed_by"].append((column, allowed["by"], listed))
+    return rule
+
+
+def parse_policies(document):
+    """Compiled rules of a parsed policy document."""
+    if not isinstance(document, dict) or document.get("version") != POLICY_VERSION:
+        version = document.get("version") if isinstance(document, dict) else None
+        raise ValueError(f"Unsupported policy version: {version}")
+    if not isinstance(document.get("rules"), list):
+        raise ValueError("A policy document needs a list of rules")
+    rules = [parse_rule(spec) for spec in document["rules"]]
+    names = [rule["name"] for rule in rules]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate policy rule names: {duplicates}")
+    return rules
+
+
+def load_policies(path=POLICY_FILE):
+    """Compiled rules of the policy file at ``path``."""
+    with open(path) as f:
+        return parse_policies(json.load(f))
+
+
+def policy_stamp(path=POLICY_FILE):
+    """``(path, size, mtime)`` of the policy file, or None when there is none."""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+class _Masks:
+    """Row masks of ``df`` computed from its columns' distinct values."""
+
+    def __init__(self, df):
+        self.df = df
+        self._columns = {}
+        self._masks = {}
+
+    def _distinct(self, column):
+        # Category codes (-1 when missing) and the distinct values as text
+        if column not in self._columns:
+            if column not in self.df.columns:
+                raise ValueError(f"Unknown column in policies: {column}")
+            series = self.df[column]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes, values = series.cat.codes.to_numpy(), series.cat.categories
+            else:
+                codes, values = pd.factorize(series)
+            self._columns[column] = (codes, pd.Index(values).astype(str))
+        return self._columns[column]
+
+    def _lookup(self, key, column, test, missing):
+        # ``test`` maps distinct values to flags; the extra last slot is for
+        # missing values, which code -1 indexes
+        if key not in self._masks:
+            codes, values = self._distinct(column)
+            lut = np.append(np.asarray(test(values), dtype=bool), missing)
+            self._masks[key] = lut[codes]
+        return self._masks[key]
+
+    def present(self, column):
+        return self._lookup(
+            ("present", column), column, lambda values: np.ones(len(values)), False
+        )
+
+    def isin(self, column, values, missing):
+        return self._lookup(
+            ("in", column, tuple(values), missing),
+            column,
+            lambda distinct: distinct.isin(values),
+            missing,
+        )
+
+    def matches(self, column, pattern, missing):
+        return self._lookup(
+            ("pattern", column, pattern.pattern, missing),
+            column,
+            lambda distinct: [
+                pattern.fullmatch(value) is not None for value in distinct
+            ],
+            missing,
+        )
+
+    def allowed_by(self, column, by, listed):
+        key = ("allowed_by", column, by, json.dumps(listed, sort_keys=True))
+        if key not in self._masks:
+            codes, values = self._distinct(column)
+            by_codes, by_values = self._distinct(by)
+            # Rows are (by value, value) pairs; the last row and column are for
+            # missing values, which pass
+            table = np.zeros((len(by_values) + 1, len(values) + 1), dtype=bool)
+            for row, by_value in enumerate(by_values):
+                if by_value in listed:
+                    table[row, :-1] = values.isin(listed[by_value])
+            table[-1, :] = True
+            table[:, -1] = True
+            self._masks[key] = table[by_codes, codes]
+        return self._masks[key]
+
+    def condition(self, column, condition):
+        kind, value = condition
+        if kind == "in":
+            return self.isin(column, value, missing=False)
+        return self.matches(column, value, missing=False)
+
+
+def _violations(masks, rule):
+    applies = np.ones(len(masks.df), dtype=bool)
+    for column, condition in rule["when"]:
+        applies &= masks.condition(column, condition)
+    passes = applies.copy()
+    for column in rule["require"]:
+        passes &= masks.present(column)
+    for column, pattern in rule["match"]:
+        passes &= masks.matches(column, pattern, missing=True)
+    for column, values in rule["allowed"]:
+        passes &= masks.isin(column, values, missing=True)
+    for column, by, listed in rule["allowed_by"]:
+        passes &= masks.allowed_by(column, by, listed)
+    return applies, applies & ~passes
+
+
+def evaluate_policies(df, rules):
+    """``PolicyResult`` of ``rules`` (from ``parse_policies``) over ``df``."""
+    masks = _Masks(df)
+    costs = df[COST_COLUMN].fillna(0).to_numpy()
+    bits = np.zeros((len(rules), (len(df) + 7) // 8), dtype=np.uint8)
+    counts = np.zeros(len(df), dtype=np.uint16)
+    summary = []
+    for number, rule in enumerate(rules):
+        applies, violated = _violations(masks, rule)
+        bits[number] = np.packbits(violated)
+        np.add(counts, violated.view(np.uint8), out=counts)
+        rows = np.flatnonzero(violated)
+        summary.append(
+            (
+                rule["name"],
+                rule["description"],
+                int(np.count_nonzero(applies)),
+                len(rows),
+                float(costs[rows].sum()),
+            )
+        )
+    return PolicyResult(df, rules, bits, counts, summary)
+
+
+class PolicyResult:
+    """Per-rule and per-resource violations of a set of tag policies."""
+
+    def __init__(self, df, rules, bits, counts, summary):
+        self.df = df
+        self.rules = rules
+        self.bits = bits
+        self.counts = counts
+        self._summary = summary
+
+    @property
+    def violating_rows(self):
+        """Rows violating at least one rule."""
+        return int(np.count_nonzero(self.counts))
+
+    def rule_violations(self):
+        """Rows checked, violations and their cost per rule (``RULE_COLUMNS``)."""
+        return pd.DataFrame(self._summary, columns=RULE_COLUMNS)
+
+    def rule_names(self, positions):
+        """Comma-separated names of the rules each row at ``positions`` violates."""
+        positions = np.asarray(positions)
+        # packbits puts a row's bit at 7 - (row % 8) of byte row // 8
+        flags = (self.bits[:, positions >> 3] >> (7 - (positions & 7))) & 1
+        names = [[] for _ in positions]
+        for number, row in zip(*np.nonzero(flags)):
+            names[row].append(self.rules[number]["name"])
+        return [", ".join(row) for row in names]
+
+    def resource_violations(self, n=None):
+        """Violating rows, most violations and then highest cost first.
+
+        ``RESOURCE_COLUMNS``; ``n`` keeps only the first rows.
+        """
+        counts = self.counts
+        if n is not None and 0 < n < self.violating_rows:
+            # Only rows with at least the n-th highest count can make the cut
+            least = np.partition(counts, len(counts) - n)[len(counts) - n]
+            positions = np.flatnonzero(counts >= max(least, 1))
+        else:
+            positions = np.flatnonzero(counts)
+        costs = self.df[COST_COLUMN].to_numpy()[positions]
+        order = np.lexsort(
+            (
+                -np.nan_to_num(costs, nan=-np.inf),
+                -counts[positions].astype(np.int64),
+            )
+        )
+        positions = positions[order[:n]]
+        rows = self.df.iloc[positions][KEY_COLUMNS + ["Service", COST_COLUMN]]
+        rows = rows.reset_index(drop=True)
+        rows["Violations"] = self.counts[positions].astype(int)
+        rows["Rules"] = self.rule_names(positions)
+        return rows
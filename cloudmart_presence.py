@@ -0,0 +1,130 @@
+"""Bit-packed tag presence for completeness scoring (Task Set 3).
+
+``TagPresence`` stores, for every row, which tag fields are filled as one
+``uint8`` bitmask (bit ``i`` set when ``tag_fields[i]`` has a value). It is
+computed once from the categorical codes, without copying the frame, and
+every Task 3 question is answered from it:
+
+* completeness scores are the mask's popcount (a 256-entry lookup table);
+* per-field missing counts and "missing exactly these fields" counts come
+  from a single ``bincount`` over the 256 possible masks;
+* the least complete rows are found by partial selection
+  (``np.partition``), not by sorting every row.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cloudmart_schema import TAG_FIELDS
+
+MAX_TAG_FIELDS = 8
+
+_POPCOUNT = np.array([bin(mask).count("1") for mask in range(256)], dtype=np.uint8)
+
+
+def _present(column):
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        return column.cat.codes.to_numpy() >= 0
+    return column.notna().to_numpy()
+
+
+def missing_patterns(fields, masks, counts):
+    """Table of ``counts`` per presence mask, labelled by the missing fields.
+
+    ``masks`` are in ascending order; equal counts keep that order.
+    """
+    labels = [
+        "+".join(f for bit, f in enumerate(fields) if not mask & (1 << bit)) or "None"
+        for mask in masks
+    ]
+    patterns = pd.DataFrame(
+        {"Missing Fields": labels, "Resources": np.asarray(counts, dtype="int64")}
+    )
+    patterns = patterns.sort_values("Resources", ascending=False, kind="stable")
+    return patterns.reset_index(drop=True)
+
+
+class TagPresence:
+    """Per-row bitmask of the filled ``tag_fields`` of ``df``."""
+
+    def __init__(self, df, tag_fields=TAG_FIELDS):
+        if len(tag_fields) > MAX_TAG_FIELDS:
+            raise ValueError(f"At most {MAX_TAG_FIELDS} tag fields fit in a mask")
+        self.fields = list(tag_fields)
+        self.mask = np.zeros(len(df), dtype=np.uint8)
+        for bit, field in enumerate(self.fields):
+            self.mask |= _present(df[field]).astype(np.uint8) << bit
+        self.scores = _POPCOUNT[self.mask]
+        # Rows per mask value; every count below is read from this
+        self.mask_counts = np.bincount(self.mask, minlength=256)
+
+    def extend(self, df):
+        """Presence of these rows followed by the rows of ``df``."""
+        added = TagPresence(df, self.fields)
+        presence = TagPresence.__new__(TagPresence)
+        presence.fields = self.fields
+        presence.mask = np.concatenate([self.mask, added.mask])
+        presence.scores = np.concatenate([self.scores, added.scores])
+        presence.mask_counts = self.mask_counts + added.mask_counts
+        return presence
+
+    def __len__(self):
+        return len(self.mask)
+
+    @property
+    def full(self):
+        return (1 << len(self.fields)) - 1
+
+    def bits(self, fields):
+        """Mask with the bits of ``fields`` set."""
+        bits = 0
+        for field in fields:
+            bits |= 1 << self.fields.index(field)
+        return bits
+
+    def percentages(self, scores):
+        """Completeness percentages of ``scores``, as in Task 3.1."""
+        return np.round(scores / len(self.fields) * 100, 2)
+
+    def average_percentage(self):
+        """Mean completeness percentage over all rows."""
+        if len(self) == 0:
+            return float("nan")
+        masks = np.arange(256)
+        percentages = self.percentages(_POPCOUNT[masks].astype(np.int64))
+        return float((self.mask_counts * percentages).sum() / len(self))
+
+    def missing_counts(self):
+        """Rows missing each field, like ``df[fields].isnull().sum()``."""
+        masks = np.arange(256)
+        counts = [
+            int(self.mask_counts[(masks & (1 << bit)) == 0].sum())
+            for bit in range(len(self.fields))
+        ]
+        return pd.Series(counts, index=self.fields, dtype="int64")
+
+    def missing_exactly(self, fields):
+        """Boolean mask of rows missing ``fields`` and no other tag field."""
+        return self.mask == (self.full & ~self.bits(fields))
+
+    def missing_patterns(self):
+        """Resource count per combination of missing fields, most common first."""
+        masks = np.flatnonzero(self.mask_counts)
+        return missing_patterns(self.fields, masks, self.mask_counts[masks])
+
+    def lowest(self, k):
+        """Positions of the ``k`` least complete rows, ties in row order.
+
+        Same rows as a stable sort by score followed by ``head(k)``.
+        """
+        scores = self.scores
+        if k <= 0:
+            return np.array([], dtype=np.intp)
+        if k >= len(scores):
+            return np.argsort(scores, kind="stable")
+        kth = np.partition(scores, k - 1)[k - 1]
+        below = np.flatnonzero(scores < kth)
+        ties = np.flatnonzero(scores == kth)[: k - len(below)]
+        rows = np.concatenate([below, ties])
+        rows.sort()
+        return rows[np.argsort(scores[rows], kind="stable")]
@@ -0,0 +1,175 @@
+"""Batch compliance reports for CloudMart billing exports.
+
+Runs the Task Set 1-4 analytics from ``cloudmart_analytics`` over one or more
+exports without starting Streamlit::
+
+    python cloudmart_report.py exports/*.csv --output report.json
+    python cloudmart_report.py exports/*.csv --output report/ --format parquet
+    python cloudmart_report.py exports/ --output report.json --backend duckdb
+
+A JSON report is one document keyed by source file. A Parquet report is a
+directory holding ``metrics.parquet`` (one row of scalar metrics per source
+file) and one ``<section>.<table>.parquet`` file per result table, with the
+rows of every source stacked and labelled by a ``Source`` column.
+
+Each source may also be a directory or glob of exports, reported as one
+dataset. With ``--backend duckdb`` the exports are scanned from their Parquet
+caches out of core instead of being loaded into memory.
+
+With the pandas backend, tag values are normalized through the alias file
+(``CLOUDMART_ALIASES``, see ``cloudmart_normalize``) as in the dashboard.
+
+``--policies`` adds a ``tag_policies`` section with the violations of the
+rules in a policy file (see ``cloudmart_policy``), per rule and per
+resource; it needs the pandas backend.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from cloudmart_analytics import build_report
+from cloudmart_backend import BACKENDS, QUERY_BACKEND, open_backend
+from cloudmart_normalize import ALIASES_FILE, load_aliases
+from cloudmart_policy import evaluate_policies, load_policies
+from cloudmart_schema import with_tag_labels
+
+FORMATS = ["json", "parquet"]
+SOURCE_COLUMN = "Source"
+
+
+def _to_json(value):
+    if isinstance(value, pd.DataFrame):
+        return json.loads(with_tag_labels(value).to_json(orient="records"))
+    if isinstance(value, pd.Series):
+        return json.loads(value.to_json())
+    if isinstance(value, dict):
+        return {key: _to_json(item) for key, item in value.items()}
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _as_table(value):
+    if isinstance(value, pd.DataFrame):
+        # Pivot tables keep their key in the index
+        if value.index.name is not None:
+            value = value.reset_index()
+        return with_tag_labels(value)
+    name = value.index.name or "Key"
+    return value.rename_axis(name).rename("Value").reset_index()
+
+
+def report_json(reports):
+    """JSON document for ``{source: build_report(...)}``."""
+    return json.dumps(_to_json(reports), indent=2)
+
+
+def report_tables(reports):
+    """Flatten ``{source: build_report(...)}`` into named Parquet-ready frames."""
+    metrics = []
+    tables = {}
+    for source, report in reports.items():
+        row = {SOURCE_COLUMN: source}
+        for section, results in report.items():
+            for name, value in results.items():
+                if isinstance(value, (pd.DataFrame, pd.Series)):
+                    table = _as_table(value)
+                    table.insert(0, SOURCE_COLUMN, source)
+                    tables.setdefault(f"{section}.{name}", []).append(table)
+                else:
+                    row[f"{section}.{name}"] = _to_json(value)
+        metrics.append(row)
+
+    frames = {"metrics": pd.DataFrame(metrics)}
+    for name, parts in tables.items():
+        frames[name] = pd.concat(parts, ignore_index=True)
+    return frames
+
+
+def policy_section(df, rules):
+    """``tag_policies`` report section for ``rules`` over ``df``."""
+    result = evaluate_policies(df, rules)
+    return {
+        "violating_resources": result.violating_rows,
+        "rule_violations": result.rule_violations(),
+        "resource_violations": result.resource_violations(),
+    }
+
+
+def write_report(reports, output, fmt):
+    if fmt == "json":
+        with open(output, "w") as f:
+            f.write(report_json(reports))
+        return
+    os.makedirs(output, exist_ok=True)
+    for name, frame in report_tables(reports).items():
+        frame.to_parquet(os.path.join(output, f"{name}.parquet"), index=False)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "sources", nargs="+", help="quoted-line CSV exports (files, dirs or globs)"
+    )
+    parser.add_argument(
+        "-o", "--output", required=True, help="report file (json) or directory"
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        choices=FORMATS,
+        help="report format (default: json if --output ends in .json)",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=sorted(BACKENDS),
+        default=QUERY_BACKEND,
+        help=f"query backend (default: {QUERY_BACKEND})",
+    )
+    parser.add_argument("--policies", help="policy file to check (pandas backend only)")
+    args = parser.parse_args(argv)
+    fmt = args.format or ("json" if args.output.endswith(".json") else "parquet")
+
+    try:
+        aliases = load_aliases(ALIASES_FILE)
+    except ValueError as e:
+        print(f"cloudmart_report: {ALIASES_FILE}: {e}", file=sys.stderr)
+        return 1
+
+    rules = None
+    if args.policies:
+        if args.backend != "pandas":
+            parser.error("--policies needs the pandas backend")
+        try:
+            rules = load_policies(args.policies)
+        except (OSError, ValueError) as e:
+            print(f"cloudmart_report: {args.policies}: {e}", file=sys.stderr)
+            return 1
+
+    reports = {}
+    for source in args.sources:
+        try:
+            backend = open_backend(args.backend, source, aliases=aliases)
+            reports[source] = build_report(backend)
+            if rules is not None:
+                reports[source]["tag_policies"] = policy_section(backend.df, rules)
+        except (
+            OSError,
+            ImportError,
+            ValueError,
+            pd.errors.ParserError,
+            pd.errors.EmptyDataError,
+        ) as e:
+            print(f"cloudmart_report: {source}: {e}", file=sys.stderr)
+            return 1
+    write_report(reports, args.output, fmt)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
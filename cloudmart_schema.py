@@ -0,0 +1,101 @@
+"""Typed schema for the CloudMart billing dataset.
+
+The raw export is all strings. ``apply_schema`` turns it into a compact
+frame:
+
+* low-cardinality dimensions (account, service, region and the tag columns)
+  become ``category`` columns, so each row holds a small integer code;
+* ``Tagged`` becomes a nullable ``boolean`` (rows with no flag stay ``<NA>``
+  and count as neither tagged nor untagged, as before);
+* ``MonthlyCostUSD`` is always ``float64``.
+
+Cost is deliberately not downcast to ``float32``: it cannot hold cent values
+exactly, and org-wide sums over tens of millions of rows drift by dollars.
+
+Use ``tagged_mask``/``untagged_mask`` for filtering and ``with_tag_labels`` /
+``label_tagged`` whenever ``Tagged`` is shown to users or written to CSV, so
+the dashboard keeps presenting the familiar Yes/No values.
+"""
+
+import pandas as pd
+
+COLUMNS = [
+    "AccountID",
+    "ResourceID",
+    "Service",
+    "Region",
+    "Department",
+    "Project",
+    "Environment",
+    "Owner",
+    "CostCenter",
+    "CreatedBy",
+    "MonthlyCostUSD",
+    "Tagged",
+]
+
+# Tag fields used for completeness scoring and remediation
+TAG_FIELDS = ["Department", "Project", "Environment", "Owner", "CostCenter"]
+
+CATEGORICAL_COLUMNS = [
+    "AccountID",
+    "Service",
+    "Region",
+    "Department",
+    "Project",
+    "Environment",
+    "Owner",
+    "CostCenter",
+    "CreatedBy",
+]
+
+COST_COLUMN = "MonthlyCostUSD"
+COST_DTYPE = "float64"
+
+TAGGED_LABELS = {True: "Yes", False: "No"}
+TAGGED_VALUES = {"Yes": True, "No": False}
+
+
+def apply_schema(df):
+    """Convert a raw (string/numeric) frame to the compact typed schema."""
+    df = df.copy(deep=False)
+    for column in CATEGORICAL_COLUMNS:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    if COST_COLUMN in df.columns:
+        df[COST_COLUMN] = pd.to_numeric(df[COST_COLUMN], errors="coerce").astype(
+            COST_DTYPE
+        )
+    if "Tagged" in df.columns and df["Tagged"].dtype != "boolean":
+        # Categorical.map maps the (tiny) set of distinct values, not every row
+        tagged = df["Tagged"].astype("category").map(TAGGED_VALUES)
+        df["Tagged"] = tagged.astype("boolean")
+    return df
+
+
+def tagged_mask(df):
+    """Boolean mask of rows flagged as tagged (missing flags are False)."""
+    return df["Tagged"].fillna(False).astype(bool)
+
+
+def untagged_mask(df):
+    """Boolean mask of rows flagged as untagged (missing flags are False)."""
+    return (~df["Tagged"]).fillna(False).astype(bool)
+
+
+def label_tagged(values):
+    """Map Tagged booleans in a small result (Series or Index) to Yes/No."""
+    return values.map(TAGGED_LABELS)
+
+
+def with_tag_labels(df):
+    """Copy of ``df`` with ``Tagged`` shown as Yes/No, for display and export."""
+    if "Tagged" not in df.columns or df["Tagged"].dtype != "boolean":
+        return df
+    # Always both categories, so a row can later be flipped to "Yes"
+    codes = df["Tagged"].astype("Int8").fillna(-1).to_numpy(dtype="int8")
+    df = df.copy(deep=False)
+    df["Tagged"] = pd.Categorical.from_codes(
+        codes, categories=[TAGGED_LABELS[False], TAGGED_LABELS[True]]
+    )
+    return df
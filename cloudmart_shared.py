@@ -0,0 +1,219 @@
+"""Zero-copy shared dataset for concurrent sessions and server processes.
+
+``st.cache_data`` hands every caller its own unpickled copy of the loaded
+frame, and every server process loads its own. Instead, the dashboard
+publishes the loaded dataset once per host, as an uncompressed Arrow IPC
+file in ``CLOUDMART_SHARED_DIR``, already in pandas' memory layout:
+
+* categorical columns as their integer codes (``-1`` when missing), with
+  the categories in the schema metadata;
+* ``Tagged`` as one byte column of values and one of missing flags;
+* numeric columns as they are (missing costs stay NaN);
+* text columns (``ResourceID``) as Arrow strings, which pandas reads through
+  its ``string[pyarrow]`` dtype.
+
+``map_dataset`` memory-maps the file and wraps those buffers in a frame
+without copying them, so all sessions and processes on the host read the
+same pages of the OS page cache. The frame is read-only: writing to it
+raises, and per-session changes (remediation patches, filters) are kept
+beside it, never in it.
+
+With ``aliases`` (see ``cloudmart_normalize``), tag values are normalized
+before the dataset is published, and the normalization report is kept in
+the file's metadata for ``shared_report``.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from cloudmart_data import DATA_SOURCE, load_sources, sources_stamp
+from cloudmart_normalize import REPORT_COLUMNS, normalize_tags
+
+SHARED_DIR = os.environ.get(
+    "CLOUDMART_SHARED_DIR", os.path.join(tempfile.gettempdir(), "cloudmart_shared")
+)
+
+# Schema metadata key describing how to rebuild each column
+LAYOUT_KEY = b"cloudmart_layout"
+# Schema metadata key of the normalization report
+REPORT_KEY = b"cloudmart_normalization"
+# Bump whenever the file layout changes; it is part of the file name
+LAYOUT_VERSION = 1
+
+MASK_SUFFIX = ".mask"
+
+
+def _key(value):
+    return hashlib.sha256(json.dumps(value).encode()).hexdigest()[:16]
+
+
+def shared_path(source=DATA_SOURCE, stamp=None, directory=SHARED_DIR, aliases=None):
+    """Shared file of ``source`` as of ``stamp`` (its ``sources_stamp``),
+    normalized with ``aliases``.
+
+    The name carries the age of the data (the newest source mtime), so
+    versions of the same source can be ordered by name alone.
+    """
+    stamp = sources_stamp(source) if stamp is None else stamp
+    age = max((mtime_ns for _, _, mtime_ns in stamp), default=0)
+    version = _key([LAYOUT_VERSION, stamp, aliases])
+    name = f"{_key(os.path.abspath(source))}-{age:020d}-{version}.arrow"
+    return os.path.join(directory, name)
+
+
+def _age(path):
+    # Data age in a shared file name
+    return int(os.path.basename(path).split("-")[1])
+
+
+def _encode(df, report=None):
+    arrays = {}
+    layout = []
+    for column in df.columns:
+        series = df[column]
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            arrays[column] = pa.array(series.cat.codes.to_numpy())
+            layout.append(
+                {
+                    "name": column,
+                    "kind": "category",
+                    "categories": dtype.categories.tolist(),
+                    "ordered": bool(dtype.ordered),
+                }
+            )
+        elif dtype == "boolean":
+            values = series.fillna(False).to_numpy(dtype=bool)
+            arrays[column] = pa.array(values.view(np.uint8))
+            arrays[column + MASK_SUFFIX] = pa.array(
+                series.isna().to_numpy().view(np.uint8)
+            )
+            layout.append({"name": column, "kind": "boolean"})
+        elif pd.api.types.is_numeric_dtype(dtype) and isinstance(dtype, np.dtype):
+            arrays[column] = pa.array(series.to_numpy())
+            layout.append({"name": column, "kind": "numpy"})
+        else:
+            arrays[column] = pa.array(series, type=pa.large_string(), from_pandas=True)
+            layout.append({"name": column, "kind": "string"})
+    metadata = {LAYOUT_KEY: json.dumps(layout)}
+    if report is not None:
+        metadata[REPORT_KEY] = report.to_json(orient="records")
+    return pa.table(arrays).replace_schema_metadata(metadata)
+
+
+def write_dataset(df, path, report=None):
+    """Write ``df`` (and a normalization ``report``) to ``path`` in the shared
+    layout, atomically."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    table = _encode(df, report)
+    # Dot-prefixed, so a half-written file is never taken for a dataset
+    tmp = os.path.join(directory, f".{os.path.basename(path)}.{os.getpid()}.tmp")
+    try:
+        with pa.OSFile(tmp, "wb") as sink:
+            with pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _view(table, name):
+    column = table.column(name)
+    array = column.chunk(0) if column.num_chunks == 1 else column.combine_chunks()
+    return array.to_numpy(zero_copy_only=True)
+
+
+def map_dataset(path):
+    """Read-only frame over the memory-mapped shared file at ``path``."""
+    with pa.memory_map(path) as source:
+        table = pa.ipc.open_file(source).read_all()
+    layout = json.loads(table.schema.metadata[LAYOUT_KEY])
+    columns = {}
+    for entry in layout:
+        name = entry["name"]
+        if entry["kind"] == "category":
+            dtype = pd.CategoricalDtype(entry["categories"], ordered=entry["ordered"])
+            columns[name] = pd.Categorical.from_codes(
+                _view(table, name), dtype=dtype, validate=False
+            )
+        elif entry["kind"] == "boolean":
+            columns[name] = pd.arrays.BooleanArray(
+                _view(table, name).view(bool),
+                _view(table, name + MASK_SUFFIX).view(bool),
+                copy=False,
+            )
+        elif entry["kind"] == "numpy":
+            columns[name] = _view(table, name)
+        else:
+            columns[name] = pd.arrays.ArrowStringArray(table.column(name))
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_report(path):
+    """Normalization report stored in the shared file at ``path``, if any."""
+    with pa.memory_map(path) as source:
+        metadata = pa.ipc.open_file(source).schema.metadata
+    if REPORT_KEY not in metadata:
+        return None
+    return pd.DataFrame(json.loads(metadata[REPORT_KEY]), columns=REPORT_COLUMNS)
+
+
+def _remove_stale(path):
+    # Versions of the same source with older data; processes still mapping
+    # one keep their pages until they let go of it. Newer versions, and those
+    # of the same data under other aliases, are left to whoever publishes next
+    prefix = os.path.basename(path).split("-")[0]
+    age = _age(path)
+    for stale in glob.glob(os.path.join(os.path.dirname(path), f"{prefix}-*.arrow")):
+        if _age(stale) < age:
+            try:
+                os.remove(stale)
+            except OSError:
+                pass
+
+
+def load_shared(source=DATA_SOURCE, stamp=None, directory=SHARED_DIR, aliases=None):
+    """The dataset of ``source``, mapped from its shared file.
+
+    The first caller on the host loads ``source``, normalizes it with
+    ``aliases`` and publishes it; later callers (in any process) only map
+    the file. Falls back to a private copy when the shared directory is not
+    writable, or when a process publishing newer data removes the file
+    before it is mapped.
+    """
+    path = shared_path(source, stamp, directory, aliases)
+    if os.path.exists(path):
+        try:
+            return map_dataset(path)
+        except FileNotFoundError:
+            pass
+    df = load_sources(source)
+    report = None
+    if aliases is not None:
+        df, report = normalize_tags(df, aliases)
+    try:
+        write_dataset(df, path, report)
+    except OSError:
+        return df
+    _remove_stale(path)
+    try:
+        return map_dataset(path)
+    except FileNotFoundError:
+        return df
+
+
+def shared_report(source=DATA_SOURCE, stamp=None, directory=SHARED_DIR, aliases=None):
+    """Normalization report of the shared file ``load_shared`` maps, if any."""
+    try:
+        return read_report(shared_path(source, stamp, directory, aliases))
+    except OSError:
+        return None
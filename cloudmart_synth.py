@@ -0,0 +1,157 @@
+"""Synthetic CloudMart billing exports at any size.
+
+Rows are drawn from a template export (by default the bundled
+``cloudmart_multi_account.csv``) so the generated data keeps its shape:
+
+* every synthetic account copies the service mix of one template account,
+  because its rows are sampled from that account's rows only;
+* tag values and missing tags come with the sampled row, so missing-tag
+  rates per service and environment match the template;
+* cost is the sampled row's cost times log-normal noise, so it stays
+  correlated with Service and Environment.
+
+ResourceIDs keep the template's prefix (``i-``, ``s3-``, ...) and are unique
+across the file. Output uses the same quoted-line format as the real exports
+and is written in chunks, so 50M-row files never sit in memory::
+
+    python cloudmart_synth.py 1M --output cloudmart_1m.csv
+"""
+
+import argparse
+import sys
+
+import numpy as np
+import pandas as pd
+
+from cloudmart_data import DATA_FILE, read_quoted_csv
+from cloudmart_schema import COLUMNS, COST_COLUMN
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+# Default account count scales with size. Template accounts keep their IDs
+# and further accounts are numbered on from the largest one.
+ROWS_PER_ACCOUNT = 1_000
+COST_NOISE_SIGMA = 0.25
+
+_SIZE_SUFFIXES = {"K": 1_000, "M": 1_000_000}
+
+
+def parse_size(text):
+    """Row count from ``"5000"``, ``"10K"`` or ``"50M"``."""
+    text = text.strip().upper()
+    scale = _SIZE_SUFFIXES.get(text[-1:], 1)
+    digits = text[:-1] if scale != 1 else text
+    try:
+        rows = int(float(digits) * scale)
+    except ValueError:
+        raise ValueError(f"Not a row count: {text!r}") from None
+    if rows <= 0:
+        raise ValueError(f"Row count must be positive: {text!r}")
+    return rows
+
+
+def _resource_prefix(resource_ids):
+    return resource_ids.str.rsplit("-", n=1).str[0]
+
+
+class SyntheticExport:
+    """Samples synthetic rows from a template export."""
+
+    def __init__(self, template=DATA_FILE, seed=0, accounts=None):
+        template_df = read_quoted_csv(template).reindex(columns=COLUMNS)
+        template_df["ResourceID"] = _resource_prefix(
+            template_df["ResourceID"].astype(str)
+        )
+        self.template = template_df
+        self.template_accounts = template_df["AccountID"].drop_duplicates().tolist()
+        self.account_rows = [
+            np.flatnonzero((template_df["AccountID"] == account).to_numpy())
+            for account in self.template_accounts
+        ]
+        self.accounts = accounts
+        self.rng = np.random.default_rng(seed)
+
+    def _account_count(self, rows):
+        if self.accounts is not None:
+            return self.accounts
+        return max(len(self.template_accounts), rows // ROWS_PER_ACCOUNT)
+
+    def _account_ids(self, n_accounts):
+        first = int(max(self.template_accounts)) + 1
+        extra = np.arange(first, first + n_accounts - len(self.template_accounts))
+        ids = np.concatenate(
+            [np.asarray(self.template_accounts, dtype=np.int64), extra]
+        )
+        return ids[:n_accounts]
+
+    def chunks(self, rows, chunk_rows=DEFAULT_CHUNK_ROWS):
+        """Yield ``rows`` synthetic rows as string frames of ``chunk_rows``."""
+        n_accounts = self._account_count(rows)
+        account_ids = self._account_ids(n_accounts)
+        template_of = np.arange(n_accounts) % len(self.template_accounts)
+
+        start = 0
+        while start < rows:
+            size = min(chunk_rows, rows - start)
+            yield self._chunk(start, size, account_ids, template_of)
+            start += size
+
+    def _chunk(self, start, size, account_ids, template_of):
+        account = self.rng.integers(len(account_ids), size=size)
+        source = np.empty(size, dtype=np.int64)
+        # Sample each account's rows from its template account only
+        for t, rows in enumerate(self.account_rows):
+            picked = template_of[account] == t
+            source[picked] = rows[self.rng.integers(len(rows), size=picked.sum())]
+
+        chunk = self.template.iloc[source].reset_index(drop=True)
+        chunk["AccountID"] = account_ids[account]
+        serial = pd.Series(np.arange(start + 1, start + size + 1)).map("{:09d}".format)
+        chunk["ResourceID"] = chunk["ResourceID"] + "-" + serial
+
+        noise = self.rng.lognormal(0.0, COST_NOISE_SIGMA, size=size)
+        chunk[COST_COLUMN] = (chunk[COST_COLUMN].to_numpy() * noise).round(2)
+        return chunk
+
+
+def to_quoted_lines(df):
+    """Render ``df`` as the quoted-line export format, one string per row."""
+    fields = [
+        df[column].astype(object).where(df[column].notna(), "").astype(str)
+        for column in df.columns
+    ]
+    line = fields[0].str.cat(fields[1:], sep=",")
+    return '"' + line + '"'
+
+
+def write_synthetic(
+    path, rows, template=DATA_FILE, seed=0, accounts=None, chunk_rows=DEFAULT_CHUNK_ROWS
+):
+    """Write ``rows`` synthetic rows to ``path`` in the quoted-line format."""
+    generator = SyntheticExport(template, seed=seed, accounts=accounts)
+    with open(path, "w") as f:
+        f.write('"' + ",".join(COLUMNS) + '"\n')
+        for chunk in generator.chunks(rows, chunk_rows=chunk_rows):
+            f.write("\n".join(to_quoted_lines(chunk)))
+            f.write("\n")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("rows", type=parse_size, help="row count, e.g. 1000, 10K, 50M")
+    parser.add_argument("-o", "--output", required=True, help="CSV file to write")
+    parser.add_argument("--template", default=DATA_FILE, help="export to sample from")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--accounts",
+        type=int,
+        help=f"number of accounts (default: one per {ROWS_PER_ACCOUNT} rows)",
+    )
+    args = parser.parse_args(argv)
+    write_synthetic(
+        args.output, args.rows, args.template, seed=args.seed, accounts=args.accounts
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
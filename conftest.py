@@ -0,0 +1,29 @@
+"""Shared fixtures: exports copied into a temporary directory, so caches and
+shared files are written there rather than next to the bundled data."""
+
+import os
+import shutil
+
+import pytest
+
+from cloudmart_data import DATA_FILE
+from cloudmart_synth import write_synthetic
+
+BUNDLED = os.path.join(os.path.dirname(os.path.abspath(__file__)), DATA_FILE)
+SYNTHETIC_ROWS = 3000
+
+
+@pytest.fixture
+def export(tmp_path):
+    """Copy of the bundled export."""
+    path = tmp_path / "cloudmart_multi_account.csv"
+    shutil.copy(BUNDLED, path)
+    return str(path)
+
+
+@pytest.fixture
+def synthetic(tmp_path):
+    """Synthetic export of SYNTHETIC_ROWS rows sampled from the bundled one."""
+    path = tmp_path / "synthetic.csv"
+    write_synthetic(str(path), SYNTHETIC_ROWS, template=BUNDLED, seed=1)
+    return str(path)
@@ -0,0 +1,69 @@
+import pandas as pd
+import pytest
+
+from cloudmart_aggregates import (
+    COST,
+    FILTER_DIMENSIONS,
+    ROLLUP_DIMENSIONS,
+    CostRollups,
+)
+from cloudmart_data import load_sources
+from cloudmart_schema import tagged_mask, untagged_mask
+
+
+@pytest.fixture
+def df(synthetic):
+    return load_sources(synthetic)
+
+
+@pytest.mark.parametrize(
+    "by",
+    [
+        ["Tagged"],
+        ["Department"],
+        ["Service", "Environment"],
+        ["Department", "Project", "Tagged"],
+    ],
+)
+def test_cost_by_matches_groupby(df, by):
+    expected = df.groupby(by, observed=True)[COST].sum().reset_index()
+    actual = CostRollups(df).cost_by(by)
+    pd.testing.assert_frame_equal(actual, expected, check_exact=False)
+
+
+@pytest.mark.parametrize("column", ["Department", "Environment", "Service"])
+def test_value_counts_match_pandas(df, column):
+    expected = df[column].value_counts()
+    actual = CostRollups(df).value_counts(column)
+    pd.testing.assert_series_equal(
+        actual.sort_index(), expected.sort_index(), check_names=False
+    )
+
+
+def test_totals(df):
+    rollups = CostRollups(df)
+    assert rollups.total_resources == len(df)
+    assert rollups.total_cost == pytest.approx(df[COST].sum())
+    count, cost = rollups.tagged_totals(False)
+    untagged = untagged_mask(df)
+    assert count == int(untagged.sum())
+    assert cost == pytest.approx(df.loc[untagged, COST].sum())
+
+
+def test_extend_matches_rebuild(df):
+    extended = CostRollups(df.iloc[:1000]).extend(df.iloc[1000:])
+    rebuilt = CostRollups(df)
+    for by in (["Department"], ROLLUP_DIMENSIONS[:3], ["Tagged"]):
+        pd.testing.assert_frame_equal(
+            extended.cost_by(by), rebuilt.cost_by(by), check_exact=False
+        )
+
+
+def test_where_matches_filtered_groupby(df):
+    selections = {"Service": ["EC2", "S3"], "Region": None, "Tagged": [True]}
+    cube = CostRollups(df, FILTER_DIMENSIONS).where(selections)
+    rows = df[df["Service"].isin(["EC2", "S3"]) & tagged_mask(df)]
+    expected = rows.groupby("Department", observed=True)[COST].sum().reset_index()
+    pd.testing.assert_frame_equal(
+        cube.cost_by("Department"), expected, check_exact=False
+    )
@@ -0,0 +1,62 @@
+import pandas as pd
+import pytest
+
+from cloudmart_analytics import RemediationMetrics, task_set_5
+from cloudmart_data import load_sources
+from cloudmart_patches import RemediationOverlay, TagPatches
+from cloudmart_schema import TAG_FIELDS, tagged_mask, untagged_mask
+
+
+@pytest.fixture
+def df(synthetic):
+    return load_sources(synthetic)
+
+
+def _patches(rows, values):
+    patches = TagPatches()
+    for _, row in rows.iterrows():
+        for field, value in values.items():
+            patches.set(row["AccountID"], row["ResourceID"], field, value)
+    return patches
+
+
+def _fill_all(rows):
+    return _patches(rows, {field: "x" for field in TAG_FIELDS})
+
+
+def _check(df, patches):
+    expected = task_set_5(df, RemediationOverlay(df).frame(patches))
+    actual = RemediationMetrics(df).compare(patches)
+    assert actual.keys() == expected.keys()
+    for key, value in expected.items():
+        assert actual[key] == pytest.approx(value), key
+
+
+def test_no_patches(df):
+    _check(df, TagPatches())
+
+
+def test_filling_untagged_rows(df):
+    _check(df, _fill_all(df[untagged_mask(df)].head(40)))
+
+
+def test_partial_fills_and_clears(df):
+    untagged = df[untagged_mask(df)]
+    patches = _fill_all(untagged.head(30))
+    # Clearing a tag undoes the fill; a single field rarely completes a row
+    patches = patches.update(_patches(untagged.head(10), {"Owner": None}))
+    patches = patches.update(_patches(untagged.iloc[30:60], {"Owner": "x"}))
+    _check(df, patches)
+
+
+def test_patches_to_tagged_rows_change_nothing(df):
+    patches = _patches(df[tagged_mask(df)].head(20), {"Owner": None})
+    _check(df, patches)
+    metrics = RemediationMetrics(df)
+    assert metrics.compare(patches) == metrics.compare(TagPatches())
+
+
+def test_overlay_leaves_the_base_frame_alone(df):
+    before = df.copy()
+    RemediationOverlay(df).frame(_fill_all(df[untagged_mask(df)].head(5)))
+    pd.testing.assert_frame_equal(df, before)
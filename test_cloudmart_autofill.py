@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from cloudmart_autofill import PROPOSAL_COLUMNS, TagInference, summarize, to_patches
+from cloudmart_data import load_sources
+from cloudmart_schema import untagged_mask
+
+
+@pytest.fixture
+def proposals(synthetic):
+    df = load_sources(synthetic)
+    return df, TagInference(df).proposals()
+
+
+def test_proposals_only_fill_missing_cells_of_untagged_rows(proposals):
+    df, proposals = proposals
+    assert list(proposals.columns) == PROPOSAL_COLUMNS
+    assert len(proposals)
+    assert untagged_mask(df)[proposals.index].all()
+    for field, rows in proposals.groupby("Field"):
+        assert df.loc[rows.index, field].isna().all()
+    assert not proposals.duplicated(["AccountID", "ResourceID", "Field"]).any()
+    assert proposals["Confidence"].between(0, 1).all()
+
+
+def test_summarize_counts_every_fill(proposals):
+    _, proposals = proposals
+    assert summarize(proposals)["Fills"].sum() == len(proposals)
+
+
+def test_to_patches_sets_every_proposed_value(proposals):
+    _, proposals = proposals
+    patches = to_patches(proposals)
+    assert len(patches) == len(proposals)
+    for row in proposals.itertuples():
+        key = (str(row.AccountID), str(row.ResourceID))
+        assert patches.cells[key][row.Field] == row.Value
+
+
+def test_to_patches_groups_fields_per_resource():
+    proposals = pd.DataFrame(
+        {
+            # As taken from the categorical column: a missing account is NaN
+            "AccountID": np.array([1001, 1001, 1002, np.nan], dtype=object),
+            "ResourceID": ["i-1", "i-1", "i-1", "i-2"],
+            "Field": ["Owner", "Project", "Owner", "Owner"],
+            "Value": ["a", "P", "b", "c"],
+            "Confidence": [0.9] * 4,
+            "Rule": ["r"] * 4,
+        }
+    )
+    assert to_patches(proposals).cells == {
+        ("1001", "i-1"): {"Owner": "a", "Project": "P"},
+        ("1002", "i-1"): {"Owner": "b"},
+        ("nan", "i-2"): {"Owner": "c"},
+    }
+
+
+def test_to_patches_of_no_proposals():
+    assert len(to_patches(pd.DataFrame(columns=PROPOSAL_COLUMNS))) == 0
@@ -0,0 +1,89 @@
+import io
+import os
+import shutil
+
+import pandas as pd
+import pytest
+
+from cloudmart_data import (
+    appended_positions,
+    build_cache,
+    cache_is_fresh,
+    cache_path,
+    dataset_version,
+    load_sources,
+    read_quoted_csv,
+    refresh_cache,
+)
+from cloudmart_schema import apply_schema
+
+
+def baseline_read(path):
+    # The dashboard's original whole-file loader
+    with open(path) as f:
+        lines = f.read().strip().split("\n")
+    cleaned = "\n".join(line.strip('"') for line in lines)
+    return pd.read_csv(io.StringIO(cleaned)).replace("", pd.NA)
+
+
+@pytest.mark.parametrize("chunk_bytes", [64, 1024, 64 * 1024 * 1024])
+def test_chunked_loader_matches_baseline(synthetic, chunk_bytes):
+    df = read_quoted_csv(synthetic, chunk_bytes=chunk_bytes)
+    pd.testing.assert_frame_equal(df, baseline_read(synthetic))
+
+
+def test_bundled_export_matches_baseline(export):
+    pd.testing.assert_frame_equal(read_quoted_csv(export), baseline_read(export))
+
+
+def test_typed_load_matches_baseline(synthetic):
+    expected = apply_schema(baseline_read(synthetic))
+    pd.testing.assert_frame_equal(load_sources(synthetic), expected)
+
+
+def test_append_refresh_matches_full_rebuild(synthetic, tmp_path):
+    with open(synthetic) as f:
+        lines = f.readlines()
+    # Header and 2000 rows first, the other 1000 appended later
+    with open(synthetic, "w") as f:
+        f.writelines(lines[:2001])
+    build_cache(synthetic)
+    before = dataset_version(synthetic)
+
+    with open(synthetic, "a") as f:
+        f.writelines(lines[2001:])
+    appended = refresh_cache(synthetic)
+
+    copy = str(tmp_path / "copy.csv")
+    shutil.copy(synthetic, copy)
+    rebuilt = build_cache(copy)
+    pd.testing.assert_frame_equal(appended, rebuilt)
+    pd.testing.assert_frame_equal(load_sources(synthetic), apply_schema(rebuilt))
+
+    positions = appended_positions(before, dataset_version(synthetic))
+    assert positions.tolist() == list(range(2000, 3000))
+
+
+def test_rewritten_file_is_rebuilt(export):
+    build_cache(export)
+    before = dataset_version(export)
+    with open(export) as f:
+        lines = f.readlines()
+    lines[1] = lines[1].replace("120", "121", 1)
+    with open(export, "w") as f:
+        f.writelines(lines)
+
+    assert not cache_is_fresh(export)
+    df = refresh_cache(export)
+    pd.testing.assert_frame_equal(df, build_cache(export))
+    assert appended_positions(before, dataset_version(export)) is None
+
+
+def test_touch_keeps_the_cache(export):
+    build_cache(export)
+    cache = cache_path(export)
+    written = os.stat(cache).st_mtime_ns
+    os.utime(export)
+
+    assert cache_is_fresh(export)
+    assert os.stat(cache).st_mtime_ns == written
@@ -0,0 +1,93 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+import pytest
+
+from cloudmart_data import load_sources
+from cloudmart_history import METRICS, SnapshotStore, data_date
+from cloudmart_patches import KEY_COLUMNS
+
+TAKEN_AT = datetime(2026, 4, 2, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def months(synthetic):
+    df = load_sources(synthetic)
+    january = df.iloc[:2000]
+    february = df.iloc[500:2500].copy()
+    february.loc[february.index[:100], "MonthlyCostUSD"] *= 2
+    february.loc[february.index[100:200], "Owner"] = "a.lee@cloudmart.com"
+    march = df.iloc[1000:3000].copy()
+    march.loc[march.index[:300], "Tagged"] = True
+    return {"2026-01": january, "2026-02": february, "2026-03": march}
+
+
+def _record(store, months, labels):
+    for label in labels:
+        store.record(months[label], "export.csv", label=label, taken_at=TAKEN_AT)
+
+
+def _deltas_by_label(store):
+    snapshots = store.snapshots()
+    return {
+        row.Label: store.deltas(row.Snapshot)
+        .drop(columns="Snapshot")
+        .sort_values(KEY_COLUMNS, ignore_index=True)
+        for row in snapshots.itertuples()
+    }
+
+
+def test_snapshots_are_ordered_by_their_data(tmp_path, months):
+    store = SnapshotStore(str(tmp_path / "history"))
+    _record(store, months, ["2026-03", "2026-01", "2026-02"])
+    snapshots = store.snapshots()
+    assert snapshots["Label"].tolist() == ["2026-01", "2026-02", "2026-03"]
+    assert snapshots["Snapshot"].tolist() == [2, 3, 1]
+    assert store.changes()["previous"] == "2026-02"
+    assert store.rollups()["Label"].drop_duplicates().tolist() == [
+        "2026-01",
+        "2026-02",
+        "2026-03",
+    ]
+
+
+def test_backfill_matches_recording_in_order(tmp_path, months):
+    in_order = SnapshotStore(str(tmp_path / "in-order"))
+    _record(in_order, months, ["2026-01", "2026-02", "2026-03"])
+    backfilled = SnapshotStore(str(tmp_path / "backfilled"))
+    _record(backfilled, months, ["2026-03", "2026-01", "2026-02"])
+
+    expected = _deltas_by_label(in_order)
+    actual = _deltas_by_label(backfilled)
+    assert actual.keys() == expected.keys()
+    assert len(expected["2026-01"]) == 0
+    assert set(expected["2026-02"]["Change"]) >= {"Added", "Removed", "Cost changed"}
+    for label, deltas in expected.items():
+        pd.testing.assert_frame_equal(actual[label], deltas)
+
+    pd.testing.assert_frame_equal(
+        backfilled.snapshots()[METRICS], in_order.snapshots()[METRICS]
+    )
+    states = tmp_path / "backfilled" / "states"
+    assert [path.name for path in states.iterdir()] == ["000001.parquet"]
+
+
+def test_a_recorded_fingerprint_is_not_recorded_again(tmp_path, months):
+    store = SnapshotStore(str(tmp_path / "history"))
+    first = store.record(months["2026-01"], "export.csv", fingerprint="abc")
+    assert store.record(months["2026-02"], "export.csv", fingerprint="abc") == first
+    assert len(store.snapshots()) == 1
+
+
+@pytest.mark.parametrize(
+    "label, expected",
+    [
+        ("2026-01", "2026-01-01"),
+        ("2026-01-31", "2026-01-31"),
+        ("2026-02-30", "2026-04-02"),
+        ("january", "2026-04-02"),
+        (None, "2026-04-02"),
+    ],
+)
+def test_data_date(label, expected):
+    assert data_date(label, TAKEN_AT) == expected
@@ -0,0 +1,125 @@
+import pandas as pd
+import pytest
+
+from cloudmart_backend import open_backend
+from cloudmart_data import load_sources
+from cloudmart_normalize import (
+    REPORT_COLUMNS,
+    canonical_values,
+    normalize_tags,
+    parse_aliases,
+)
+
+ALIASES = parse_aliases(
+    {
+        "version": 1,
+        "columns": {
+            "Environment": {"aliases": {"Prod": ["production", "prd"]}},
+            "Department": {},
+            "Owner": {"case": "lower"},
+            "CostCenter": {"case": "upper"},
+        },
+    }
+)
+
+# Spellings worked into the messy export, every third line of each
+MESSY = [
+    (",Prod,", ",production,"),
+    (",Prod,", ",PRD,"),
+    (",Marketing,", ",  Marketing ,"),
+    (",Marketing,", ",MARKETING,"),
+    (",CC101,", ",cc101,"),
+    ("@cloudmart.com", "@CloudMart.com"),
+]
+
+
+@pytest.fixture
+def messy(synthetic):
+    with open(synthetic) as f:
+        lines = f.readlines()
+    for number, (old, new) in enumerate(MESSY):
+        for index in range(1 + number, len(lines), 3 * len(MESSY)):
+            lines[index] = lines[index].replace(old, new, 1)
+    with open(synthetic, "w") as f:
+        f.writelines(lines)
+    return synthetic
+
+
+def test_case_variants_keep_their_spelling():
+    values = ["Marketing", "MARKETING", "marketing"]
+    assert canonical_values(values, {}) == values
+
+
+def test_aliases_case_and_whitespace():
+    settings = {"aliases": {"Prod": ["production", "prd"]}, "case": "title"}
+    values = ["PRODUCTION", " prd ", "Prod", "dev  box", "  ", "qa"]
+    assert canonical_values(values, settings) == [
+        "Prod",
+        "Prod",
+        "Prod",
+        "Dev Box",
+        None,
+        "Qa",
+    ]
+
+
+def test_normalize_tags_report(messy):
+    df = load_sources(messy)
+    normalized, report = normalize_tags(df, ALIASES)
+    assert list(report.columns) == REPORT_COLUMNS
+
+    changed = {
+        (row.Column, row.Value): (row.Canonical, row.Reason)
+        for row in report.itertuples()
+    }
+    assert changed[("Environment", "production")] == ("Prod", "alias")
+    assert changed[("Environment", "PRD")] == ("Prod", "alias")
+    assert changed[("CostCenter", "cc101")] == ("CC101", "case")
+    assert ("Department", "MARKETING") not in changed
+    for row in report.itertuples():
+        before = df[row.Column].astype(object) == row.Value
+        assert row.Rows == int(before.sum())
+        assert (normalized.loc[before, row.Column] == row.Canonical).all()
+
+    assert set(normalized["Environment"].dropna()) <= {"Prod", "Dev", "Test"}
+    assert {"Marketing", "MARKETING"} <= set(normalized["Department"].dropna())
+    owners = normalized["Owner"].dropna().astype(str)
+    assert (owners == owners.str.lower()).all()
+    pd.testing.assert_frame_equal(
+        normalized.drop(columns=list(ALIASES)), df.drop(columns=list(ALIASES))
+    )
+
+
+def test_duckdb_reads_values_as_normalize_tags(messy):
+    pytest.importorskip("duckdb")
+    pandas = open_backend("pandas", messy, aliases=ALIASES)
+    duckdb = open_backend("duckdb", messy, aliases=ALIASES)
+
+    dimensions = ["Environment", "Department", "CostCenter", "Owner"]
+    for by in (["Environment"], ["Department", "Environment"], ["CostCenter"]):
+        expected = pandas.rollups(dimensions).cost_by(by)
+        actual = duckdb.rollups(dimensions).cost_by(by)
+        pd.testing.assert_frame_equal(
+            actual, expected, check_exact=False, check_categorical=False
+        )
+    pd.testing.assert_series_equal(duckdb.missing_counts(), pandas.missing_counts())
+    pd.testing.assert_frame_equal(
+        duckdb.untagged(), pandas.untagged(), check_categorical=False
+    )
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        {"version": 2, "columns": {}},
+        {"version": 1, "columns": {"Owner": {"case": "snake"}}},
+        {"version": 1, "columns": {"Owner": {"typo": {}}}},
+        {
+            "version": 1,
+            "columns": {"Environment": {"aliases": {"Prod": ["x"], "Dev": ["X"]}}},
+        },
+    ],
+)
+def test_bad_alias_files_are_rejected(document):
+    with pytest.raises(ValueError):
+        parse_aliases(document)
@@ -0,0 +1,179 @@
+import fnmatch
+import json
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from cloudmart_data import load_sources
+from cloudmart_policy import (
+    POLICY_FILE,
+    RESOURCE_COLUMNS,
+    RULE_COLUMNS,
+    evaluate_policies,
+    load_policies,
+    parse_policies,
+)
+from cloudmart_schema import COST_COLUMN
+
+BUNDLED_POLICIES = os.path.join(os.path.dirname(os.path.abspath(__file__)), POLICY_FILE)
+
+EXTRA_RULES = {
+    "version": 1,
+    "rules": [
+        {
+            "name": "ec2-or-s3-env",
+            "when": {"Service": ["EC2", "S3"]},
+            "allowed": {"Environment": ["Prod", "Dev"]},
+        },
+        {
+            "name": "project-code",
+            "when": {"Region": {"match": "us-*"}},
+            "regex": {"Project": "[A-Z][a-z]+"},
+        },
+        {
+            "name": "owner-outside-prod",
+            "when": {"Environment": ["Dev", "Test"]},
+            "require": ["Owner"],
+        },
+        {
+            "name": "shared-cost-centers",
+            "allowed_by": {
+                "CostCenter": {
+                    "by": "Department",
+                    "values": {"Marketing": ["CC101", "CC102"], "Sales": ["CC101"]},
+                }
+            },
+        },
+    ],
+}
+
+
+def _text(value):
+    return None if pd.isna(value) else str(value)
+
+
+def _reference(df, spec):
+    # One rule's violations tested row by row, straight from the policy spec
+    violated = []
+    for _, row in df.iterrows():
+        value = {column: _text(row[column]) for column in df.columns}
+        applies = True
+        for column, condition in spec.get("when", {}).items():
+            if isinstance(condition, dict):
+                kind, pattern = next(iter(condition.items()))
+                if kind == "match":
+                    pattern = fnmatch.translate(pattern)
+                applies &= value[column] is not None and bool(
+                    re.fullmatch(pattern, value[column])
+                )
+            else:
+                values = condition if isinstance(condition, list) else [condition]
+                applies &= value[column] in [str(item) for item in values]
+        passes = all(value[column] is not None for column in spec.get("require", []))
+        for key in ("match", "regex"):
+            for column, pattern in spec.get(key, {}).items():
+                if key == "match":
+                    pattern = fnmatch.translate(pattern)
+                passes &= value[column] is None or bool(
+                    re.fullmatch(pattern, value[column])
+                )
+        for column, values in spec.get("allowed", {}).items():
+            passes &= value[column] is None or value[column] in values
+        for column, allowed in spec.get("allowed_by", {}).items():
+            by = value[allowed["by"]]
+            passes &= (
+                value[column] is None
+                or by is None
+                or value[column] in allowed["values"].get(by, [])
+            )
+        violated.append(applies and not passes)
+    return np.array(violated)
+
+
+@pytest.fixture
+def df(synthetic):
+    return load_sources(synthetic)
+
+
+@pytest.fixture
+def specs():
+    with open(BUNDLED_POLICIES) as f:
+        return json.load(f)["rules"] + EXTRA_RULES["rules"]
+
+
+def test_rules_match_a_row_by_row_check(df, specs):
+    result = evaluate_policies(df, parse_policies({"version": 1, "rules": specs}))
+    expected = np.array([_reference(df, spec) for spec in specs])
+    assert expected.any(axis=1).sum() >= 4
+    summary = result.rule_violations()
+    assert list(summary.columns) == RULE_COLUMNS
+    assert summary["Violations"].tolist() == expected.sum(axis=1).tolist()
+    costs = df[COST_COLUMN].fillna(0).to_numpy()
+    assert summary["Violation Cost"].tolist() == pytest.approx(
+        [costs[rows].sum() for rows in expected]
+    )
+    assert result.violating_rows == int(expected.any(axis=0).sum())
+    assert result.counts.tolist() == expected.sum(axis=0).tolist()
+
+    positions = np.arange(len(df))
+    names = [spec["name"] for spec in specs]
+    assert result.rule_names(positions) == [
+        ", ".join(name for name, flag in zip(names, flags) if flag)
+        for flags in expected.T
+    ]
+
+
+def test_resource_violations_order(df):
+    result = evaluate_policies(df, load_policies(BUNDLED_POLICIES))
+    rows = result.resource_violations()
+    assert list(rows.columns) == RESOURCE_COLUMNS
+    assert len(rows) == result.violating_rows
+    keys = list(zip(-rows["Violations"], -rows[COST_COLUMN].fillna(-np.inf)))
+    assert keys == sorted(keys)
+    top = result.resource_violations(25)
+    pd.testing.assert_frame_equal(top, rows.head(25))
+
+
+def test_missing_values_only_violate_require():
+    df = pd.DataFrame(
+        {
+            "AccountID": ["1", "1"],
+            "ResourceID": ["a", "b"],
+            "Service": ["EC2", "EC2"],
+            COST_COLUMN: [1.0, 2.0],
+            "Owner": [None, "bob"],
+        }
+    )
+    rules = parse_policies(
+        {
+            "version": 1,
+            "rules": [
+                {"name": "email", "match": {"Owner": "*@cloudmart.com"}},
+                {"name": "owner", "require": ["Owner"]},
+            ],
+        }
+    )
+    result = evaluate_policies(df, rules)
+    assert result.rule_names([0, 1]) == ["owner", "email"]
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        {"version": 2, "rules": []},
+        {"version": 1, "rules": [{"name": "empty"}]},
+        {"version": 1, "rules": [{"name": "x", "require": "Owner"}]},
+        {"version": 1, "rules": [{"name": "x", "regex": {"Owner": "("}}]},
+        {"version": 1, "rules": [{"name": "x", "require": [], "bogus": 1}]},
+        {
+            "version": 1,
+            "rules": [{"name": "x", "require": []}, {"name": "x", "require": []}],
+        },
+    ],
+)
+def test_bad_documents_are_rejected(document):
+    with pytest.raises(ValueError):
+        parse_policies(document)
@@ -0,0 +1,86 @@
+import os
+
+import pandas as pd
+import pytest
+
+from cloudmart_data import load_sources, sources_stamp
+from cloudmart_normalize import normalize_tags, parse_aliases
+from cloudmart_shared import load_shared, shared_path, shared_report
+
+ALIASES = parse_aliases(
+    {
+        "version": 1,
+        "columns": {
+            "Environment": {"aliases": {"Prod": ["prod"]}},
+            "CostCenter": {"case": "lower"},
+        },
+    }
+)
+
+
+def _as_loaded(shared):
+    # Text columns are mapped as Arrow strings rather than copied to objects
+    return shared.astype({"ResourceID": object})
+
+
+def _published(directory):
+    return sorted(os.listdir(directory))
+
+
+def _names(export, directory, *versions):
+    return sorted(
+        os.path.basename(shared_path(export, stamp, directory, aliases))
+        for stamp, aliases in versions
+    )
+
+
+def test_shared_frame_matches_the_loaded_one(export, tmp_path):
+    directory = str(tmp_path / "shared")
+    shared = _as_loaded(load_shared(export, directory=directory))
+    pd.testing.assert_frame_equal(shared, load_sources(export), check_index_type=False)
+
+    expected, report = normalize_tags(load_sources(export), ALIASES)
+    shared = _as_loaded(load_shared(export, directory=directory, aliases=ALIASES))
+    pd.testing.assert_frame_equal(shared, expected, check_index_type=False)
+    pd.testing.assert_frame_equal(
+        shared_report(export, directory=directory, aliases=ALIASES), report
+    )
+
+
+def test_shared_frame_is_read_only(export, tmp_path):
+    df = load_shared(export, directory=str(tmp_path / "shared"))
+    costs = df["MonthlyCostUSD"].to_numpy()
+    codes = df["Department"].cat.codes.to_numpy()
+    assert not costs.flags.writeable
+    assert not codes.flags.writeable
+    with pytest.raises(ValueError):
+        costs[0] = 0.0
+    with pytest.raises(ValueError):
+        codes[0] = 0
+
+
+def test_later_calls_map_the_published_file(export, tmp_path):
+    directory = str(tmp_path / "shared")
+    stamp = sources_stamp(export)
+    expected = load_shared(export, stamp, directory)
+    os.remove(export)
+
+    # The export is gone, so this can only come from the shared file
+    pd.testing.assert_frame_equal(load_shared(export, stamp, directory), expected)
+
+
+def test_only_older_data_is_removed(export, tmp_path):
+    directory = str(tmp_path / "shared")
+    newer = sources_stamp(export)
+    older = tuple((path, size, mtime - 10**9) for path, size, mtime in newer)
+
+    load_shared(export, newer, directory)
+    load_shared(export, older, directory)
+    assert _published(directory) == _names(
+        export, directory, (newer, None), (older, None)
+    )
+
+    load_shared(export, newer, directory, ALIASES)
+    assert _published(directory) == _names(
+        export, directory, (newer, None), (newer, ALIASES)
+    )